@@ -3,7 +3,7 @@ function initGraph(graphName)
     local http = require('microhttp')
 
     local URL_PREFIX = "http://localhost:5000/api/"
-    local CHUNK_SIZE = 4096
+    local CHUNK_SIZE_HEADER = "X-Chunk-Size"
 
     local graphCount
     local graphs = {}
@@ -52,6 +52,12 @@ function initGraph(graphName)
     end
 
     local builderId = nil
+    local keptCount = 0
+    -- Index of the first candle calculated, as only the visible candles may be calculated,
+    -- along with their warm-up (see "(Visible)" param)
+    local baseIndex = 1
+    -- Chunk size is advised by the server with each response, as measured for the builder
+    local chunkSize = 4096
     local priorIndex = nil
 
     local graphValues
@@ -60,6 +66,126 @@ function initGraph(graphName)
 
     local calcOk
 
+    local function formatTime(t)
+        return t and string.format(
+            "%04d-%02d-%02dT%02d:%02d:%02d.%03d",
+            t.year, t.month, t.day, t.hour, t.min, t.sec, t.ms
+        ) or ""
+    end
+
+    -- Sparse value is either a point ("index:value") or a segment ("startIndex:endIndex:xStart:xEnd"),
+    -- with indexes relative to the data chunk start. Negative index refers to the data prior to the chunk.
+    local function setSparseValue(values, graphIndex, sparseValue)
+        local function setValue(i, value)
+            if i < 0 then
+                SetValue(valueOffset + i, graphIndex, value)
+            else
+                values[i + 1] = value
+            end
+        end
+
+        local startIndex, endIndex, xStart, xEnd = string.match(sparseValue, "^(.-):(.-):(.-):(.-)$")
+        if startIndex then
+            startIndex, endIndex, xStart, xEnd = tonumber(startIndex), tonumber(endIndex), tonumber(xStart), tonumber(xEnd)
+            for i = startIndex, endIndex do
+                local value = nil
+                if i == startIndex then
+                    value = xStart
+                elseif i == endIndex then
+                    value = xEnd
+                elseif xStart and xEnd then
+                    value = xStart + (xEnd - xStart) * (i - startIndex) / (endIndex - startIndex)
+                end
+                setValue(i, value)
+            end
+        else
+            local index, value = string.match(sparseValue, "^(.-):(.-)$")
+            setValue(tonumber(index), tonumber(value))
+        end
+    end
+
+    local function formatParams()
+        local params = {}
+        for param, value in pairs(Settings) do
+            if param ~= "Name" and param ~= "line" then
+                table.insert(params, param .. "=" .. value)
+            end
+        end
+        return table.concat(params, "\n")
+    end
+
+    local function formatChunk(index, count)
+        local price = {}
+        local volume = {}
+        local time = {}
+        for i = index, (index + count - 1) do
+            local c = C(i)
+            table.insert(price, (c and tostring(c) or ""))
+
+            local v = V(i)
+            table.insert(volume, (v and tostring(v) or ""))
+
+            table.insert(time, formatTime(T(i)))
+        end
+        return table.concat(price, ";") .. "\n" .. table.concat(volume, ";") .. "\n" .. table.concat(time, ";")
+    end
+
+    -- Returns the number of candles needed before the visible ones, for the current params
+    local function requestWarmup(info)
+        local response, status = http.request(
+            URL_PREFIX .. "graphs/" .. graphName .. "/warmup",
+            table.concat({
+                info.interval .. "\n" .. info.class_code .. "\n" .. info.sec_code,
+                formatParams()
+            }, "\n\n")
+        )
+        assert(status >= 200 and status < 300, response)
+        return tonumber(string.match(response .. "\n", "^(.-)\n")) or 0
+    end
+
+    local function updateChunkSize(headers)
+        local size = headers and tonumber(headers[CHUNK_SIZE_HEADER])
+        if size and size >= 1 then
+            chunkSize = size
+        end
+    end
+
+    local function parseGraphValues(lines)
+        graphValues = {}
+        local graphIndex = 1
+        for line in lines do
+            if graphIndex > graphCount then break end
+            local values = {}
+            local sparseValues = {}
+            local count = 0
+            for value in string.gmatch(line .. ";", "(.-);") do
+                if string.find(value, ":", 1, true) then
+                    table.insert(sparseValues, value)
+                else
+                    count = count + 1
+                    values[count] = tonumber(value) -- table.insert() will corrupt the data with nils
+                end
+            end
+            if count > 0 then
+                local offset = values[1] or 0
+                values[1] = nil
+                assert(offset <= 0 and valueOffset + offset >= 1, "Invalid data chunk offset (" .. offset .. ")")
+                for i = offset, -1 do
+                    SetValue(valueOffset + i, graphIndex, values[2 - offset + i])
+                end
+                table.move(values,
+                    2 - offset,
+                    math.max(count, 2 - offset + count - 1),
+                    1)
+            end
+            for _, sparseValue in ipairs(sparseValues) do
+                setSparseValue(values, graphIndex, sparseValue)
+            end
+            table.insert(graphValues, values)
+            graphIndex = graphIndex + 1
+        end
+    end
+
     return graphCount, graphs, function(index)
 
         local isInitIndex = (priorIndex == nil or index < priorIndex)
@@ -75,90 +201,71 @@ function initGraph(graphName)
 
         local msg
         calcOk, msg = pcall(function()
-            if builderId == nil then
-                local attrs = {}
-                info = getDataSourceInfo()
-                table.insert(attrs, info.interval)
-                table.insert(attrs, info.class_code)
-                table.insert(attrs, info.sec_code)
-
-                local response, status = http.request(
-                    URL_PREFIX .. "graphs/" .. graphName .. "/new",
-                    table.concat(attrs, "\n")
-                )
-                assert(status >= 200 and status < 300, response)
-                builderId = response
-            end
+            --TODO: Leverage the CandleExist function
 
             if isInitIndex then
-                local params = {}
-                for param, value in pairs(Settings) do
-                    if param ~= "Name" and param ~= "line" then
-                        table.insert(params, param .. "=" .. value)
-                    end
+                -- Single round trip session: the builder is created (or reused, if it keeps
+                -- the same data), params are applied, and the first data chunk is calculated
+                local info = getDataSourceInfo()
+
+                local visibleCount = tonumber(Settings["(Visible)"]) or 0
+                if visibleCount > 0 then
+                    baseIndex = math.max(1, Size() - visibleCount - requestWarmup(info) + 1)
+                    -- The first candle moves as new candles appear, so the kept data is not reused
+                    builderId = nil
+                else
+                    baseIndex = 1
                 end
 
-                local response, status = http.request(
-                    URL_PREFIX .. "graphs/" .. builderId .. "/params",
-                    table.concat(params, "\n")
+                valueOffset = math.max(index, baseIndex)
+                valueCount = math.min(chunkSize, Size() - valueOffset + 1)
+
+                local response, status, headers = http.request(
+                    URL_PREFIX .. "graphs/" .. graphName .. "/session",
+                    table.concat({
+                        (builderId or "") .. "\n" .. info.interval .. "\n" .. info.class_code .. "\n" .. info.sec_code,
+                        formatParams(),
+                        formatChunk(valueOffset, valueCount)
+                    }, "\n\n")
                 )
                 assert(status >= 200 and status < 300, response)
-            end
+                updateChunkSize(headers)
 
-            if isInitIndex or index > (valueOffset + valueCount - 1) then
-                --TODO: Leverage the CandleExist function
+                local lines = string.gmatch(response .. "\n", "(.-)\n")
+                builderId = lines()
+                -- Builder keeps the data sent before, so the graph data for it is just requested
+                keptCount = tonumber(string.match(lines(), "^(.-);")) or 0
+                for i = 1, tonumber(lines()) do
+                    lines() -- graph descrs are already known
+                end
+                parseGraphValues(lines)
 
-                graphValues = {}
+            elseif index > (valueOffset + valueCount - 1) then
                 valueOffset = index
-                valueCount = math.min(CHUNK_SIZE, Size() - index + 1)
-
-                local price = {}
-                local volume = {}
-                local time = {}
-                for i = index, (index + valueCount - 1) do
-                    local c = C(i)
-                    table.insert(price, (c and tostring(c) or ""))
-
-                    local v = V(i)
-                    table.insert(volume, (v and tostring(v) or ""))
-
-                    local t = T(i)
-                    table.insert(time, (t and string.format(
-                        "%04d-%02d-%02dT%02d:%02d:%02d.%03d",
-                        t.year, t.month, t.day, t.hour, t.min, t.sec, t.ms
-                    ) or ""))
-                end
 
-                local response, status = http.request(
-                    URL_PREFIX .. "graphs/" .. builderId .. "/values",
-                    table.concat(price, ";") .. "\n" .. table.concat(volume, ";") .. "\n" .. table.concat(time, ";")
-                )
-                assert(status >= 200 and status < 300, response)
+                -- Index of the candle within the data of builder
+                local keptIndex = index - baseIndex
+
+                local response, status, headers
+                if keptIndex < keptCount then
+                    valueCount = math.min(chunkSize, keptCount - keptIndex)
 
-                local graphIndex = 1
-                for line in string.gmatch(response .. "\n", "(.-)\n") do
-                    if graphIndex > graphCount then break end
-                    local values = {}
-                    local count = 0
-                    for value in string.gmatch(line .. ";", "(.-);") do
-                        count = count + 1
-                        values[count] = tonumber(value) -- table.insert() will corrupt the data with nils
-                    end
-                    if count > 0 then
-                        local offset = values[1] or 0
-                        values[1] = nil
-                        assert(offset <= 0 and valueOffset + offset >= 1, "Invalid data chunk offset (" .. offset .. ")")
-                        for i = offset, -1 do
-                            SetValue(valueOffset + i, graphIndex, values[2 - offset + i])
-                        end
-                        table.move(values,
-                            2 - offset,
-                            math.max(count, 2 - offset + count - 1),
-                            1)
-                    end
-                    table.insert(graphValues, values)
-                    graphIndex = graphIndex + 1
+                    response, status, headers = http.request(
+                        URL_PREFIX .. "graphs/" .. builderId .. "/values?start=" .. keptIndex
+                            .. "&stop=" .. (keptIndex + valueCount)
+                    )
+                else
+                    valueCount = math.min(chunkSize, Size() - index + 1)
+
+                    response, status, headers = http.request(
+                        URL_PREFIX .. "graphs/" .. builderId .. "/values",
+                        formatChunk(index, valueCount)
+                    )
                 end
+                assert(status >= 200 and status < 300, response)
+                updateChunkSize(headers)
+
+                parseGraphValues(string.gmatch(response .. "\n", "(.-)\n"))
             end
 
             local valueIndex = index - valueOffset + 1
@@ -173,3 +280,64 @@ function initGraph(graphName)
         return table.unpack(retValues, 1, graphCount)
     end
 end
+
+function initOrders(consumer)
+
+    local http = require('microhttp')
+
+    local URL_PREFIX = "http://localhost:5000/api/"
+    local WAIT_TIMEOUT = 20 -- seconds, should be less than microhttp request timeout
+
+    local lastTransId = nil
+
+    -- Blocks until new orders appear or timeout expires, and returns them as a list of tables
+    -- of order fields. The last received TRANS_ID is sent back with the next call to acknowledge
+    -- the orders, so no one of them is lost or duplicated even if the server side cursor is lost.
+    return function()
+        local url = URL_PREFIX .. "orders?consumer=" .. consumer .. "&timeout=" .. WAIT_TIMEOUT
+        if lastTransId ~= nil then
+            url = url .. "&after=" .. lastTransId
+        end
+
+        local response, status = http.request(url)
+        assert(status >= 200 and status < 300, response)
+
+        local orders = {}
+        for block in string.gmatch(response .. "\n\n", "(.-)\n\n") do
+            local order = {}
+            for param, value in string.gmatch(block .. "\n", " *(.-) *= *(.-) *\n") do
+                order[param] = value
+            end
+            if order.TRANS_ID ~= nil then
+                lastTransId = tonumber(order.TRANS_ID)
+                table.insert(orders, order)
+            end
+        end
+        return orders
+    end
+end
+
+function initFills()
+
+    local http = require('microhttp')
+
+    local URL_PREFIX = "http://localhost:5000/api/"
+
+    -- Sends a list of trades (QUIK trade tables) to the server, to keep track of positions.
+    -- Trade number is sent too, so the trades reported by the terminal repeatedly are counted once.
+    return function(trades)
+        local fills = {}
+        for _, trade in ipairs(trades) do
+            table.insert(fills, table.concat({
+                "SECCODE=" .. trade.sec_code,
+                "OPERATION=" .. (bit.band(trade.flags, 0x4) ~= 0 and "S" or "B"),
+                "PRICE=" .. trade.price,
+                "QUANTITY=" .. trade.qty,
+                "TRADE_NUM=" .. tostring(trade.trade_num)
+            }, "\n"))
+        end
+
+        local response, status = http.request(URL_PREFIX .. "fills", table.concat(fills, "\n\n"))
+        assert(status >= 200 and status < 300, response)
+    end
+end
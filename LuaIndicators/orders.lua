@@ -0,0 +1,51 @@
+dofile(getWorkingFolder() .. "\\LuaIndicators\\lib\\microtrader.lua")
+
+local CONSUMER_NAME = "quik"
+
+local isRunning = true
+local trades = {}
+
+function OnStop()
+
+    isRunning = false
+
+end
+
+-- Trades are only queued here, not to block the terminal, and sent from the main loop
+function OnTrade(trade)
+
+    table.insert(trades, trade)
+
+end
+
+function main()
+
+    local waitOrders = initOrders(CONSUMER_NAME)
+    local sendFills = initFills()
+
+    while isRunning do
+        if #trades > 0 then
+            local sentTrades = trades
+            trades = {}
+            local ok, msg = pcall(sendFills, sentTrades)
+            if not ok then
+                message("MicroTrader: " .. tostring(msg))
+            end
+        end
+
+        local ok, orders = pcall(waitOrders)
+        if ok then
+            for _, order in ipairs(orders) do
+                order.TIME = nil
+                local result = sendTransaction(order)
+                if result ~= "" then
+                    message("MicroTrader: order " .. order.TRANS_ID .. " is rejected: " .. result)
+                end
+            end
+        else
+            message("MicroTrader: " .. tostring(orders))
+            sleep(1000)
+        end
+    end
+
+end
@@ -1,3 +1,4 @@
+from lib.times import MS_PER_DAY
 from datacalc.mappers import SimpleMapper, PrevAwareMapper
 
 # Value delta calculator.
@@ -14,6 +15,6 @@ def deltaMapper(source, retroactor = None):
 def dayBoundMapper(source, retroactor = None):
     onTransform = lambda t, prev: (
         None if t is None or prev is None
-        else t.date() != prev.date()
+        else t // MS_PER_DAY != prev // MS_PER_DAY
     )
     return PrevAwareMapper(source, onTransform, retroactor)
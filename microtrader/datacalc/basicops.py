@@ -4,17 +4,16 @@ from inspect import getfullargspec
 from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
 from datacalc.stream import Stream
+from datacalc.kernels import Kernels
 
 # Wrapper for mapper to transform it into operator.
 #
 # Params:
 #     mapper input arguments except "self", "source" and "retroactor"
 #
-# Sources:
-#     source
-#
-# Targets:
-#     target
+# Streams:
+#     source - IN
+#     target - OUT
 
 def mapperOperator(mapperType):
     return partial(MapperOperator, mapperType)
@@ -24,10 +23,10 @@ class MapperOperator:
 
     @initconfig
     @throwingmember
-    def __init__(self, mapperType, params, sources, targets):
+    def __init__(self, mapperType, params, streams):
         argNames = getfullargspec(mapperType).args
         args = {
-            "source": sources["source"]
+            "source": streams["source"]
         } | {
             argName: params[argName]
             for argName in argNames
@@ -37,11 +36,14 @@ class MapperOperator:
             args["retroactor"] = self._onRetroaction
 
         self._mapper = mapperType(**args)
-        self._target = Stream(targets["target"])
+        self._target = Stream(streams["target"])
 
     def calc(self):
         self._target.extend(self._mapper)
 
+    def getWarmup(self, streamName):
+        return self._mapper.warmup
+
     def _onRetroaction(self, change, index):
         if change.isAfter():
             self._target.setLen(index)
@@ -50,25 +52,23 @@ class MapperOperator:
 #
 # Separates positive and negative half-waves of source.
 #
-# Sources:
-#     source
-#
-# Targets:
-#     positive
-#     negative
+# Streams:
+#     source   - IN
+#     positive - OUT
+#     negative - OUT
 
 @final
 class HwSplitOperator:
 
     @initconfig
     @throwingmember
-    def __init__(self, params, sources, targets):
-        self._source = Stream(sources["source"], self._onRetroaction)
-        self._positive = Stream(targets["positive"])
-        self._negative = Stream(targets["negative"])
+    def __init__(self, params, streams):
+        self._source = Stream(streams["source"], self._onRetroaction)
+        self._positive = Stream(streams["positive"])
+        self._negative = Stream(streams["negative"])
 
     def calc(self):
-        for x in self._source:
+        for x in self._source.getNextChunk():
             self._positive.append(
                 None if x is None
                 else max(x, 0.0)
@@ -86,59 +86,49 @@ class HwSplitOperator:
 
 # Simple low-pass RC filter driven by variadic alpha.
 #
-# Sources:
-#     alpha
-#     source
-#
-# Targets:
-#     target
+# Streams:
+#     alpha  - IN
+#     source - IN
+#     target - OUT
 
 @final
 class VariadicLoPassOperator:
 
     @initconfig
     @throwingmember
-    def __init__(self, params, sources, targets):
-        self._alpha = Stream(sources["alpha"])
-        self._source = Stream(sources["source"])
-        self._target = Stream(targets["target"])
+    def __init__(self, params, streams):
+        self._alpha = Stream(streams["alpha"])
+        self._source = Stream(streams["source"])
+        self._target = Stream(streams["target"])
 
         self._y = None
+        self._kernel = Kernels.get().variadicLoPass
 
     def calc(self):
-        for x, alpha in zip(self._source, self._alpha, strict = True):
-            if x is None or alpha is None or alpha < 0.0 or alpha > 1.0:
-                self._y = None
-            else:
-                self._y = (
-                    x if self._y is None
-                    else self._y + alpha * (x - self._y)
-                )
-            self._target.append(self._y)
+        ys, self._y = self._kernel(self._source.getNextChunk(), self._alpha.getNextChunk(), self._y)
+        self._target.extend(ys)
 
 # Difference calculator.
 #
-# Sources:
-#     source1
-#     source2
-#
-# Targets:
-#     target
+# Streams:
+#     source1 - IN
+#     source2 - IN
+#     target  - OUT
 
 @final
 class DiffOperator:
 
     @initconfig
     @throwingmember
-    def __init__(self, params, sources, targets):
-        self._source1 = Stream(sources["source1"], self._onRetroaction)
-        self._source2 = Stream(sources["source2"], self._onRetroaction)
-        self._target = Stream(targets["target"])
+    def __init__(self, params, streams):
+        self._source1 = Stream(streams["source1"], self._onRetroaction)
+        self._source2 = Stream(streams["source2"], self._onRetroaction)
+        self._target = Stream(streams["target"])
 
     def calc(self):
         self._target.extend(
             x1 - x2
-            for x1. x2 in zip(
+            for x1, x2 in zip(
                 self._source1, self._source2,
                 strict = True
             )
@@ -157,27 +147,25 @@ class DiffOperator:
 # Params:
 #     sourceName - source stream name to forward to target
 #
-# Sources:
-#     ...
-#
-# Targets:
-#     target
+# Streams:
+#     ...    - IN
+#     target - OUT
 
 @final
 class MultilpexerOperator:
 
     @initconfig
     @throwingmember
-    def __init__(self, params, sources, targets):
+    def __init__(self, params, streams):
         try:
             self._source = Stream(
-                sources[params["sourceName"]],
+                streams[params["sourceName"]],
                 self._onRetroaction
             )
         except Exception as e:
             raise ParamError(e) from e
 
-        self._target = Stream(targets["target"])
+        self._target = Stream(streams["target"])
 
     def calc(self):
         self._target.extend(self._source)
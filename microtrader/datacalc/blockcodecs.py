@@ -0,0 +1,163 @@
+from typing import final
+from array import array
+from itertools import accumulate, compress
+
+# Codecs of full blocks of block values (see datacalc.blocks), compressing the source data
+# kept in memory.
+#
+# Codec encodes a block as a whole into an immutable encoded block, or returns None if
+# the block values are not suitable for the codec, so the block is kept as is. Encoded
+# block is decoded as a whole too, which is fast for sequential reads, while random reads
+# rely on the decoded block cache of block values.
+#
+# Integer deltas are packed into arrays of the narrowest integer type fitting them all,
+# so the typical deltas of source data take 1-2 bytes per value.
+
+_INT_TYPECODES = [
+    (typecode, 1 << (8 * array(typecode).itemsize - 1))
+    for typecode in ("b", "h", "i", "q")
+]
+
+def _packInts(values):
+    lo = min(values, default = 0)
+    hi = max(values, default = 0)
+    for typecode, bound in _INT_TYPECODES:
+        if -bound <= lo and hi < bound:
+            return array(typecode, values)
+    return None
+
+@final
+class EncodedBlock:
+
+    __slots__ = ("codec", "typecode", "header", "data", "gaps")
+
+    def __init__(self, codec, typecode, header, data, gaps = None):
+        self.codec = codec
+        # Type code of the original block, None for list
+        self.typecode = typecode
+        self.header = header
+        self.data = data
+        self.gaps = gaps
+
+    def decode(self):
+        values = self.codec.decode(self)
+        if self.typecode is not None:
+            return array(self.typecode, values)
+        return values
+
+# Delta-of-delta codec of integer values, e.g. times of samples: values of time series
+# are mostly regular, so delta of their deltas is mostly zero.
+#
+# Header is (first value, first delta) pair, and data are deltas of the following deltas.
+
+@final
+class DeltaOfDeltaCodec:
+
+    def encode(self, block):
+        if len(block) < 2 or any(type(value) != int for value in block):
+            return None
+        deltas = [value2 - value1 for value1, value2 in zip(block, block[1:])]
+        data = _packInts([delta2 - delta1 for delta1, delta2 in zip(deltas, deltas[1:])])
+        if data is None:
+            return None
+        return EncodedBlock(self, getattr(block, "typecode", None), (block[0], deltas[0]), data)
+
+    def decode(self, encodedBlock):
+        first, firstDelta = encodedBlock.header
+        return list(accumulate(
+            accumulate(encodedBlock.data, initial = firstDelta),
+            initial = first
+        ))
+
+# Scaled delta codec of decimal values, e.g. prices and volumes: values of such series
+# are multiples of price step or lot size, so they are exact integers once scaled by
+# a power of 10, with small deltas.
+#
+# Header is (first scaled value, scale) pair, with None scale for integer values, and
+# data are deltas of the following scaled values. Gaps (None values) are kept as a list
+# of their offsets, and encoded as repeated values.
+#
+# Block is encoded only if every value is decoded back exactly, so values with too many
+# decimals are kept as is.
+
+@final
+class ScaledDeltaCodec:
+
+    def __init__(self, maxDecimals = 8):
+        self._maxDecimals = maxDecimals
+
+    def encode(self, block):
+        values = list(block)
+        gaps = None
+        if None in values:
+            gaps = array("H", compress(range(len(values)), (value is None for value in values)))
+            prev = next((value for value in values if value is not None), 0)
+            for i, value in enumerate(values):
+                if value is None:
+                    values[i] = prev
+                else:
+                    prev = value
+
+        if all(type(value) == int for value in values):
+            scale = None
+            ints = values
+        else:
+            scale = self._findScale(values)
+            if scale is None:
+                return None
+            ints = [round(value * scale) for value in values]
+
+        data = _packInts([int2 - int1 for int1, int2 in zip(ints, ints[1:])])
+        if not ints or data is None:
+            return None
+        return EncodedBlock(self, getattr(block, "typecode", None), (ints[0], scale), data, gaps)
+
+    def _findScale(self, values):
+        if any(type(value) not in (int, float) for value in values):
+            return None
+        for decimals in range(self._maxDecimals + 1):
+            scale = 10 ** decimals
+            try:
+                if [round(value * scale) / scale for value in values] == values:
+                    return scale
+            except (OverflowError, ValueError):
+                # Infinite or NaN values
+                return None
+        return None
+
+    def decode(self, encodedBlock):
+        first, scale = encodedBlock.header
+        values = accumulate(encodedBlock.data, initial = first)
+        values = (
+            list(values) if scale is None
+            else [value / scale for value in values]
+        )
+        if encodedBlock.gaps is not None:
+            for i in encodedBlock.gaps:
+                values[i] = None
+        return values
+
+# Codecs of processor sources, by source name.
+#
+# Encoding is disabled by default, and enabled for the processors created after enable()
+# call.
+
+@final
+class SourceCodecs:
+
+    _isEnabled = False
+    _codecs = {
+        "Time": DeltaOfDeltaCodec(),
+        "Price": ScaledDeltaCodec(),
+        "Volume": ScaledDeltaCodec()
+    }
+
+    @staticmethod
+    def enable(isEnabled = True):
+        SourceCodecs._isEnabled = isEnabled
+
+    @staticmethod
+    def get(sourceName):
+        if not SourceCodecs._isEnabled:
+            return None
+        return SourceCodecs._codecs.get(sourceName)
@@ -0,0 +1,234 @@
+from typing import final
+from array import array
+from datacalc.spill import BlockSpiller, SpilledBlock
+from datacalc.blockcodecs import EncodedBlock
+
+_BLOCK_BITS = 12
+BLOCK_SIZE = 1 << _BLOCK_BITS
+_BLOCK_MASK = BLOCK_SIZE - 1
+
+# Segmented values storage, to be used as underlying values of Stream.
+#
+# Values are kept in fixed-size blocks, listed in block table, so appending, truncating
+# and extending touch only the affected blocks, while the other ones are never moved or
+# reallocated. Blocks are lists, or arrays of the specified type code (e.g. "q" for
+# integer times). Arrays can't contain None values, so the blocks with None values
+# (e.g. missing times) are kept as lists even if typed.
+#
+# Deep copy of block values is a fork, sharing all the blocks with the original values
+# copy-on-write: a shared block is copied by either side on its first change only.
+#
+# Full blocks may be spilled to disk by the spiller, active when block values are created
+# (see datacalc.spill), and are loaded back on access transparently.
+#
+# Full blocks may be also encoded by the specified codec (see datacalc.blockcodecs), and
+# are decoded on access transparently, keeping the last decoded block cached. Encoded
+# block is replaced by the decoded one on its first change.
+#
+# Supports reading by index and by slice (with no step), writing by index, and deleting
+# by slice till the end (truncation).
+
+@final
+class BlockValues:
+
+    def __init__(self, values = (), typecode = None, codec = None):
+        self._typecode = typecode
+        self._codec = codec
+        # Last decoded block, as (encoded block, decoded block) pair
+        self._decoded = None
+        self._blocks = []
+        # Whether each block is owned exclusively, i.e. not shared with forks
+        self._owned = []
+        self._len = 0
+        self._spiller = BlockSpiller.getActive()
+        self.extend(values)
+
+    @property
+    def typecode(self):
+        return self._typecode
+
+    def _newBlock(self, values):
+        if self._typecode is not None and None not in values:
+            return array(self._typecode, values)
+        return values if type(values) == list else list(values)
+
+    # Returns the last block to be extended by the values, as a list if the values don't
+    # fit the array block.
+
+    def _getLastBlock(self, values):
+        block = self._ownBlock(-1)
+        if type(block) == array and None in values:
+            block = self._blocks[-1] = block.tolist()
+        return block
+
+    def _getBlock(self, blockIndex):
+        block = self._blocks[blockIndex]
+        if type(block) == SpilledBlock:
+            block = self._loadBlock(blockIndex)
+        if type(block) == EncodedBlock:
+            block = self._decodeBlock(block)
+        return block
+
+    def _decodeBlock(self, block):
+        decoded = self._decoded
+        if decoded is None or decoded[0] is not block:
+            decoded = self._decoded = (block, block.decode())
+        return decoded[1]
+
+    def _loadBlock(self, blockIndex):
+        block = self._spiller.read(self._blocks[blockIndex])
+        # Loaded block is not shared with forks anymore
+        self._blocks[blockIndex] = block
+        self._owned[blockIndex] = True
+        self._spiller.addBlock(self, blockIndex)
+        return block
+
+    # Spills the block (see datacalc.spill), unless it's the last one.
+
+    def spillBlock(self, blockIndex):
+        if blockIndex >= len(self._blocks) - 1:
+            return
+        block = self._blocks[blockIndex]
+        if type(block) != SpilledBlock:
+            self._blocks[blockIndex] = self._spiller.write(block)
+
+    def _addBlock(self, block):
+        if self._blocks:
+            self._freezeBlock(len(self._blocks) - 1)
+        self._blocks.append(block)
+        self._owned.append(True)
+
+    # Encodes and registers for spilling the block just filled.
+
+    def _freezeBlock(self, blockIndex):
+        block = self._blocks[blockIndex]
+        # Block may be already frozen, if it's got the last one by truncation
+        if self._codec is not None and type(block) in (list, array):
+            encodedBlock = self._codec.encode(block)
+            if encodedBlock is not None:
+                self._blocks[blockIndex] = encodedBlock
+                self._owned[blockIndex] = True
+        if self._spiller is not None:
+            self._spiller.addBlock(self, blockIndex)
+
+    def _ownBlock(self, blockIndex):
+        if blockIndex < 0:
+            blockIndex += len(self._blocks)
+        block = self._blocks[blockIndex]
+        if type(block) == SpilledBlock:
+            block = self._loadBlock(blockIndex)
+        if type(block) == EncodedBlock:
+            # Decoded anew, as the cached decoded block may be shared with forks
+            block = block.decode()
+            self._blocks[blockIndex] = block
+            self._owned[blockIndex] = True
+        if not self._owned[blockIndex]:
+            block = block[:]
+            self._blocks[blockIndex] = block
+            self._owned[blockIndex] = True
+        return block
+
+    def __deepcopy__(self, memo):
+        fork = BlockValues.__new__(BlockValues)
+        memo[id(self)] = fork
+        fork._typecode = self._typecode
+        fork._codec = self._codec
+        fork._decoded = self._decoded
+        fork._blocks = self._blocks[:]
+        self._owned = [False] * len(self._blocks)
+        fork._owned = self._owned[:]
+        fork._len = self._len
+        fork._spiller = self._spiller
+        return fork
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for i in range(len(self._blocks)):
+            yield from self._getBlock(i)
+
+    def __str__(self):
+        return self[:].__str__()
+
+    def __getitem__(self, index):
+        if type(index) == int:
+            if index < 0:
+                index += self._len
+            if index < 0 or index >= self._len:
+                raise IndexError("Index is out of bounds of block values")
+            block = self._blocks[index >> _BLOCK_BITS]
+            if type(block) != list and type(block) != array:
+                block = self._getBlock(index >> _BLOCK_BITS)
+            return block[index & _BLOCK_MASK]
+
+        start, stop, step = index.indices(self._len)
+        if step != 1:
+            raise IndexError("Unsupported slice step")
+        if start >= stop:
+            return self._newBlock(())
+        blockIndex, offset = start >> _BLOCK_BITS, start & _BLOCK_MASK
+        lastIndex, lastStop = (stop - 1) >> _BLOCK_BITS, ((stop - 1) & _BLOCK_MASK) + 1
+        if blockIndex == lastIndex:
+            return self._getBlock(blockIndex)[offset:lastStop]
+        blocks = [
+            self._getBlock(blockIndex)[offset:],
+            *(self._getBlock(i) for i in range(blockIndex + 1, lastIndex)),
+            self._getBlock(lastIndex)[:lastStop]
+        ]
+        values = (
+            self._newBlock(()) if all(type(block) == array for block in blocks)
+            else []
+        )
+        for block in blocks:
+            values.extend(block)
+        return values
+
+    def __setitem__(self, index, value):
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError("Index is out of bounds of block values")
+        blockIndex = index >> _BLOCK_BITS
+        block = self._ownBlock(blockIndex)
+        if type(block) == array and value is None:
+            block = self._blocks[blockIndex] = block.tolist()
+        block[index & _BLOCK_MASK] = value
+
+    def __delitem__(self, index):
+        if type(index) != slice or index.step is not None or index.stop is not None:
+            raise IndexError("Only truncation is supported by block values")
+        self.truncate(index.indices(self._len)[0])
+
+    def truncate(self, newLen):
+        if newLen >= self._len:
+            return
+        blockCount = (newLen + _BLOCK_MASK) >> _BLOCK_BITS
+        del self._blocks[blockCount:]
+        del self._owned[blockCount:]
+        offset = newLen & _BLOCK_MASK
+        if offset:
+            del self._ownBlock(blockCount - 1)[offset:]
+        self._len = newLen
+
+    def append(self, value):
+        if self._len & _BLOCK_MASK:
+            self._getLastBlock((value,)).append(value)
+        else:
+            self._addBlock(self._newBlock((value,)))
+        self._len += 1
+
+    def extend(self, values):
+        if type(values) not in (list, tuple, array):
+            values = list(values)
+        pos = 0
+        while pos < len(values):
+            offset = self._len & _BLOCK_MASK
+            count = min(len(values) - pos, BLOCK_SIZE - offset)
+            chunk = values[pos:pos + count]
+            if offset:
+                self._getLastBlock(chunk).extend(chunk)
+            else:
+                self._addBlock(self._newBlock(chunk))
+            pos += count
+            self._len += count
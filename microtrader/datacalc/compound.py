@@ -3,15 +3,15 @@ from types import MappingProxyType
 from lib.decors import initconfig, throwingmember
 from lib.utils import mapDict, coalesce
 from datacalc.stream import Stream
+from datacalc.fusion import fusedOperator, getFusionStage, getStageStreams
 
 @final
 class OperatorConfig:
 
-    def __init__(self, operatorType, paramMap = None, sourceMap = None, targetMap = None):
+    def __init__(self, operatorType, paramMap = None, streamMap = None):
         self._operatorType = operatorType
         self._paramMap = coalesce(paramMap, {})
-        self._sourceMap = coalesce(sourceMap, {})
-        self._targetMap = coalesce(targetMap, {})
+        self._streamMap = coalesce(streamMap, {})
 
     @property
     def operatorType(self):
@@ -22,45 +22,225 @@ class OperatorConfig:
         return MappingProxyType(self._paramMap)
 
     @property
-    def sourceMap(self):
-        return MappingProxyType(self._sourceMap)
+    def streamMap(self):
+        return MappingProxyType(self._streamMap)
 
-    @property
-    def targetMap(self):
-        return MappingProxyType(self._targetMap)
+# Fuses chains of element-wise operators into single operators (see datacalc.fusion module).
+#
+# Chain is a sequence of adjacent fusable elements, all reading either the same source
+# stream or streams written by preceding elements of the chain. Streams, neither passed
+# from outside nor read by other elements, are not needed anymore after fusion.
+
+def fuseConfigs(configs, externalNames = ()):
+    stages = [getFusionStage(config) for config in configs]
+
+    chains = []
+    for i, stage in enumerate(stages):
+        if stage is None:
+            continue
+        inNames, outNames = getStageStreams(stage)
+        if chains and chains[-1][1] == i and inNames[0] in chains[-1][2]:
+            start, _, chainNames = chains[-1]
+            chains[-1] = (start, i + 1, chainNames | set(outNames))
+        else:
+            chains.append((i, i + 1, set(inNames) | set(outNames)))
+
+    fusedConfigs = list(configs)
+    for start, stop, _ in reversed(chains):
+        if stop - start < 2:
+            continue
+
+        chainStages = stages[start:stop]
+        sourceName = getStageStreams(chainStages[0])[0][0]
+        readNames = {
+            streamName
+            for config in configs[:start] + configs[stop:]
+            for streamName in config.streamMap.values()
+        }
+        outputNames = [
+            streamName
+            for stage in chainStages
+            for streamName in getStageStreams(stage)[1]
+            if streamName in externalNames or streamName in readNames
+        ]
+
+        fusedConfigs[start:stop] = [
+            OperatorConfig(
+                fusedOperator(tuple(chainStages), tuple(outputNames)),
+                paramMap = {
+                    f"{j}.{paramName}": mappedName
+                    for j, config in enumerate(configs[start:stop])
+                    for paramName, mappedName in config.paramMap.items()
+                },
+                streamMap = {
+                    "source": sourceName
+                } | {
+                    f"out.{streamName}": streamName
+                    for streamName in outputNames
+                }
+            )
+        ]
+
+    return fusedConfigs
 
 # Compound operator.
 #
 # Elements within compound operator may be interconnected and interacting
 # with each other by specifying source/target streams with equal names.
 # But this is not mandatory though.
+#
+# Elements are constructed on the first calculation only, so compound operators
+# which are never calculated cost almost nothing. As elements read their sources
+# from the very beginning, nothing is lost by the delayed construction. Element params
+# may be checked in advance though (see checkParams() method), so that invalid ones are
+# reported when applied rather than by the first calculation.
+#
+# Chains of element-wise operators are fused into single-pass operators (see fuseConfigs()
+# function), so their intermediate streams are never built.
+#
+# Elements may declare warm-up of their target streams by getWarmup(streamName) method,
+# i.e. the number of leading samples of their sources needed before the target values
+# are settled. Elements with no such method are considered as having no warm-up.
 
 @final
 class CompoundOperator:
 
     @initconfig
     @throwingmember
-    def __init__(self, configs, params, sources, targets):
-        sources = {
-            sourceName: Stream(sources.get(sourceName))
-            for config in configs
-            for sourceName in config.sourceMap.values()
-        }
-        targets = {
-            targetName: Stream(targets.get(targetName))
-            for config in configs
-            for targetName in config.targetMap.values()
+    def __init__(self, configs, params = None, streams = None):
+        self._configs = fuseConfigs(configs, coalesce(streams, {}).keys())
+        self._params = coalesce(params, {})
+        self._streams = coalesce(streams, {})
+
+        self._builtStreams = {}
+        self._operators = None
+
+    def _build(self):
+        # Streams not passed from outside are intermediate ones, private to compound operator
+        self._builtStreams = {
+            streamName: Stream(self._streams.get(streamName))
+            for config in self._configs
+            for streamName in config.streamMap.values()
         }
-        
+
         self._operators = [
+            self._buildOperator(config)
+            for config in self._configs
+        ]
+
+    def _buildOperator(self, config):
+        return config.operatorType(
+            params = mapDict(self._params, config.paramMap),
+            streams = mapDict(self._builtStreams, config.streamMap)
+        )
+
+    # Checks params of the elements by constructing them over empty streams, and dropping
+    # them then. Nested compound operators of the elements are constructed but not checked,
+    # as their params are derived by the elements, checking their own ones.
+
+    def checkParams(self):
+        self._checkParams(self._configs, self._params)
+
+    def _checkParams(self, configs, params):
+        for config in configs:
             config.operatorType(
                 params = mapDict(params, config.paramMap),
-                sources = mapDict(sources, config.sourceMap)
-                targets = mapDict(targets, config.targetMap)
+                streams = {name: Stream() for name in config.streamMap}
             )
-            for config in configs
-        ]
+
+    def getStreamNames(self):
+        return self._builtStreams.keys()
+
+    def getStream(self, streamName):
+        return self._builtStreams[streamName]
+
+    # Applies new params, by rebuilding only the elements which params are changed, and
+    # the elements downstream of them. Rebuilt elements get new empty target streams, while
+    # all the other streams are kept along with their data.
+    #
+    # Elements are supposed to be ordered so that each stream is targeted by the first element
+    # referencing it, unless the stream is one of the specified source streams.
+    #
+    # Params of the elements to be rebuilt are checked first (see checkParams() method),
+    # so invalid params leave compound operator unchanged.
+    #
+    # Returns names of the new streams (see getStream() method).
+
+    def rebuild(self, params, sourceNames = ()):
+        changedParams = {
+            paramName
+            for paramName in self._params.keys() | params.keys()
+            if self._params.get(paramName) != params.get(paramName)
+        }
+        self._checkParams(
+            [
+                config
+                for config in self._configs
+                if any(paramName in changedParams for paramName in config.paramMap.values())
+            ],
+            params
+        )
+        self._params = params
+
+        if self._operators is None:
+            return set()
+
+        targetIndexes = self._getTargetIndexes(sourceNames)
+
+        newStreams = set()
+        for i, config in enumerate(self._configs):
+            streamNames = config.streamMap.values()
+            if (any(paramName in changedParams for paramName in config.paramMap.values())
+                or any(streamName in newStreams for streamName in streamNames)
+            ):
+                for streamName in streamNames:
+                    if targetIndexes.get(streamName) == i:
+                        self._builtStreams[streamName] = Stream()
+                        newStreams.add(streamName)
+                self._operators[i] = self._buildOperator(config)
+
+        return newStreams
+
+    def _getTargetIndexes(self, sourceNames):
+        targetIndexes = {}
+        for i, config in enumerate(self._configs):
+            for streamName in config.streamMap.values():
+                if streamName not in sourceNames:
+                    targetIndexes.setdefault(streamName, i)
+        return targetIndexes
+
+    # Returns warm-up of the stream, composed through the elements upstream of it: warm-up
+    # of each element is added to the largest warm-up of its sources. Warm-up of the specified
+    # source streams is 0.
+    #
+    # Elements are supposed to be ordered the same way as for rebuild() method.
+
+    def getWarmup(self, streamName, sourceNames = ()):
+        if self._operators is None:
+            self._build()
+
+        targetIndexes = self._getTargetIndexes(sourceNames)
+
+        warmups = {}
+        for i, (config, operator) in enumerate(zip(self._configs, self._operators)):
+            sourceWarmup = max(
+                (
+                    warmups.get(mappedName, 0)
+                    for mappedName in config.streamMap.values()
+                    if targetIndexes.get(mappedName) != i
+                ),
+                default = 0
+            )
+            getWarmup = getattr(operator, "getWarmup", None)
+            for name, mappedName in config.streamMap.items():
+                if targetIndexes.get(mappedName) == i:
+                    warmups[mappedName] = sourceWarmup + (getWarmup(name) if getWarmup is not None else 0)
+
+        return warmups.get(streamName, 0)
 
     def calc(self):
+        if self._operators is None:
+            self._build()
+
         for operator in self._operators:
             operator.calc()
@@ -1,11 +1,11 @@
 from typing import final
 from enum import Enum
-from functools import partial
+from lib.times import MS_PER_MINUTE
 from bisect import bisect
 from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
+from lib.utils import mapDict
 from datacalc.stream import Stream
-from datacalc.compound import *
 from datacalc.indexops import *
 from datacalc.lineops import *
 
@@ -31,10 +31,14 @@ class Divergence:
 
 # Divergence detector.
 #
+# Co-indexed peak pairs are consumed one by one, and only the previous pair is kept
+# in operator state to get slopes of both sources. So adding or retroactively replacing
+# a peak costs O(1), with no intermediate lookup/delta streams to be recalculated.
+#
 # Params:
 #     (epsilon)                 - CoindexOperator parameter
-#     (threshold1)              - SlopeOperator parameter for source 1
-#     (threshold2)              - SlopeOperator parameter for source 2
+#     (threshold1 = 0.0)        - source 1 endpoint value difference, normalized to one-minute time interval, to recognize a slope
+#     (threshold2 = 0.0)        - source 2 endpoint value difference, normalized to one-minute time interval, to recognize a slope
 #                               
 # Streams:                      
 #     indexes1                  - IN  peak indexes of source 1
@@ -55,135 +59,115 @@ class DivergenceOperator:
     @initconfig
     @throwingmember
     def __init__(self, params, streams):
-        self._divergences = FilterStream(streams["divergences"])
+        try:
+            threshold1 = params.get("threshold1", 0.0)
+            if threshold1 < 0.0:
+                raise ParamError(f"Invalid threshold1 value ({threshold1})")
+            self._threshold1 = threshold1
+
+            threshold2 = params.get("threshold2", 0.0)
+            if threshold2 < 0.0:
+                raise ParamError(f"Invalid threshold2 value ({threshold2})")
+            self._threshold2 = threshold2
+        except Exception as e:
+            raise ParamError(e) from e
+
+        self._source1 = Stream(streams["source1"])
+        self._source2 = Stream(streams["source2"])
+        self._time = Stream(streams["time"])
+
+        self._divergences = Stream(streams["divergences"])
         self._lines1 = Stream(streams.get("lines1"))
         self._lines2 = Stream(streams.get("lines2"))
 
-        self._coindexes1 = Stream()
-        self._slopeTypes1 = Stream()
-        self._coindexes2 = Stream()
-        self._slopeTypes2 = Stream()
-        
-        self._slopeTypes1.setRetroactor(
-            partial(self._onRetroaction,
-                coindexes = self._coindexes1,
-                slopeTypes = self._slopeTypes1,
-                indexSelector = lambda divergence: divergence.index1
-            )
-        )
-        self._slopeTypes2.setRetroactor(
-            partial(self._onRetroaction,
-                coindexes = self._coindexes2,
-                slopeTypes = self._slopeTypes2,
-                indexSelector = lambda divergence: divergence.index2
-            )
-        )
+        coindexes1 = Stream()
+        coindexes2 = Stream()
 
-        self._slopeOperators = CompoundOperator(
-            configs = [
-                OperatorConfig(
-                    CoindexOperator,
-                    paramMap = {
-                        "epsilon": "epsilon"
-                    },
-                    streamMap = {
-                        "indexes1": "indexes1",
-                        "indexes2": "indexes2",
-                        "coindexes1": "coindexes1",
-                        "coindexes2": "coindexes2"
-                    }
-                ),
-                OperatorConfig(
-                    SlopeOperator,
-                    paramMap = {
-                        "threshold": "threshold1"
-                    },
-                    streamMap = {
-                        "indexes": "coindexes1",
-                        "source": "source1",
-                        "time": "time",
-                        "slopeTypes": "slopeTypes1"
-                    }
-                ),
-                OperatorConfig(
-                    SlopeOperator,
-                    paramMap = {
-                        "threshold": "threshold2"
-                    },
-                    streamMap = {
-                        "indexes": "coindexes2",
-                        "source": "source2",
-                        "time": "time",
-                        "slopeTypes": "slopeTypes2"
-                    }
-                )
-            ],
-            params = params,
+        self._coindexOperator = CoindexOperator(
+            params = mapDict(params, {
+                "epsilon": "epsilon"
+            }),
             streams = {
                 "indexes1": streams["indexes1"],
-                "source1": streams["source1"],
                 "indexes2": streams["indexes2"],
-                "source2": streams["source2"],
-                "time": streams["time"],
-
-                "coindexes1": self._coindexes1,
-                "coindexes2": self._coindexes2,
-                "slopeTypes1": self._slopeTypes1,
-                "slopeTypes2": self._slopeTypes2,
+                "coindexes1": coindexes1,
+                "coindexes2": coindexes2
             }
         )
 
+        self._coindexes1 = Stream(coindexes1, self._onRetroaction)
+        self._coindexes2 = Stream(coindexes2, self._onRetroaction)
+
+        # Previous co-indexed peak pair
+        self._prev1 = None
+        self._prev2 = None
+
     def calc(self):
-        self._slopeOperators.calc()
+        self._coindexOperator.calc()
 
-        for (i1, slopeType1), (i2, slopeType2) in zip(
-            self._slopeTypes1.indexed(), self._slopeTypes2.indexed(),
+        for i1, i2 in zip(
+            self._coindexes1, self._coindexes2,
             strict = True
         ):
-            divergenceType, divergenceClass = None, None
-            if slopeType1 == SlopeType.DOWN and slopeType2 == SlopeType.UP:
-                divergenceType, divergenceClass = DivergenceType.CONVERGENCE, DivergenceClass.A
-            elif slopeType1 == SlopeType.NONE and slopeType2 == SlopeType.UP:
-                divergenceType, divergenceClass = DivergenceType.CONVERGENCE, DivergenceClass.B
-            elif slopeType1 == SlopeType.DOWN and slopeType2 == SlopeType.NONE:
-                divergenceType, divergenceClass = DivergenceType.CONVERGENCE, DivergenceClass.C
-            elif maxSlopeType1 == SlopeType.UP and maxSlopeType2 == SlopeType.DOWN:
-                divergenceType, divergenceClass = DivergenceType.DIVERGENCE, DivergenceClass.A
-            elif maxSlopeType1 == SlopeType.NONE and maxSlopeType2 == SlopeType.DOWN:
-                divergenceType, divergenceClass = DivergenceType.DIVERGENCE, DivergenceClass.B
-            elif maxSlopeType1 == SlopeType.UP and maxSlopeType2 == SlopeType.NONE:
-                divergenceType, divergenceClass = DivergenceType.DIVERGENCE, DivergenceClass.C
-
-            if divergenceType is not None and divergenceClass is not None:
-                self._coindexes1.setPos(i1 - 1)
-                line1 = Line(
-                    self._coindexes1.getNext(),
-                    self._coindexes1.getNext()
-                )
-
-                self._coindexes2.setPos(i2 - 1)
-                line2 = Line(
-                    self._coindexes2.getNext(),
-                    self._coindexes2.getNext()
-                )
-
-                self._divergences.append(
-                    Divergence(
-                        divergenceType, 
-                        divergenceClass, 
-                        line1.endIndex, 
-                        line2.endIndex
+            if self._prev1 is not None and self._prev2 is not None:
+                slopeType1 = self._getSlopeType(self._source1, self._prev1, i1, self._threshold1)
+                slopeType2 = self._getSlopeType(self._source2, self._prev2, i2, self._threshold2)
+
+                divergenceType, divergenceClass = None, None
+                if slopeType1 == SlopeType.DOWN and slopeType2 == SlopeType.UP:
+                    divergenceType, divergenceClass = DivergenceType.CONVERGENCE, DivergenceClass.A
+                elif slopeType1 == SlopeType.NONE and slopeType2 == SlopeType.UP:
+                    divergenceType, divergenceClass = DivergenceType.CONVERGENCE, DivergenceClass.B
+                elif slopeType1 == SlopeType.DOWN and slopeType2 == SlopeType.NONE:
+                    divergenceType, divergenceClass = DivergenceType.CONVERGENCE, DivergenceClass.C
+                elif slopeType1 == SlopeType.UP and slopeType2 == SlopeType.DOWN:
+                    divergenceType, divergenceClass = DivergenceType.DIVERGENCE, DivergenceClass.A
+                elif slopeType1 == SlopeType.NONE and slopeType2 == SlopeType.DOWN:
+                    divergenceType, divergenceClass = DivergenceType.DIVERGENCE, DivergenceClass.B
+                elif slopeType1 == SlopeType.UP and slopeType2 == SlopeType.NONE:
+                    divergenceType, divergenceClass = DivergenceType.DIVERGENCE, DivergenceClass.C
+
+                if divergenceType is not None and divergenceClass is not None:
+                    self._divergences.append(
+                        Divergence(divergenceType, divergenceClass, i1, i2)
                     )
-                )
-                self._lines1.append(line1)
-                self._lines2.append(line2)
-
-    def _onRetroaction(self, change, index, coindexes, slopeTypes, indexSelector):
+                    self._lines1.append(Line(self._prev1, i1))
+                    self._lines2.append(Line(self._prev2, i2))
+
+            self._prev1 = i1
+            self._prev2 = i2
+
+    def _getSlopeType(self, source, index1, index2, threshold):
+        x1, x2 = source[index1], source[index2]
+        t1, t2 = self._time[index1], self._time[index2]
+        if x1 is None or x2 is None or t1 is None or t2 is None:
+            return None
+
+        slope = (x2 - x1) * MS_PER_MINUTE / (t2 - t1)
+        if slope > threshold:
+            return SlopeType.UP
+        elif slope < -threshold:
+            return SlopeType.DOWN
+        else:
+            return SlopeType.NONE
+
+    def _onRetroaction(self, change, index):
         if change.isAfter():
-            coindexes.setPos(index)
-            slopeTypes.setPos(index)
-
-            self._divergences.setLen(
-                bisect(self._divergences, coindexes[index - 1], key = indexSelector)
+            index = min(index, self._coindexes1.getPos(), self._coindexes2.getPos())
+            self._coindexes1.setPos(index)
+            self._coindexes2.setPos(index)
+
+            if index > 0:
+                self._prev1 = self._coindexes1[index - 1]
+                self._prev2 = self._coindexes2[index - 1]
+            else:
+                self._prev1 = None
+                self._prev2 = None
+
+            divergencesLen = (
+                bisect(self._divergences, self._prev1, key = lambda divergence: divergence.index1)
                 if index > 0 else 0
             )
+            self._divergences.setLen(divergencesLen)
+            self._lines1.setLen(min(divergencesLen, len(self._lines1)))
+            self._lines2.setLen(min(divergencesLen, len(self._lines2)))
@@ -1,5 +1,18 @@
+from math import ceil, log
 from lib.exceptions import ParamError
 from datacalc.mappers import SimpleMapper, PrevAwareMapper
+from datacalc.kernels import Kernels
+
+# Warm-up of recursive filters: the number of samples, after which the initial state
+# weighs less than the residual weight, given the weight decay per sample. Degenerate
+# filters, which never forget the initial state, get no warm-up, as none would help.
+
+RESIDUAL_WEIGHT = 0.01
+
+def getSettlingCount(decay):
+    if decay <= 0.0 or decay >= 1.0:
+        return 0
+    return ceil(log(RESIDUAL_WEIGHT) / log(decay))
 
 # Simple low-pass RC filter.
 #
@@ -34,7 +47,14 @@ def loPassMapper(source, alpha = None, rc = 10.0):
             )
         return y
 
-    return SimpleMapper(source, onTransform, False)
+    kernel = Kernels.get().loPass
+
+    def onTransformChunk(xs):
+        nonlocal y
+        ys, y = kernel(xs, alpha, y)
+        return ys
+
+    return SimpleMapper(source, onTransform, False, onTransformChunk, getSettlingCount(1.0 - alpha))
 
 # Simple low-pass RC filter applied to value delta.
 #
@@ -73,7 +93,14 @@ def deltaLoPassMapper(source, alpha = None, rc = 10.0):
             y += dy
         return y
 
-    return SimpleMapper(source, onTransform, False)
+    kernel = Kernels.get().deltaLoPass
+
+    def onTransformChunk(xs):
+        nonlocal y, dy
+        ys, y, dy = kernel(xs, alpha, y, dy)
+        return ys
+
+    return SimpleMapper(source, onTransform, False, onTransformChunk, 1 + getSettlingCount(1.0 - alpha))
 
 # Simple high-pass RC filter.
 #
@@ -108,4 +135,11 @@ def hiPassMapper(source, alpha = None, rc = 10.0):
             )
         return y
 
-    return PrevAwareMapper(source, onTransform, False)
+    kernel = Kernels.get().hiPass
+
+    def onTransformChunk(xs, prev):
+        nonlocal y
+        ys, _, y = kernel(xs, alpha, prev, y)
+        return ys
+
+    return PrevAwareMapper(source, onTransform, False, onTransformChunk, 1 + getSettlingCount(alpha))
@@ -0,0 +1,238 @@
+from typing import final
+from functools import partial
+from inspect import getfullargspec
+from copy import deepcopy
+from lib.exceptions import ConfigError
+from lib.decors import initconfig, throwingmember
+from datacalc.stream import Stream
+from datacalc.mappers import SimpleMapper, PrevAwareMapper
+from datacalc.basicops import MapperOperator, HwSplitOperator
+from datacalc.blocks import BLOCK_SIZE
+
+# Fused chain of element-wise operators.
+#
+# Runs a chain of mapper operators and half-wave splitters, reading the same source,
+# within a single loop. Chain is compiled into a kernel function, which keeps all the
+# intermediate values and previous values of mappers in its local variables, so no
+# intermediate streams are needed.
+#
+# Chains are detected and fused by compound operator (see fuseConfigs() function),
+# so there is no need to use fused operator directly.
+#
+# Params:
+#     "<stage index>.<mapper input argument>" - input arguments of chain mappers
+#
+# Streams:
+#     source        - IN
+#     out.<name>    - OUT chain stream of the specified name
+#
+# Recurrent mappers can't be rolled back, so the state of the chain is saved each
+# _CHECKPOINT_SIZE source samples, and past source data change causes the chain to be
+# recalculated from the last checkpoint before the changed index. Output streams are
+# changed starting from the changed index only though.
+
+_CHECKPOINT_SIZE = BLOCK_SIZE
+
+def fusedOperator(stages, outputNames):
+    return partial(FusedOperator, stages, outputNames)
+
+@final
+class FusedOperator:
+
+    @initconfig
+    @throwingmember
+    def __init__(self, stages, outputNames, params, streams):
+        self._stages = stages
+        self._params = params
+
+        self._source = Stream(streams["source"], self._onRetroaction)
+        self._outputs = [
+            Stream(streams[f"out.{name}"])
+            for name in outputNames
+        ]
+
+        self._reset()
+        self._kernel = _compileKernel(
+            stages, outputNames,
+            [isinstance(mapper, PrevAwareMapper) for mapper in self._mappers]
+        )
+
+    def _reset(self):
+        self._mappers = [
+            self._buildMapper(i, stage[1])
+            for i, stage in enumerate(self._stages)
+            if stage[0] == "map"
+        ]
+        self._prevs = [None] * len(self._mappers)
+        # Saved states of the chain, as (source index, (mappers, prevs)) pairs
+        self._checkpoints = []
+
+    def _buildMapper(self, stageIndex, mapperType):
+        argNames = getfullargspec(mapperType).args
+        prefix = f"{stageIndex}."
+        args = {
+            argName: self._params[prefix + argName]
+            for argName in argNames
+            if prefix + argName in self._params and argName not in ("self", "source", "retroactor")
+        }
+
+        mapper = mapperType(None, **args)
+        if not isinstance(mapper, SimpleMapper):
+            raise ConfigError(f"Mapper {mapperType.__name__} can't be fused")
+        return mapper
+
+    def calc(self):
+        start = self._source.getPos()
+        chunk = self._source.getNextChunk()
+        transformers = [mapper.transformer for mapper in self._mappers]
+
+        # Chunk is calculated in parts split by checkpoints, to save the state there
+        pos = start
+        for stop in [
+            *range((start // _CHECKPOINT_SIZE + 1) * _CHECKPOINT_SIZE, start + len(chunk), _CHECKPOINT_SIZE),
+            start + len(chunk)
+        ]:
+            part = chunk if pos == start and stop == start + len(chunk) else chunk[pos - start:stop - start]
+            results = self._kernel(part, transformers, self._prevs)
+
+            for output, values in zip(self._outputs, results, strict = True):
+                # After past data change, outputs are kept up to the changed index
+                skip = len(output) - pos
+                output.extend(values[skip:] if skip > 0 else values)
+
+            pos = stop
+            if pos % _CHECKPOINT_SIZE == 0 and pos > 0 and (
+                not self._checkpoints or self._checkpoints[-1][0] < pos
+            ):
+                self._checkpoints.append((pos, deepcopy((self._mappers, self._prevs))))
+
+    # Warm-up of output stream is composed of warm-ups of mappers along the chain to it.
+
+    def getWarmup(self, streamName):
+        warmups = {getStageStreams(self._stages[0])[0][0]: 0}
+        mappers = iter(self._mappers)
+        for stage in self._stages:
+            (inName,), outNames = getStageStreams(stage)
+            warmup = warmups[inName] + (next(mappers).warmup if stage[0] == "map" else 0)
+            for outName in outNames:
+                warmups[outName] = warmup
+        return warmups[streamName.removeprefix("out.")]
+
+    def _onRetroaction(self, change, index):
+        if change.isAfter():
+            # Source data before the changed index is the same, so are the checkpoints there
+            while self._checkpoints and self._checkpoints[-1][0] > index:
+                self._checkpoints.pop()
+
+            if self._checkpoints:
+                pos, state = self._checkpoints[-1]
+                self._mappers, self._prevs = deepcopy(state)
+            else:
+                pos = 0
+                self._reset()
+
+            self._source.setPos(pos)
+            for output in self._outputs:
+                if len(output) > index:
+                    output.setLen(index)
+
+# Returns fusion stage, equivalent to the specified operator config, or None if the operator
+# can't be fused. Stage is one of the tuples:
+#     "map", mapper type, source name, target name
+#     "split", source name, positive name, negative name
+
+def getFusionStage(config):
+    operatorType = config.operatorType
+    streamMap = config.streamMap
+
+    if type(operatorType) == partial and operatorType.func == MapperOperator:
+        if streamMap.keys() != {"source", "target"}:
+            return None
+        return "map", operatorType.args[0], streamMap["source"], streamMap["target"]
+
+    if operatorType == HwSplitOperator:
+        if streamMap.keys() != {"source", "positive", "negative"}:
+            return None
+        return "split", streamMap["source"], streamMap["positive"], streamMap["negative"]
+
+    return None
+
+# Returns names of the streams read by the stage, and names of the streams written by it.
+
+def getStageStreams(stage):
+    if stage[0] == "map":
+        return (stage[2],), (stage[3],)
+    else:
+        return (stage[1],), (stage[2], stage[3])
+
+# Kernels are cached by chain structure, so equal chains share the same compiled code.
+
+_kernels = {}
+
+def _compileKernel(stages, outputNames, prevAwareFlags):
+    varNames = {}
+    def getVarName(streamName):
+        return varNames.setdefault(streamName, f"v{len(varNames)}")
+
+    sourceVarName = getVarName(getStageStreams(stages[0])[0][0])
+    body = []
+    mapperIndex = 0
+    for stage in stages:
+        if stage[0] == "map":
+            i = mapperIndex
+            mapperIndex += 1
+            x, y = getVarName(stage[2]), getVarName(stage[3])
+            if prevAwareFlags[i]:
+                body += [
+                    f"{y} = t{i}({x}, p{i})",
+                    f"p{i} = {x}"
+                ]
+            else:
+                body.append(f"{y} = t{i}({x})")
+        else:
+            # Same as max(x, 0.0) and min(x, 0.0) calls of half-wave splitter
+            x, pos, neg = getVarName(stage[1]), getVarName(stage[2]), getVarName(stage[3])
+            body += [
+                f"if {x} is None:",
+                f"    {pos} = {neg} = None",
+                "else:",
+                f"    {pos} = 0.0 if 0.0 > {x} else {x}",
+                f"    {neg} = 0.0 if 0.0 < {x} else {x}"
+            ]
+    outputVarNames = [getVarName(name) for name in outputNames]
+
+    key = (tuple(body), tuple(outputVarNames))
+    kernel = _kernels.get(key)
+    if kernel is not None:
+        return kernel
+
+    transformerNames = "".join(f"t{i}, " for i in range(mapperIndex))
+    prevNames = "".join(f"p{i}, " for i in range(mapperIndex))
+    outNames = "".join(f"out{j}, " for j in range(len(outputVarNames)))
+
+    lines = [
+        "def kernel(source, transformers, prevs):",
+        f"    ({transformerNames}) = transformers",
+        f"    ({prevNames}) = prevs"
+    ]
+    for j in range(len(outputVarNames)):
+        lines += [
+            f"    out{j} = []",
+            f"    append{j} = out{j}.append"
+        ]
+    lines.append(f"    for {sourceVarName} in source:")
+    lines += [f"        {line}" for line in body]
+    lines += [
+        f"        append{j}({varName})"
+        for j, varName in enumerate(outputVarNames)
+    ]
+    lines += [
+        f"    prevs[:] = ({prevNames})",
+        f"    return ({outNames})"
+    ]
+
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    kernel = namespace["kernel"]
+    _kernels[key] = kernel
+    return kernel
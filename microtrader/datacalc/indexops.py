@@ -5,16 +5,17 @@ from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
 from datacalc.stream import Stream
 from datacalc.validators import noDecreaseValidator
+from datacalc.sparse import Point
 
 # Value picker.
 #
-# Picks values from source into target by given index list in "sparse" manner.
+# Picks values from source by given index list in "sparse" manner.
 # Target is suitable for rendering individual points along with other value graphs.
 #
 # Streams:
-#     indexes - IN
-#     source  - IN
-#     target  - OUT
+#     indexes         - IN
+#     source          - IN
+#     target: [Point] - OUT
 
 @final
 class PickOperator:
@@ -27,19 +28,14 @@ class PickOperator:
         self._target = Stream(streams["target"])
 
     def calc(self):
-        self._target.setLen(len(self._source))
-
-        for i in self._indexes:
-            self._source.setPos(i)
-            self._target[i] = self._source.getNext()
+        self._target.extend(
+            Point(i, self._source[i])
+            for i in self._indexes
+        )
 
     def _onRetroaction(self, change, index):
         if change.isAfter():
-            self._source.setPos(
-                self._indexes.peekSource(index - 1) + 1
-                if index > 0 else 0
-            )
-            self._target.setLen(self._source.getPos())
+            self._target.setLen(index)
 
 # Value lookup.
 #
@@ -78,14 +74,21 @@ class LookupOperator:
 #
 # Calculates relaxed intersection of index sets, represented by ordered lists of indexes.
 #
+# Index lists are merge-joined in a single pass, no matter how many of them are given.
+# Indexes are matched when all of them fit within epsilon range. The head index of each
+# list, which is already read but not matched yet, is carried over between calc() calls,
+# so no matches are lost at chunk boundaries.
+#
 # Params:
 #     (epsilon = 2) - maximum difference between index values to accept their match
 #
 # Streams:
 #     indexes1      - IN  ordered index list 1
 #     indexes2      - IN  ordered index list 2
-#     coindexes1    - OUT indexes from list 1 matched with indexes from list2
-#     coindexes2    - OUT indexes from list 2 matched with indexes from list1
+#     (indexesN)    - IN  ordered index list N, for any number of successively numbered lists
+#     coindexes1    - OUT indexes from list 1 matched with indexes from all other lists
+#     coindexes2    - OUT indexes from list 2 matched with indexes from all other lists
+#     (coindexesN)  - OUT indexes from list N matched with indexes from all other lists
 
 @final
 class CoindexOperator:
@@ -101,56 +104,59 @@ class CoindexOperator:
         except Exception as e:
             raise ParamError(e) from e
 
-        self._indexes1 = increaseValidator(streams["indexes1"])
-        self._coindexes1 = Stream(streams["coindexes1"])
-        self._indexes2 = increaseValidator(streams["indexes2"])
-        self._coindexes2 = Stream(streams["coindexes2"])
-
-        self._indexes1.setRetroactor(
-            partial(self._onRetroaction,
-                indexes = indexes1,
-                coindexes = self._coindexes
-            )
-        )
-        self._indexes2.setRetroactor(
-            partial(self._onRetroaction,
-                indexes = indexes2,
-                coindexes = self._coindexes2
+        self._indexes = []
+        self._coindexes = []
+        while f"indexes{len(self._indexes) + 1}" in streams:
+            n = len(self._indexes) + 1
+            self._indexes.append(
+                Stream(streams[f"indexes{n}"], partial(self._onRetroaction, n = n - 1))
             )
-        )
+            self._coindexes.append(Stream(streams[f"coindexes{n}"]))
+
+        if len(self._indexes) < 2:
+            raise ValueError("At least two index lists should be specified")
+
+        # Carried over head indexes, read from index lists but not matched yet
+        self._heads = [None] * len(self._indexes)
 
     def calc(self):
-        indexes1 = iter(self._indexes1)
-        indexes2 = iter(self._indexes2)
+        heads = self._heads
+        count = len(heads)
         try:
             while True:
-                i1 = next(indexes1)
-                while True:
-                    i2 = next(indexes2)
-                    if i2 >= i1 - self._epsilon:
-                        break
-
-                if i1 >= i2 - self._epsilon:
-                    self._coindexes1.append(i1)
-                    self._coindexes2.append(i2)
-
-                i2 = next(indexes2)
-                while True:
-                    i1 = next(indexes1)
-                    if i1 >= i2 - self._epsilon:
-                        break
-
-                if i2 >= i1 - self._epsilon:
-                    self._coindexes1.append(i1)
-                    self._coindexes2.append(i2)
-        except StopIteration:
+                for n in range(count):
+                    if heads[n] is None:
+                        heads[n] = self._getNext(n)
+
+                lo, hi = min(heads), max(heads)
+                if hi - lo <= self._epsilon:
+                    for n in range(count):
+                        self._coindexes[n].append(heads[n])
+                        heads[n] = None
+                else:
+                    # Lowest head can't be matched with current or further index of the list having the highest head
+                    heads[heads.index(lo)] = None
+        except IndexError:
             pass
 
-    def _onRetroaction(self, change, index, indexes, coindexes):
+    def _getNext(self, n):
+        indexes = self._indexes[n]
+        i = indexes.getNext()
+        pos = indexes.getPos()
+        if pos > 1 and i <= indexes[pos - 2]:
+            raise ValueError(f"Index list {n + 1} is out of sequence")
+        return i
+
+    def _onRetroaction(self, change, index, n):
         if change.isAfter():
             coindexesLen = (
-                bisect(coindexes, indexes.peekSource(index - 1))
+                bisect(self._coindexes[n], self._indexes[n][index - 1])
                 if index > 0 else 0
             )
-            self._coindexes1.setLen(coindexesLen)
-            self._coindexes2.setLen(coindexesLen)
+            for indexes, coindexes in zip(self._indexes, self._coindexes):
+                coindexes.setLen(coindexesLen)
+                indexes.setPos(
+                    bisect(indexes, coindexes[-1])
+                    if coindexesLen > 0 else 0
+                )
+            self._heads[:] = [None] * len(self._heads)
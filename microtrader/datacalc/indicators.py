@@ -3,6 +3,7 @@ from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
 from lib.utils import mapDict
 from datacalc.stream import Stream
+from datacalc.kernels import Kernels
 from datacalc.compound import *
 from datacalc.basicmaps import *
 from datacalc.basicops import *
@@ -38,13 +39,11 @@ class SmaOperator:
         self._movingCount = 0
 
     def calc(self):
-        for i, a in self._source.indexed():
+        for a, b in self._source.window(self._lag):
             if a is not None:
                 self._movingSum += a
                 self._movingCount += 1
 
-            j = i - self._lag
-            b = self._source[j] if j >= 0 else None
             if b is not None:
                 self._movingSum -= b
                 self._movingCount -= 1
@@ -55,6 +54,9 @@ class SmaOperator:
                 else self._movingSum / self._movingCount
             )
 
+    def getWarmup(self, streamName):
+        return self._lag - 1
+
 # Exponential Moving Average.
 #
 # Params:
@@ -84,6 +86,9 @@ class EmaOperator:
     def calc(self):
         self._target.extend(self._loPassMapper)
 
+    def getWarmup(self, streamName):
+        return self._loPassMapper.warmup
+
 # Kaufman's Effective Ratio.
 #
 # Params:
@@ -114,26 +119,23 @@ class KerOperator:
         self._bPrev = None
         self._movingVolatility = 0.0
 
+        # Last source values (up to lag ones), to get lagged values of the next chunk
+        self._history = []
+        self._kernel = Kernels.get().ker
+
     def calc(self):
-        for i, a in self._source.indexed():
-            if a is not None and self._aPrev is not None:
-                self._movingVolatility += abs(a - self._aPrev)
-            self._aPrev = a
-
-            j = i - self._lag
-            b = self._source[j] if j >= 0 else None
-            if b is not None and self._bPrev is not None:
-                self._movingVolatility -= abs(b - self._bPrev)
-            self._bPrev = b
-
-            if a is None or b is None:
-                y = None
-            else:
-                try:
-                    y = abs(a - b) / self._movingVolatility
-                except ZeroDivisionError:
-                    y = 1.0
-            self._ker.append(y)
+        xs = self._history
+        start = len(xs)
+        xs.extend(self._source.getNextChunk())
+        ys, self._aPrev, self._bPrev, self._movingVolatility = self._kernel(
+            xs, start, self._lag,
+            self._aPrev, self._bPrev, self._movingVolatility
+        )
+        self._history = xs[-self._lag:]
+        self._ker.extend(ys)
+
+    def getWarmup(self, streamName):
+        return self._lag
 
 # Kaufman's Adaptive Moving Average.
 #
@@ -169,6 +171,7 @@ class KamaOperator:
 
             self._fastAlpha = 2.0 / (fastLag + 1.0)
             self._slowAlpha = 2.0 / (slowLag + 1.0)
+            self._kerLag = kerLag
         except Exception as e:
             raise ParamError(e) from e
 
@@ -204,6 +207,13 @@ class KamaOperator:
 
         self._finalOperator.calc()
 
+    # Adaptive filter settles not later than the slowest one.
+
+    def getWarmup(self, streamName):
+        if streamName == "ker":
+            return self._kerLag
+        return self._kerLag + getSettlingCount(1.0 - self._slowAlpha)
+
 # Relative Strength Index.
 #
 # Params:
@@ -285,7 +295,7 @@ class RsiOperator:
         self._udMaOperator.calc()
 
         for uMa, dMa in zip(
-            self._uMa, self._dMa,
+            self._uMa.getNextChunk(), self._dMa.getNextChunk(),
             strict = True
         ):
             if uMa is None or dMa is None:
@@ -297,6 +307,12 @@ class RsiOperator:
                     rsi = 50.0
             self._target.append(rsi)
 
+    def getWarmup(self, streamName):
+        return max(
+            self._udMaOperator.getWarmup("uMa", ["source"]),
+            self._udMaOperator.getWarmup("dMa", ["source"])
+        )
+
 # Moving Average Convergence/Divergence.
 #
 # Params:
@@ -369,6 +385,9 @@ class MacdOperator:
     def calc(self):
         self._operator.calc()
 
+    def getWarmup(self, streamName):
+        return self._operator.getWarmup("target", ["source"])
+
 # Channel outliner.
 #
 # Params:
@@ -485,7 +504,7 @@ class ChannelOperator:
         self._preOperator.calc()
 
         for mid, pos, neg in zip(
-            self._mid, self._pos, self._neg,
+            self._mid.getNextChunk(), self._pos.getNextChunk(), self._neg.getNextChunk(),
             strict = True
         ):
             if mid is None:
@@ -507,3 +526,12 @@ class ChannelOperator:
                     None if pos is None
                     else mid + self._boost * neg
                 )
+
+    def getWarmup(self, streamName):
+        warmups = {
+            name: self._preOperator.getWarmup(name, ["source"])
+            for name in ("mid", "pos", "neg")
+        }
+        if streamName == "mid":
+            return warmups["mid"]
+        return max(warmups.values())
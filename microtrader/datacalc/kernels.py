@@ -0,0 +1,52 @@
+from typing import final
+from importlib import import_module
+from lib.exceptions import ParamError
+
+# Calculation kernel backends.
+#
+# Operators run their inner loops by kernels of the selected backend:
+#     python - reference kernels in pure Python (see datacalc.pykernels module)
+#     numba  - the same kernels compiled by Numba (see datacalc.numbakernels module)
+#
+# Backend is supposed to be selected once at startup, before any operator is built,
+# since operators get their kernels on construction. Python backend is used by default.
+
+@final
+class Kernels:
+
+    _modules = {
+        "python": "datacalc.pykernels",
+        "numba": "datacalc.numbakernels"
+    }
+    _backendName = "python"
+    _backend = None
+
+    @staticmethod
+    def getBackendNames():
+        return Kernels._modules.keys()
+
+    @staticmethod
+    def getBackendName():
+        return Kernels._backendName
+
+    @staticmethod
+    def select(backendName):
+        Kernels._backend = Kernels._importBackend(backendName)
+        Kernels._backendName = backendName
+
+    # Returns kernels of the selected backend, or of the specified one.
+
+    @staticmethod
+    def get(backendName = None):
+        if backendName is not None:
+            return Kernels._importBackend(backendName)
+        if Kernels._backend is None:
+            Kernels.select(Kernels._backendName)
+        return Kernels._backend
+
+    @staticmethod
+    def _importBackend(backendName):
+        moduleName = Kernels._modules.get(backendName)
+        if moduleName is None:
+            raise ParamError(f"Unknown kernel backend ({backendName})")
+        return import_module(moduleName)
@@ -1,9 +1,11 @@
 from typing import final
 from enum import Enum
-from datetime import timedelta
+from lib.times import MS_PER_MINUTE
 from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
 from datacalc.stream import Stream
+from datacalc.sparse import Segment
+from datacalc.validators import sequenceValidator
 from datacalc.compound import *
 
 @final
@@ -22,9 +24,9 @@ class SlopeType(Enum):
 # Line plotter.
 #
 # Streams:
-#     lines: [Lines] - IN
-#     source         - IN
-#     target         - OUT
+#     lines: [Line]     - IN
+#     source            - IN
+#     target: [Segment] - OUT
 
 @final
 class LineOperator:
@@ -44,34 +46,17 @@ class LineOperator:
         self._target = Stream(streams["target"])
 
     def calc(self):
-        self._target.setLen(len(self._source))
-
-        for line in self._lines:
-            startIndex, endIndex = line.startIndex, line.endIndex
-            if startIndex > endIndex: startIndex, endIndex = endIndex, startIndex
-
-            self._source.setPos(startIndex)
-            xStart = self._source.getNext()
-            self._source.setPos(endIndex)
-            xEnd = self._source.getNext()
-            
-            if startIndex < endIndex:
-                delta = (xEnd - xStart) / (endIndex - startIndex)
-                x = xStart
-                for i in range(startIndex, endIndex):
-                    self._target[i] = x
-                    x += delta
-            self._target[endIndex] = xEnd
+        self._target.extend(
+            Segment(
+                line.startIndex, line.endIndex,
+                self._source[line.startIndex], self._source[line.endIndex]
+            )
+            for line in self._lines
+        )
 
     def _onRetroaction(self, change, index):
         if change.isAfter():
-            if index > 0:
-                prevLine = self._lines.peekSource(index - 1)
-                self._source.setPos(max(prevLine.startIndex, prevLine.endIndex) + 1)
-            else:
-                self._source.setPos(0)
-
-            self._target.setLen(self._source.getPos())
+            self._target.setLen(index)
 
 # Slope detector.
 #
@@ -154,7 +139,7 @@ class SlopeOperator:
             if dx is None or dt is None:
                 slopeType = None
             else:
-                slope = dx / (dt / timedelta(minutes = 1))
+                slope = dx * MS_PER_MINUTE / dt
                 if slope > self._threshold:
                     slopeType = SlopeType.UP
                 elif slope < -self._threshold:
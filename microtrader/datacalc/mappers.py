@@ -1,20 +1,57 @@
+from copy import copy, deepcopy
+from types import FunctionType, CellType
 from datacalc.stream import Stream
 
+# Chunk transformer, if specified, is used instead of transformer to transform all the
+# available source values at once, and must give the same results.
+#
+# Warm-up is the number of leading source samples needed before the mapped values are
+# settled, e.g. the previous sample for the prev-aware mappers.
+
 class SimpleMapper:
 
-    def __init__(self, source, transformer, retroactor = None):
+    def __init__(self, source, transformer, retroactor = None, chunkTransformer = None, warmup = 0):
         self._source = Stream(source)
+        self._warmup = warmup
         self._transformer = transformer
+        self._chunkTransformer = chunkTransformer
         self._retroactor = retroactor if type(retroactor) != bool else None
         if type(retroactor) != bool or retroactor:
             self._source.setRetroactor(self._onRetroaction)
 
     def __iter__(self):
+        if self._chunkTransformer is not None:
+            return iter(self._chunkTransformer(self._source.getNextChunk()))
         return (
             self._transformer(value) 
             for value in self._source
         )
 
+    # Transformer function, to be called directly by fused operator chains
+    # (see datacalc.fusion module).
+
+    @property
+    def transformer(self):
+        return self._transformer
+
+    @property
+    def warmup(self):
+        return self._warmup
+
+    # Deep copy of mapper (e.g. as a part of processor fork) copies the state of its
+    # transformers as well, which is kept in their closures.
+
+    def __deepcopy__(self, memo):
+        mapper = copy(self)
+        memo[id(self)] = mapper
+        for name, value in vars(self).items():
+            setattr(
+                mapper, name,
+                _copyFunction(value, memo) if type(value) == FunctionType
+                else deepcopy(value, memo)
+            )
+        return mapper
+
     def peekSource(self, index):
         return self._source[index]
 
@@ -26,11 +63,20 @@ class SimpleMapper:
 
 class PrevAwareMapper(SimpleMapper):
 
-    def __init__(self, source, transformer, retroactor = None):
-        SimpleMapper.__init__(self, source, transformer, retroactor)
+    def __init__(self, source, transformer, retroactor = None, chunkTransformer = None, warmup = 1):
+        SimpleMapper.__init__(self, source, transformer, retroactor, chunkTransformer, warmup)
         self._prev = None
 
     def __iter__(self):
+        if self._chunkTransformer is not None:
+            values = self._source.getNextChunk()
+            transformed = self._chunkTransformer(values, self._prev)
+            if values:
+                self._prev = values[-1]
+            return iter(transformed)
+        return self._iterValues()
+
+    def _iterValues(self):
         for value in self._source:
             transformed = self._transformer(value, self._prev)
             self._prev = value
@@ -40,3 +86,29 @@ class PrevAwareMapper(SimpleMapper):
         if change.isAfter():
             self._prev = self._source[index - 1] if index > 0 else None
         SimpleMapper._onRetroaction(self, change, index)
+
+def _copyFunction(func, memo):
+    if func.__closure__ is None:
+        return func
+
+    copied = memo.get(id(func))
+    if copied is None:
+        copied = FunctionType(
+            func.__code__, func.__globals__, func.__name__, func.__defaults__,
+            tuple(_copyCell(cell, memo) for cell in func.__closure__)
+        )
+        copied.__kwdefaults__ = func.__kwdefaults__
+        memo[id(func)] = copied
+    return copied
+
+def _copyCell(cell, memo):
+    copied = memo.get(id(cell))
+    if copied is None:
+        copied = CellType()
+        memo[id(cell)] = copied
+        contents = cell.cell_contents
+        copied.cell_contents = (
+            _copyFunction(contents, memo) if type(contents) == FunctionType
+            else deepcopy(contents, memo)
+        )
+    return copied
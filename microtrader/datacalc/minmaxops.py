@@ -5,6 +5,7 @@ from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
 from lib.utils import mapDict
 from datacalc.stream import Stream
+from datacalc.kernels import Kernels
 from datacalc.indicators import ChannelOperator
 
 @final
@@ -40,35 +41,49 @@ class MinMaxOperator:
         self._min = Stream(streams["min"])
         self._max = Stream(streams["max"])
 
+        # Candidate (index, value) pairs, in order of index
         self._minDeque = deque()
         self._maxDeque = deque()
 
     def calc(self):
-        for i, x in self._source.indexed():
+        minDeque = self._minDeque
+        maxDeque = self._maxDeque
+        lag = self._lag
+
+        start = self._source.getPos()
+        mins = []
+        maxs = []
+        for i, x in enumerate(self._source.getNextChunk(), start):
             if x is not None:
-                while self._minDeque and self._source[self._minDeque[-1]] >= x:
-                    self._minDeque.pop()
-                self._minDeque.append(i)
-
-                while self._maxDeque and self._source[self._maxDeque[-1]] <= x:
-                    self._maxDeque.pop()
-                self._maxDeque.append(i)
-
-            j = max(0, i - self._lag)
-            while self._minDeque and self._minDeque[0] < j:
-                self._minDeque.popleft()
-            while self._maxDeque and self._maxDeque[0] < j:
-                self._maxDeque.popleft()
-
-            self._min.append(
-                None if not self._minDeque
-                else self._source[self._minDeque[0]]
+                while minDeque and minDeque[-1][1] >= x:
+                    minDeque.pop()
+                minDeque.append((i, x))
+
+                while maxDeque and maxDeque[-1][1] <= x:
+                    maxDeque.pop()
+                maxDeque.append((i, x))
+
+            j = max(0, i - lag)
+            while minDeque and minDeque[0][0] < j:
+                minDeque.popleft()
+            while maxDeque and maxDeque[0][0] < j:
+                maxDeque.popleft()
+
+            mins.append(
+                None if not minDeque
+                else minDeque[0][1]
             )
-            self._max.append(
-                None if not self._maxDeque
-                else self._source[self._maxDeque[0]]
+            maxs.append(
+                None if not maxDeque
+                else maxDeque[0][1]
             )
 
+        self._min.extend(mins)
+        self._max.extend(maxs)
+
+    def getWarmup(self, streamName):
+        return self._lag
+
 # Fractal-based peak detector with additional burst threshold and min/max criterias.
 #
 # Params:
@@ -129,63 +144,60 @@ class FractalExOperator:
             }
         )
 
-        self._prev = None
-        self._sign = None
-        self._signCount = None
-        self._trend = None
-        self._prevTrend = None
+        # State of fractal kernel (see datacalc.pykernels.fractal)
+        self._state = (None, None, None, None, None, None, None)
+
+        # Source and min/max values since the start of the current trend (the last
+        # sign change), starting from the index base, to look back at them
+        self._xs = []
+        self._mins = []
+        self._maxs = []
+        self._base = 0
+
+        self._kernel = Kernels.get().fractal
 
     def calc(self):
         self._minMaxOperator.calc()
 
-        for i, x in self._source.indexed():
-            if x is None or self._prev is None:
-                self._sign = None
-                self._signCount = None
-                self._trend = None
-                self._prevTrend = None
+        start = self._source.getPos()
+        self._xs += self._source.getNextChunk()
+        self._mins += self._min.getNextChunk()
+        self._maxs += self._max.getNextChunk()
+
+        prev, sign, signCount, trend, prevTrend, _, _ = self._state
+        self._state = (
+            prev, sign, signCount, trend, prevTrend,
+            self._minIndexes[-1] if self._minIndexes else None,
+            self._maxIndexes[-1] if self._maxIndexes else None
+        )
+
+        peaks, self._state = self._kernel(
+            self._xs, self._mins, self._maxs, self._base, start,
+            self._halfWidth, self._threshold, self._minMaxLag, self._state
+        )
+
+        for sign, index, isReplacing in peaks:
+            if sign == 1:
+                indexes, discardedIndexes = self._minIndexes, self._discardedMinIndexes
+            else:
+                indexes, discardedIndexes = self._maxIndexes, self._discardedMaxIndexes
+            if isReplacing:
+                discardedIndexes.append(indexes[-1])
+                indexes[-1] = index
             else:
-                dx = x - self._prev
-                if dx > 0:
-                    sign = 1
-                elif dx < 0:
-                    sign = -1
-                else:
-                    sign = 0
-
-                if sign == self._sign:
-                    self._signCount += 1
-                else:
-                    self._sign = sign
-                    self._signCount = 1
-                    self._prevTrend = self._trend
-                    self._trend = None
-
-                if self._sign != self._trend and self._signCount >= self._halfWidth:
-                    iStart = i - self._signCount
-                    xStart = self._source[iStart]
-
-                    if abs(x - xStart) >= self._threshold:
-                        if self._prevTrend in [-1, 1]:
-                            j = max(0, i - self._minMaxLag)
-                            if self._sign == 1:
-                                if xStart <= self._min[iStart]:
-                                    if self._minIndexes and self._minIndexes[-1] >= j:
-                                        self._discardedMinIndexes.append(self._minIndexes[-1])
-                                        self._minIndexes[-1] = iStart
-                                    else:
-                                        self._minIndexes.append(iStart)
-                            elif self._sign == -1:
-                                if xStart >= self._max[iStart]:
-                                    if self._maxIndexes and self._maxIndexes[-1] >= j:
-                                        self._discardedMaxIndexes.append(self._maxIndexes[-1])
-                                        self._maxIndexes[-1] = iStart
-                                    else:
-                                        self._maxIndexes.append(iStart)
-
-                        self._trend = self._sign
-
-            self._prev = x
+                indexes.append(index)
+
+        signCount = self._state[2]
+        base = max(0, self._base + len(self._xs) - 1 - (signCount or 0))
+        del self._xs[:base - self._base]
+        del self._mins[:base - self._base]
+        del self._maxs[:base - self._base]
+        self._base = base
+
+    # Peak is recognized within the moving min/max window, once the trend is settled.
+
+    def getWarmup(self, streamName):
+        return self._minMaxLag + self._halfWidth
 
 # Channel-based peak detector.
 #
@@ -0,0 +1,243 @@
+import math
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError as e:
+    raise RuntimeError("Numba kernel backend requires numba and numpy packages") from e
+
+# Calculation kernels compiled by Numba.
+#
+# Kernels have the same interface as the reference ones (see datacalc.pykernels module),
+# while their compiled parts run over contiguous float64 arrays, with NaN for missing
+# values. So source values are expected to be never NaN themselves.
+#
+# Integer state values, which may be missing, are passed as _NONE.
+#
+# Float streams keep their values in list blocks, with None for missing values (see
+# datacalc.blocks), so there are no arrays to pass through: source chunks are converted
+# to arrays and the results back to lists on each call. Measured on 1000-sample chunks,
+# the conversions take about 45ns (to array) and 35ns (back to list) per sample, while
+# the compiled loops take 5-10ns. So the backend gains mostly on the kernels with heavier
+# loops (e.g. fractal), and loses to the Python one on single-sample chunks, where about
+# 1us per call is spent on the conversions.
+
+_NONE = -2
+
+# Results of up to that size are scanned for NaN in Python, as NumPy call overhead
+# outweighs the gain on small arrays
+_NAN_SCAN_SIZE = 128
+
+def _toArray(values):
+    # None is converted to NaN
+    return np.array(values, dtype = np.float64)
+
+def _fromArray(values):
+    result = values.tolist()
+    if len(result) <= _NAN_SCAN_SIZE:
+        return [None if value != value else value for value in result]
+    for i in np.flatnonzero(np.isnan(values)).tolist():
+        result[i] = None
+    return result
+
+def _toFloat(value):
+    return math.nan if value is None else value
+
+def _fromFloat(value):
+    return None if math.isnan(value) else value
+
+def _toInt(value):
+    return _NONE if value is None else value
+
+def _fromInt(value):
+    return None if value == _NONE else value
+
+@njit(cache = True)
+def _loPass(xs, alpha, y):
+    ys = np.empty_like(xs)
+    for i in range(len(xs)):
+        x = xs[i]
+        if math.isnan(x):
+            y = math.nan
+        elif math.isnan(y):
+            y = x
+        else:
+            y = y + alpha * (x - y)
+        ys[i] = y
+    return ys, y
+
+def loPass(xs, alpha, y):
+    ys, y = _loPass(_toArray(xs), alpha, _toFloat(y))
+    return _fromArray(ys), _fromFloat(y)
+
+@njit(cache = True)
+def _deltaLoPass(xs, alpha, y, dy):
+    ys = np.empty_like(xs)
+    for i in range(len(xs)):
+        x = xs[i]
+        if math.isnan(x) or math.isnan(y):
+            y = x
+            dy = math.nan
+        else:
+            d = x - y
+            if math.isnan(dy):
+                dy = d
+            else:
+                dy = dy + alpha * (d - dy)
+            y += dy
+        ys[i] = y
+    return ys, y, dy
+
+def deltaLoPass(xs, alpha, y, dy):
+    ys, y, dy = _deltaLoPass(_toArray(xs), alpha, _toFloat(y), _toFloat(dy))
+    return _fromArray(ys), _fromFloat(y), _fromFloat(dy)
+
+@njit(cache = True)
+def _hiPass(xs, alpha, prev, y):
+    ys = np.empty_like(xs)
+    for i in range(len(xs)):
+        x = xs[i]
+        if math.isnan(x) or math.isnan(prev):
+            y = math.nan
+        elif math.isnan(y):
+            y = 0.0
+        else:
+            y = alpha * (y + (x - prev))
+        prev = x
+        ys[i] = y
+    return ys, prev, y
+
+def hiPass(xs, alpha, prev, y):
+    ys, prev, y = _hiPass(_toArray(xs), alpha, _toFloat(prev), _toFloat(y))
+    return _fromArray(ys), _fromFloat(prev), _fromFloat(y)
+
+@njit(cache = True)
+def _variadicLoPass(xs, alphas, y):
+    ys = np.empty_like(xs)
+    for i in range(len(xs)):
+        x = xs[i]
+        alpha = alphas[i]
+        # NaN alpha fails both comparisons, so it's checked explicitly
+        if math.isnan(x) or math.isnan(alpha) or alpha < 0.0 or alpha > 1.0:
+            y = math.nan
+        elif math.isnan(y):
+            y = x
+        else:
+            y = y + alpha * (x - y)
+        ys[i] = y
+    return ys, y
+
+def variadicLoPass(xs, alphas, y):
+    if len(xs) != len(alphas):
+        raise ValueError("Source and alpha chunks are of different lengths")
+    ys, y = _variadicLoPass(_toArray(xs), _toArray(alphas), _toFloat(y))
+    return _fromArray(ys), _fromFloat(y)
+
+@njit(cache = True)
+def _ker(xs, start, lag, aPrev, bPrev, volatility):
+    ys = np.empty(len(xs) - start)
+    for i in range(start, len(xs)):
+        a = xs[i]
+        if not math.isnan(a) and not math.isnan(aPrev):
+            volatility += abs(a - aPrev)
+        aPrev = a
+
+        j = i - lag
+        b = xs[j] if j >= 0 else math.nan
+        if not math.isnan(b) and not math.isnan(bPrev):
+            volatility -= abs(b - bPrev)
+        bPrev = b
+
+        if math.isnan(a) or math.isnan(b):
+            y = math.nan
+        elif volatility == 0.0:
+            y = 1.0
+        else:
+            y = abs(a - b) / volatility
+        ys[i - start] = y
+    return ys, aPrev, bPrev, volatility
+
+def ker(xs, start, lag, aPrev, bPrev, volatility):
+    ys, aPrev, bPrev, volatility = _ker(
+        _toArray(xs), start, lag,
+        _toFloat(aPrev), _toFloat(bPrev), volatility
+    )
+    return _fromArray(ys), _fromFloat(aPrev), _fromFloat(bPrev), volatility
+
+@njit(cache = True)
+def _fractal(
+    xs, mins, maxs, base, start, halfWidth, threshold, minMaxLag,
+    prev, sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex
+):
+    # Peaks as (sign, index, isReplacing) triples
+    peaks = np.empty((len(xs), 3), dtype = np.int64)
+    peakCount = 0
+
+    for i in range(start, base + len(xs)):
+        x = xs[i - base]
+        if math.isnan(x) or math.isnan(prev):
+            sign = _NONE
+            signCount = _NONE
+            trend = _NONE
+            prevTrend = _NONE
+        else:
+            dx = x - prev
+            if dx > 0:
+                newSign = 1
+            elif dx < 0:
+                newSign = -1
+            else:
+                newSign = 0
+
+            if newSign == sign:
+                signCount += 1
+            else:
+                sign = newSign
+                signCount = 1
+                prevTrend = trend
+                trend = _NONE
+
+            if sign != trend and signCount >= halfWidth:
+                iStart = i - signCount
+                xStart = xs[iStart - base]
+
+                if abs(x - xStart) >= threshold:
+                    if prevTrend == -1 or prevTrend == 1:
+                        j = max(0, i - minMaxLag)
+                        if sign == 1:
+                            if xStart <= mins[iStart - base]:
+                                peaks[peakCount, 0] = sign
+                                peaks[peakCount, 1] = iStart
+                                peaks[peakCount, 2] = 1 if lastMinIndex != _NONE and lastMinIndex >= j else 0
+                                peakCount += 1
+                                lastMinIndex = iStart
+                        elif sign == -1:
+                            if xStart >= maxs[iStart - base]:
+                                peaks[peakCount, 0] = sign
+                                peaks[peakCount, 1] = iStart
+                                peaks[peakCount, 2] = 1 if lastMaxIndex != _NONE and lastMaxIndex >= j else 0
+                                peakCount += 1
+                                lastMaxIndex = iStart
+
+                    trend = sign
+
+        prev = x
+
+    return (
+        peaks[:peakCount],
+        prev, sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex
+    )
+
+def fractal(xs, mins, maxs, base, start, halfWidth, threshold, minMaxLag, state):
+    prev, sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex = state
+
+    peaks, prev, *intState = _fractal(
+        _toArray(xs), _toArray(mins), _toArray(maxs),
+        base, start, halfWidth, threshold, minMaxLag,
+        _toFloat(prev), *(_toInt(value) for value in (sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex))
+    )
+
+    return (
+        [(sign, index, bool(isReplacing)) for sign, index, isReplacing in peaks.tolist()],
+        (_fromFloat(prev), *(_fromInt(value) for value in intState))
+    )
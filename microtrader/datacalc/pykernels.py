@@ -0,0 +1,169 @@
+# Reference calculation kernels, in pure Python.
+#
+# Kernel is an inner loop of an operator, run over a chunk of source values. Kernel state
+# is passed in and returned back along with the results, so operators keep it between
+# chunks. Values are plain floats, with None for missing ones.
+#
+# Any other kernel backend (see datacalc.kernels module) must produce the same results.
+
+# Simple low-pass RC filter (see loPassMapper).
+
+def loPass(xs, alpha, y):
+    ys = []
+    append = ys.append
+    for x in xs:
+        if x is None:
+            y = None
+        else:
+            y = (
+                x if y is None
+                else y + alpha * (x - y)
+            )
+        append(y)
+    return ys, y
+
+# Simple low-pass RC filter applied to value delta (see deltaLoPassMapper).
+
+def deltaLoPass(xs, alpha, y, dy):
+    ys = []
+    append = ys.append
+    for x in xs:
+        if x is None or y is None:
+            y = x
+            dy = None
+        else:
+            d = x - y
+            dy = (
+                d if dy is None
+                else dy + alpha * (d - dy)
+            )
+            y += dy
+        append(y)
+    return ys, y, dy
+
+# Simple high-pass RC filter (see hiPassMapper).
+
+def hiPass(xs, alpha, prev, y):
+    ys = []
+    append = ys.append
+    for x in xs:
+        if x is None or prev is None:
+            y = None
+        else:
+            y = (
+                0 if y is None
+                else alpha * (y + (x - prev))
+            )
+        prev = x
+        append(y)
+    return ys, prev, y
+
+# Simple low-pass RC filter driven by variadic alpha (see VariadicLoPassOperator).
+
+def variadicLoPass(xs, alphas, y):
+    ys = []
+    append = ys.append
+    for x, alpha in zip(xs, alphas, strict = True):
+        if x is None or alpha is None or alpha < 0.0 or alpha > 1.0:
+            y = None
+        else:
+            y = (
+                x if y is None
+                else y + alpha * (x - y)
+            )
+        append(y)
+    return ys, y
+
+# Kaufman's Effective Ratio (see KerOperator).
+#
+# Values xs[:start] are the preceding source values (up to lag ones), needed to get
+# the lagged values.
+
+def ker(xs, start, lag, aPrev, bPrev, volatility):
+    ys = []
+    append = ys.append
+    for i in range(start, len(xs)):
+        a = xs[i]
+        if a is not None and aPrev is not None:
+            volatility += abs(a - aPrev)
+        aPrev = a
+
+        j = i - lag
+        b = xs[j] if j >= 0 else None
+        if b is not None and bPrev is not None:
+            volatility -= abs(b - bPrev)
+        bPrev = b
+
+        if a is None or b is None:
+            y = None
+        else:
+            try:
+                y = abs(a - b) / volatility
+            except ZeroDivisionError:
+                y = 1.0
+        append(y)
+    return ys, aPrev, bPrev, volatility
+
+# Fractal state machine (see FractalExOperator).
+#
+# Values xs, mins and maxs are source values and their moving min/max, starting from
+# the index base. Values before the index start are the already processed ones, needed
+# to look back to the start of the current trend.
+#
+# State is (prev, sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex) tuple.
+#
+# Returns detected peaks as (sign, index, isReplacing) tuples, where sign is 1 for
+# minimums and -1 for maximums, and isReplacing tells whether the peak replaces
+# the last peak of the same type, being too close to it.
+
+def fractal(xs, mins, maxs, base, start, halfWidth, threshold, minMaxLag, state):
+    prev, sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex = state
+
+    peaks = []
+    for i in range(start, base + len(xs)):
+        x = xs[i - base]
+        if x is None or prev is None:
+            sign = None
+            signCount = None
+            trend = None
+            prevTrend = None
+        else:
+            dx = x - prev
+            if dx > 0:
+                newSign = 1
+            elif dx < 0:
+                newSign = -1
+            else:
+                newSign = 0
+
+            if newSign == sign:
+                signCount += 1
+            else:
+                sign = newSign
+                signCount = 1
+                prevTrend = trend
+                trend = None
+
+            if sign != trend and signCount >= halfWidth:
+                iStart = i - signCount
+                xStart = xs[iStart - base]
+
+                if abs(x - xStart) >= threshold:
+                    if prevTrend in [-1, 1]:
+                        j = max(0, i - minMaxLag)
+                        if sign == 1:
+                            if xStart <= mins[iStart - base]:
+                                isReplacing = lastMinIndex is not None and lastMinIndex >= j
+                                peaks.append((sign, iStart, isReplacing))
+                                lastMinIndex = iStart
+                        elif sign == -1:
+                            if xStart >= maxs[iStart - base]:
+                                isReplacing = lastMaxIndex is not None and lastMaxIndex >= j
+                                peaks.append((sign, iStart, isReplacing))
+                                lastMaxIndex = iStart
+
+                    trend = sign
+
+        prev = x
+
+    return peaks, (prev, sign, signCount, trend, prevTrend, lastMinIndex, lastMaxIndex)
@@ -1,9 +0,0 @@
-class SlicerOperator:
-
-    def __init__(self, configs, slicer, params, streams):
-
-    
-    def calc(self):
-        for s in slicer:
-            if s:
-                self._operator = CompoundOperator(configs, params, streams)
\ No newline at end of file
@@ -0,0 +1,59 @@
+from typing import final
+
+# Sparse graph elements.
+#
+# Sparse graph is a stream of points and segments, rather than a dense stream with a value
+# for each sample. It's much more compact for graphs with only few meaningful values among
+# lots of empty ones, such as peaks or trend lines.
+#
+# String form of the elements is the one used to transfer them to the client, where indexes
+# are usually made relative to the data chunk start (see shifted() method).
+
+@final
+class Point:
+
+    def __init__(self, index, value):
+        self.index = index
+        self.value = value
+
+    @property
+    def firstIndex(self):
+        return self.index
+
+    @property
+    def lastIndex(self):
+        return self.index
+
+    def shifted(self, delta):
+        return Point(self.index + delta, self.value)
+
+    def __str__(self):
+        return f"{self.index}:{_toStr(self.value)}"
+
+@final
+class Segment:
+
+    def __init__(self, startIndex, endIndex, xStart, xEnd):
+        if startIndex > endIndex:
+            startIndex, endIndex, xStart, xEnd = endIndex, startIndex, xEnd, xStart
+        self.startIndex = startIndex
+        self.endIndex = endIndex
+        self.xStart = xStart
+        self.xEnd = xEnd
+
+    @property
+    def firstIndex(self):
+        return self.startIndex
+
+    @property
+    def lastIndex(self):
+        return self.endIndex
+
+    def shifted(self, delta):
+        return Segment(self.startIndex + delta, self.endIndex + delta, self.xStart, self.xEnd)
+
+    def __str__(self):
+        return f"{self.startIndex}:{self.endIndex}:{_toStr(self.xStart)}:{_toStr(self.xEnd)}"
+
+def _toStr(value):
+    return "" if value is None else str(value)
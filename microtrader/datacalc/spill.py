@@ -0,0 +1,125 @@
+from typing import final
+from functools import wraps
+from contextvars import ContextVar
+from collections import OrderedDict
+from threading import Lock
+from weakref import ref
+from tempfile import TemporaryFile
+import mmap
+import pickle
+
+# Spiller of cold blocks of block values (see datacalc.blocks) to disk.
+#
+# Spiller keeps track of the full blocks of all the block values created while it's active
+# (see spilling() decorator), e.g. all the streams of a processor. Once the number of such
+# resident blocks exceeds the budget, the least recently filled or loaded blocks are spilled
+# to a temporary file, and loaded back on access through the memory-mapped file.
+#
+# Spill file is append-only, so the space of dropped blocks is reclaimed only when spiller
+# is destroyed along with its owner.
+#
+# Spilling is disabled by default, and enabled for the processors created after configure()
+# call with non-zero budget.
+
+_activeSpiller = ContextVar("activeSpiller", default = None)
+
+@final
+class SpilledBlock:
+
+    __slots__ = ("offset", "size")
+
+    def __init__(self, offset, size):
+        self.offset = offset
+        self.size = size
+
+@final
+class BlockSpiller:
+
+    _maxResidentBlocks = 0
+    _directory = None
+
+    @staticmethod
+    def configure(maxResidentBlocks, directory = None):
+        if maxResidentBlocks < 0:
+            raise ValueError(f"Invalid resident blocks budget ({maxResidentBlocks})")
+        BlockSpiller._maxResidentBlocks = maxResidentBlocks
+        BlockSpiller._directory = directory
+
+    # Returns a new spiller with configured budget, or None if spilling is disabled.
+
+    @staticmethod
+    def create():
+        if BlockSpiller._maxResidentBlocks == 0:
+            return None
+        return BlockSpiller(BlockSpiller._maxResidentBlocks, BlockSpiller._directory)
+
+    @staticmethod
+    def getActive():
+        return _activeSpiller.get()
+
+    def __init__(self, maxResidentBlocks, directory = None):
+        self._maxResidentBlocks = maxResidentBlocks
+        self._directory = directory
+        self._file = None
+        self._map = None
+        self._fileLen = 0
+        self._lock = Lock()
+
+        # Resident blocks in order of their filling or loading, as (values id, block index)
+        # keys with weak references to block values
+        self._residentBlocks = OrderedDict()
+
+    # Spiller is shared by forks of its owner.
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def getResidentCount(self):
+        return len(self._residentBlocks)
+
+    def getSpilledSize(self):
+        return self._fileLen
+
+    def addBlock(self, values, blockIndex):
+        key = (id(values), blockIndex)
+        self._residentBlocks[key] = ref(values)
+        self._residentBlocks.move_to_end(key)
+
+        while len(self._residentBlocks) > self._maxResidentBlocks:
+            (_, coldIndex), valuesRef = self._residentBlocks.popitem(last = False)
+            coldValues = valuesRef()
+            if coldValues is not None:
+                coldValues.spillBlock(coldIndex)
+
+    def write(self, block):
+        data = pickle.dumps(block, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._file is None:
+                self._file = TemporaryFile(dir = self._directory)
+            offset = self._fileLen
+            self._file.seek(offset)
+            self._file.write(data)
+            self._fileLen += len(data)
+        return SpilledBlock(offset, len(data))
+
+    def read(self, spilledBlock):
+        with self._lock:
+            if self._map is None or len(self._map) < spilledBlock.offset + spilledBlock.size:
+                self._file.flush()
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), self._fileLen, access = mmap.ACCESS_READ)
+            return pickle.loads(self._map[spilledBlock.offset:spilledBlock.offset + spilledBlock.size])
+
+# Method decorator, making the spiller of the object (its "_spiller" attribute, if any)
+# active within the method, so block values created by the method are spilled by it.
+
+def spilling(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        token = _activeSpiller.set(getattr(self, "_spiller", None))
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _activeSpiller.reset(token)
+    return wrapper
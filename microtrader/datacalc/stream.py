@@ -1,5 +1,7 @@
 from typing import final
 from enum import Enum
+from itertools import chain, repeat
+from datacalc.blocks import BlockValues
 
 @final
 class StreamChange(Enum):
@@ -30,11 +32,15 @@ class StreamChange(Enum):
 #
 # Underlying values must be subscriptable for both random and sequental read access
 # via Stream instance. So, lists and Streams instances are suitable to be used as 
-# underlying values, whereas generators are not.
+# underlying values, whereas generators are not. By default, values are kept in
+# segmented storage (see datacalc.blocks).
 #
 # Stream instance can be wrapped by other instances of Stream, no matter how many
 # times - each of these instances will have direct access to underlying values, with
 # no excessive levels of wrapping.
+#
+# Deep copy of Stream (e.g. as a part of deep copy of operators) is a fork: block values
+# are shared copy-on-write, block by block, while other underlying values are copied.
 
 @final
 class Stream:
@@ -60,7 +66,7 @@ class Stream:
             self._streams = values._streams
             self._offset = values._offset
         else:
-            self._values = values if values is not None else []
+            self._values = values if values is not None else BlockValues()
             self._streams = []
             self._offset = 0
 
@@ -120,6 +126,43 @@ class Stream:
     def indexed(self):
         return Stream.IndexedIter(self)
 
+    # Bulk read of values [start, stop), clipped to the available ones. Returns a copy
+    # of the values, made by slicing underlying values (a list for float blocks, an array
+    # for typed ones), so there are no index checks and method calls per value, though
+    # callers still loop over the values in Python (see datacalc.kernels for compiled
+    # loops). Views aren't returned: float blocks are lists of floats and None, and a
+    # memoryview of an array block would prevent the block from growing while read.
+
+    def readChunk(self, start, stop = None):
+        if start < 0:
+            raise IndexError(f"Invalid chunk start ({start})")
+        start += self._offset
+        stop = (
+            len(self._values) if stop is None
+            else max(start, min(stop + self._offset, len(self._values)))
+        )
+        return self._values[start:stop]
+
+    # Bulk read (a copy, see readChunk()) of all the values from the current read
+    # position, which is moved to the end of values then.
+
+    def getNextChunk(self):
+        chunk = self.readChunk(self._pos)
+        self._pos += len(chunk)
+        return chunk
+
+    # Bulk read of all the values from the current read position, along with the values
+    # lagged by the specified number of samples (None before the first value). Returns
+    # (current, lagged) pairs iterator, moving read position to the end of values.
+
+    def window(self, lag):
+        if lag < 1:
+            raise IndexError(f"Invalid window lag ({lag})")
+        start = self._pos
+        chunk = self.getNextChunk()
+        lagged = self.readChunk(max(0, start - lag), max(0, self._pos - lag))
+        return zip(chunk, chain(repeat(None, len(chunk) - len(lagged)), lagged))
+
     def append(self, value):
         self._values.append(value)
 
@@ -0,0 +1,90 @@
+from typing import final
+from bisect import bisect_left, bisect_right
+from array import array
+from itertools import accumulate
+from lib.utils import coalesce
+from lib.times import MS_PER_DAY, MS_PER_HOUR
+from datacalc.stream import Stream
+from datacalc.blocks import BlockValues
+
+# Index of time stream, maintained incrementally by update() calls as the stream grows.
+#
+# Keeps times as a bisectable array of milliseconds since epoch, for O(log n) lookup of
+# sample index by time, and start indexes of days and trading sessions, for lookup of the
+# day or session of any sample. Session starts with a day, or after a time gap not less
+# than the session gap (e.g. a clearing break). Times are expected to be non-decreasing.
+# Missing (None) times are indexed as the previous ones, so they start no day or session.
+#
+# Retroactive change of the time stream drops the index since the changed sample, to be
+# rebuilt by the next update() call.
+
+@final
+class TimeIndex:
+
+    def __init__(self, time, sessionGap = MS_PER_HOUR):
+        if sessionGap <= 0:
+            raise ValueError(f"Invalid session gap ({sessionGap})")
+        self._sessionGap = sessionGap
+
+        self._time = Stream(time, self._onRetroaction)
+        self._times = BlockValues((), "q")
+        self._dayStarts = array("q")
+        self._sessionStarts = array("q")
+
+    def _onRetroaction(self, change, index):
+        if change.isAfter():
+            self._times.truncate(index)
+            del self._dayStarts[bisect_left(self._dayStarts, index):]
+            del self._sessionStarts[bisect_left(self._sessionStarts, index):]
+            self._time.setPos(index)
+
+    def update(self):
+        start = self._time.getPos()
+        times = self._time.getNextChunk()
+        prev = self._times[start - 1] if start else None
+        if None in times:
+            times = list(accumulate(
+                times,
+                lambda prev, t: prev if t is None else t,
+                initial = coalesce(prev, 0)
+            ))[1:]
+        for i, t in enumerate(times, start):
+            if prev is None or t // MS_PER_DAY != prev // MS_PER_DAY:
+                self._dayStarts.append(i)
+                self._sessionStarts.append(i)
+            elif t - prev >= self._sessionGap:
+                self._sessionStarts.append(i)
+            prev = t
+        self._times.extend(times)
+
+    def getLen(self):
+        return len(self._times)
+
+    # Index of the first sample at or after the time, or the number of indexed samples
+    # if there is no such sample.
+
+    def find(self, time):
+        return bisect_left(self._times, time)
+
+    # Index of the first sample after the time, or the number of indexed samples if there
+    # is no such sample.
+
+    def findAfter(self, time):
+        return bisect_right(self._times, time)
+
+    def getDayStarts(self):
+        return self._dayStarts
+
+    def getSessionStarts(self):
+        return self._sessionStarts
+
+    def getDayStart(self, index):
+        return self._getStart(self._dayStarts, index)
+
+    def getSessionStart(self, index):
+        return self._getStart(self._sessionStarts, index)
+
+    def _getStart(self, starts, index):
+        if index < 0 or index >= len(self._times):
+            raise IndexError(f"Index is out of bounds of time index ({index})")
+        return starts[bisect_right(starts, index) - 1]
@@ -9,7 +9,7 @@ def sequenceValidator(source, verifier, errorMsg = None, retroactor = None):
                 errorMsg if errorMsg is not None
                 else "Value is out of sequence"
             )
-        return x
+        return value
 
     return PrevAwareMapper(source, onTransform, retroactor)
 
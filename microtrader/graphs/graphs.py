@@ -5,9 +5,25 @@ from fnmatch import fnmatch
 from lib.exceptions import ParamError
 from lib.decors import initconfig, throwingmember
 from lib.utils import mergeDefaults, coalesce
-from datacalc.valuestream import ValueStream
+from functools import partial
+from itertools import chain
+from array import array
+from copy import deepcopy
+from importlib import import_module
+from datacalc.stream import Stream
+from datacalc.blocks import BlockValues
+from datacalc.spill import BlockSpiller, spilling
+from datacalc.blockcodecs import SourceCodecs
+from datacalc.timeindex import TimeIndex
 from datacalc.compound import CompoundOperator
 
+_TIME_SOURCE = "Time"
+_FORKED_PARAM = "(Forked)"
+
+# Rolling hash of source samples (polynomial one, modulo Mersenne prime 2^61 - 1)
+_HASH_BASE = 1_000_003
+_HASH_MODULUS = (1 << 61) - 1
+
 @final
 class GraphType(Enum):
     LINE = 1       # линии
@@ -23,10 +39,11 @@ class GraphType(Enum):
 @final
 class GraphConfig:
 
-    def __init__(self, name, title = None, graphType = None):
+    def __init__(self, name, title = None, graphType = None, isSparse = False):
         self._name = name
         self._title = coalesce(title, name)
         self._graphType = coalesce(graphType, GraphType.LINE)
+        self._isSparse = isSparse
 
     @property
     def name(self):
@@ -40,6 +57,12 @@ class GraphConfig:
     def graphType(self):
         return self._graphType
 
+    # Sparse graph data stream consists of points and segments (see datacalc.sparse)
+    # rather than of values for every sample.
+    @property
+    def isSparse(self):
+        return self._isSparse
+
 @final
 class ProcessorConfig:
 
@@ -70,10 +93,17 @@ class ProcessorConfig:
     def constantParams(self):
         return MappingProxyType(self._constantParams)
 
+# Processor config registry.
+#
+# Configs are usually registered by name along with the module defining them, and the module
+# is imported on the first request of any of its configs only. The module registers its configs
+# by add() method when imported.
+
 @final
 class ProcessorConfigs:
 
     _configs = {}
+    _modules = {}
 
     @staticmethod
     def add(config):
@@ -82,9 +112,17 @@ class ProcessorConfigs:
             raise RuntimeError(f"Config with such name already exists ({configName})")
         ProcessorConfigs._configs[configName] = config
 
+    @staticmethod
+    def register(configName, moduleName):
+        ProcessorConfigs._modules[configName] = moduleName
+
     @staticmethod
     def get(configName):
-        return ProcessorConfigs._configs[configName]
+        config = ProcessorConfigs._configs.get(configName)
+        if config is None:
+            import_module(ProcessorConfigs._modules[configName])
+            config = ProcessorConfigs._configs[configName]
+        return config
 
 @final
 class Processor:
@@ -92,30 +130,91 @@ class Processor:
     @initconfig
     @throwingmember
     def __init__(self, config, params, sources):
-        self._configName = config.name
-
-        try:
-            self._params = config.constantParams | mergeDefaults(params, config.defaultParams)
-        except Exception as e:
-            raise ParamError(e) from e
-
-        self._sources = [
-            sourceName: ValueStream(source)
+        self._config = config
+        # Forks pass their state to operators as a param, so rebuilt operators keep it
+        self._isForked = False
+        self._params = self._getParams(params)
+
+        # Spiller of cold blocks of all the streams, if enabled (see datacalc.spill)
+        self._spiller = BlockSpiller.create()
+        self._initData(sources)
+
+    @spilling
+    def _initData(self, sources):
+        # Source data is kept in segmented storage, typed if passed as array, and encoded
+        # if source encoding is enabled (see datacalc.blockcodecs)
+        self._sources = {
+            sourceName: Stream(
+                source if type(source) == BlockValues
+                else BlockValues(
+                    source,
+                    getattr(source, "typecode", None),
+                    SourceCodecs.get(sourceName)
+                )
+            )
             for sourceName, source in sources.items()
-        ]
-
-        graphNames = [graphConfig.name for graphConfig in config.graphConfigs]
+        }
 
         # Dict with all unique streams of input and graph data
         self._streams = {
-            graphName: ValueStream()
-            for graphName in graphNames
+            graphConfig.name: self._wrapStream(Stream())
+            for graphConfig in self._config.graphConfigs
+            if graphConfig.name not in self._sources
         } | self._sources
-
-        for stream in self._streams:
+        for stream in self._sources.values():
             stream.setRetroactor(
-                partial(self.onRetroaction, stream = stream)
+                partial(self._onRetroaction, stream = stream)
+            )
+
+        self._initGraphStreams()
+        self._sparseChanges = {}
+
+        # Graph data streams to be returned entirely by the next calculation
+        self._resetStreams = set()
+
+        # Prefix hashes of source samples: hash of samples [0, i) per each i
+        self._hashes = array("q", [0])
+
+        # Index of source times, updated as sources are appended
+        self._timeIndex = (
+            TimeIndex(self._sources[_TIME_SOURCE]) if _TIME_SOURCE in self._sources
+            else None
+        )
+
+        self._operators = CompoundOperator(
+            configs = self._config.operatorConfigs,
+            params = self._params,
+            streams = self._streams
+        )
+        # Operators are built by the first calculation, but their params are checked now
+        self._operators.checkParams()
+
+    def _getParams(self, params):
+        try:
+            return (
+                self._config.constantParams
+                | mergeDefaults(params, self._config.defaultParams)
+                | {_FORKED_PARAM: self._isForked}
             )
+        except Exception as e:
+            raise ParamError(e) from e
+
+    def _wrapStream(self, stream):
+        stream = Stream(stream)
+        stream.setRetroactor(
+            partial(self._onRetroaction, stream = stream)
+        )
+        return stream
+
+    def _initGraphStreams(self):
+        graphConfigs = self._config.graphConfigs
+
+        # Sparse graph data streams are not aligned with input data
+        self._sparseStreams = {
+            self._streams[graphConfig.name]
+            for graphConfig in graphConfigs
+            if graphConfig.isSparse
+        }
 
         graphGlobs = {
             graphGlob.strip()
@@ -135,51 +234,349 @@ class Processor:
 
         # List with only graph data streams, with preserved number and order of graphs
         self._graphStreams = [
-            self._streams[graphName]
-            if (not enabledGraphs or any(fnmatch(graphName, graphGlob) for graphGlob in enabledGraphs))
-                and not any(fnmatch(graphName, graphGlob) for graphGlob in disabledGraphs)
+            self._streams[graphConfig.name]
+            if (not enabledGraphs or any(fnmatch(graphConfig.name, graphGlob) for graphGlob in enabledGraphs))
+                and not any(fnmatch(graphConfig.name, graphGlob) for graphGlob in disabledGraphs)
             else None
-            for graphName in graphNames            
+            for graphConfig in graphConfigs
         ]
 
-        self._operators = CompoundOperator(
-            config.operatorConfigs,
-            self._params,
-            self._streams
-        )
-
     def getConfigName(self):
-        return self._configName
+        return self._config.name
 
     def getSources(self):
         return self._sources
 
-    def calc(self):
-        if len(price) != len(volume) != len(time):
+    def getLen(self):
+        return len(next(iter(self._sources.values()), ()))
+
+    # Returns index of source times (see datacalc.timeindex), or None if the processor
+    # has no time source.
+
+    def getTimeIndex(self):
+        return self._timeIndex
+
+    # Returns warm-up of each graph (see CompoundOperator.getWarmup()), in order of graphs,
+    # or None for disabled graphs. So, to get the last N samples of graphs settled, only the
+    # last N + warm-up samples of sources are to be calculated.
+
+    @spilling
+    def getWarmups(self):
+        return [
+            None if graphStream is None
+            else 0 if graphConfig.name in self._sources
+            else self._operators.getWarmup(graphConfig.name, self._sources.keys())
+            for graphConfig, graphStream in zip(self._config.graphConfigs, self._graphStreams)
+        ]
+
+    def getWarmup(self):
+        return max(
+            (warmup for warmup in self.getWarmups() if warmup is not None),
+            default = 0
+        )
+
+    # Any stream, including the intermediate ones private to operators, is available
+    # by its name, once calculated. Values of the stream are returned as calculated so far,
+    # rather than a stream reader, which would stay registered with the stream values.
+
+    def getStreamNames(self):
+        return list(dict.fromkeys([*self._streams, *self._operators.getStreamNames()]))
+
+    def getStream(self, streamName):
+        stream = self._streams.get(streamName)
+        if stream is None:
+            stream = self._operators.getStream(streamName)
+        return stream.readChunk(0)
+
+    def copyWithParams(self, params):
+        return Processor(
+            self._config,
+            self._params | params,
+            {sourceName: [] for sourceName in self._sources}
+        )
+
+    # Forks the processor for what-if evaluation, optionally with new params applied to
+    # the fork (see applyParams()). Fork is calculated independently of the processor, but
+    # shares all the source and graph data calculated so far, copy-on-write (see Stream
+    # class), so a fork costs only the state of operators and the data recalculated due
+    # to the changed params. Forks never pass orders to the order repository: the fork
+    # state is passed to operators as the "(Forked)" param, so operators dependent on it
+    # (e.g. traders) are rebuilt as the what-if ones.
+
+    def fork(self, params = None):
+        fork = deepcopy(self, {id(self._config): self._config})
+        fork._isForked = True
+        fork.applyParams(params or {})
+        return fork
+
+    # Applies new params in place, keeping the sources and all the graph data not dependent
+    # on the changed params (see CompoundOperator.rebuild()). Graph data, which is recalculated
+    # or just enabled by the new params, is returned entirely by the next calculation.
+
+    @spilling
+    def applyParams(self, params):
+        params = self._getParams(self._params | params)
+        graphStreams = set(self._graphStreams)
+
+        for streamName in self._operators.rebuild(params, self._sources.keys()):
+            if streamName in self._streams:
+                self._streams[streamName] = self._wrapStream(self._operators.getStream(streamName))
+                self._resetStreams.add(self._streams[streamName])
+
+        self._params = params
+        self._initGraphStreams()
+
+        self._resetStreams.update(
+            graphStream
+            for graphStream in self._graphStreams
+            if graphStream is not None and graphStream not in graphStreams
+        )
+
+    # Appends data chunks to sources and calculates graph data.
+    #
+    # Returns new graph data per each graph, headed by the data offset relative to
+    # the chunk start. Negative offset means that previously returned data is changed
+    # retroactively since that offset. Graph data is returned as iterators reading
+    # the graph data streams directly, so it should be consumed before the next call.
+    #
+    # Data chunks identical to the already calculated samples (e.g. sent again by the client
+    # to redraw the chart) are not appended, and their graph data is returned as already
+    # calculated, with zero offset (see getValues()), after recalculation of the graph data
+    # reset by new params, if any. Chunks are compared by the rolling hash of their samples,
+    # found by the time of the first sample.
+    #
+    # Sparse graph data is returned as points and segments (see datacalc.sparse) with
+    # indexes relative to the chunk start. The data offset of sparse graph means that
+    # any previously returned data since that offset should be cleared.
+
+    @spilling
+    def calc(self, values):
+        if len(set(len(chunk) for chunk in values.values())) > 1:
             raise ParamError("Input data chunks are of different lengths")
 
-        starts = set(len(stream) for stream in self._streams.values())
+        sampleHashes = self._getSampleHashes(values)
+
+        start = self._findChunk(values, sampleHashes)
+        if start is not None:
+            return self.getValues(start, start + len(sampleHashes))
+
+        starts = set(len(stream) for stream in self._sources.values())
         assert len(starts) == 1
         start = starts.pop()
-        
-        self._price.extend(price)
-        self._volume.extend(volume)
-        self._time.extend(time)
-
-        for stream in self._streams.values():
-            stream.setPos(start)
-            
+
+        for sourceName, chunk in values.items():
+            self._sources[sourceName].extend(chunk)
+        if self._timeIndex is not None:
+            self._timeIndex.update()
+
+        prefixHash = self._hashes[-1]
+        for sampleHash in sampleHashes:
+            prefixHash = (prefixHash * _HASH_BASE + sampleHash) % _HASH_MODULUS
+            self._hashes.append(prefixHash)
+
+        self._calcStreams(start)
+
+        return [
+            None if graphStream is None
+            else self._getSparseValues(graphStream, start)
+            if graphStream in self._sparseStreams
+            else chain([graphStream.getPos() - start], graphStream)
+            for graphStream in self._graphStreams
+        ]
+
+    # Recalculates graph data streams reset by new params (see applyParams()), if any,
+    # without appending source data.
+
+    @spilling
+    def _calcResets(self):
+        if self._resetStreams:
+            self._calcStreams(self.getLen())
+
+    # Calculates graph data since the start index of the samples appended to sources,
+    # and the reset streams entirely.
+
+    def _calcStreams(self, start):
+        denseStreams = [
+            stream
+            for stream in self._streams.values()
+            if stream not in self._sparseStreams
+        ]
+
+        for stream in denseStreams:
+            stream.setPos(0 if stream in self._resetStreams else start)
+
+        for stream in self._sparseStreams:
+            stream.setPos(0 if stream in self._resetStreams else len(stream))
+
+        # Lowest indexes of sparse graph elements retroactively changed during calculation
+        self._sparseChanges = {
+            stream: 0
+            for stream in self._resetStreams
+            if stream in self._sparseStreams
+        }
+        self._resetStreams = set()
+
         self._operators.calc()
 
-        if len(set(len(stream) for stream in self._streams.values())) > 1:
+        if len(set(len(stream) for stream in denseStreams)) > 1:
             raise RuntimeError("Some of data streams get out of sync")
 
+    # Checks if the already calculated samples start with the data chunk, i.e. the chunk
+    # is the first one calculated before, so the samples are indexed the same way as
+    # by the sender. No samples are calculated yet, so they would start with any chunk.
+
+    def startsWith(self, values):
+        if not self.getLen():
+            return True
+        return self._findChunk(values, self._getSampleHashes(values)) == 0
+
+    def _getSampleHashes(self, values):
+        return [
+            hash(sample) % _HASH_MODULUS
+            for sample in zip(*(values[sourceName] for sourceName in self._sources))
+        ]
+
+    def _findChunk(self, values, sampleHashes):
+        times = values.get(_TIME_SOURCE)
+        if not times or times[0] is None or self._timeIndex is None:
+            return None
+
+        # Samples are ordered by time
+        start = self._timeIndex.find(times[0])
+        stop = start + len(times)
+        if stop >= len(self._hashes):
+            return None
+
+        chunkHash = 0
+        for sampleHash in sampleHashes:
+            chunkHash = (chunkHash * _HASH_BASE + sampleHash) % _HASH_MODULUS
+
+        rangeHash = (
+            self._hashes[stop]
+            - self._hashes[start] * pow(_HASH_BASE, stop - start, _HASH_MODULUS)
+        ) % _HASH_MODULUS
+
+        return start if rangeHash == chunkHash else None
+
+    # Returns already calculated graph data within the range [start, stop), in the same form
+    # as calc() does, with zero data offset. Graph data reset by new params is recalculated
+    # first, if not yet.
+
+    def getValues(self, start, stop):
+        if start < 0 or start > stop or stop > self.getLen():
+            raise ParamError(f"Invalid data range ({start}, {stop})")
+
+        self._calcResets()
+
         return [
             None if graphStream is None
-            else [graphStream.getPos() - start] + graphStream[graphStream.getPos():]
+            else chain([0], (
+                value.shifted(-start)
+                for value in graphStream.readChunk(0)
+                if value.firstIndex < stop and value.lastIndex >= start
+            ))
+            if graphStream in self._sparseStreams
+            else chain([0], map(graphStream.__getitem__, range(start, stop)))
             for graphStream in self._graphStreams
         ]
 
+    # Sparse graph data since the lowest index of the changed elements is cleared by
+    # the client, so the already returned elements overlapping it are returned again.
+
+    def _getSparseValues(self, stream, start):
+        changeIndex = self._sparseChanges.get(stream)
+        if changeIndex is None:
+            return chain([0], (value.shifted(-start) for value in stream))
+
+        keptValues = [
+            value
+            for value in stream.readChunk(0, stream.getPos())
+            if value.lastIndex >= changeIndex
+        ]
+        return chain(
+            [changeIndex - start],
+            (value.shifted(-start) for value in chain(keptValues, stream))
+        )
+
     def _onRetroaction(self, change, index, stream):
+        if change.isBefore():
+            if stream in self._sparseStreams:
+                # Elements since the changed one are returned again, or removed, so all
+                # of them should be cleared
+                changeIndex = min(stream[i].firstIndex for i in range(index, len(stream)))
+                self._sparseChanges[stream] = min(
+                    self._sparseChanges.get(stream, changeIndex),
+                    changeIndex
+                )
         if change.isAfter():
             stream.setPos(index)
+
+# Portfolio of processors of the same config, one per instrument.
+#
+# All the instruments share the same params, except for instrument codes, and are calculated
+# by a single call, with a data chunk per instrument. Processors of the instruments are
+# independent ones with their own streams, calculated one after another; data is not laid
+# out as instruments × time, and no operator runs across the instruments.
+
+@final
+class Portfolio:
+
+    @initconfig
+    @throwingmember
+    def __init__(self, config, params, instruments, sourceNames):
+        if not instruments:
+            raise ParamError("Portfolio has no instruments")
+
+        self._config = config
+        self._params = params
+        self._instruments = tuple(instruments)
+        self._sourceNames = tuple(sourceNames)
+
+        self._processors = [
+            Processor(
+                config,
+                params | {
+                    "classCode": classCode,
+                    "secCode": secCode
+                },
+                {sourceName: [] for sourceName in self._sourceNames}
+            )
+            for classCode, secCode in self._instruments
+        ]
+
+    def getConfigName(self):
+        return self._config.name
+
+    def getInstruments(self):
+        return self._instruments
+
+    def applyParams(self, params):
+        self._params = self._params | params
+        for processor in self._processors:
+            processor.applyParams(params)
+
+    def copyWithParams(self, params):
+        return Portfolio(
+            self._config,
+            self._params | params,
+            self._instruments,
+            self._sourceNames
+        )
+
+    # Appends data chunks to sources of each instrument and calculates graph data.
+    #
+    # Values are passed as lists of chunks per source name, one chunk per instrument, in order
+    # of instruments. Chunks of different instruments may be of different lengths, e.g. empty
+    # for instruments with no new data. Returns graph data per instrument (see Processor.calc).
+
+    def calc(self, values):
+        if any(len(chunks) != len(self._processors) for chunks in values.values()):
+            raise ParamError("Input data chunks don't match portfolio instruments")
+
+        return [
+            processor.calc({
+                sourceName: chunks[i]
+                for sourceName, chunks in values.items()
+            })
+            for i, processor in enumerate(self._processors)
+        ]
@@ -0,0 +1,132 @@
+from array import array
+from enum import Enum
+from pathlib import Path
+from lib.exceptions import ParamError
+
+# Processor history import/export in Apache Arrow IPC (.arrow, .feather) and Parquet
+# (.parquet) formats, which are readable by pandas, polars, etc.
+#
+# Data streams aligned with the processor sources (one value per sample) are stored as
+# columns of a single table, with Time column of timestamp type. The other streams, such
+# as peak indexes, divergences or sparse graphs, are stored as separate tables (one per
+# stream), in the files named after the main one: <name>.<stream name><suffix>. Elements
+# of such streams are stored as struct values of their attributes.
+#
+# Requires pyarrow package, which is imported on the first use only.
+
+_TIME_SOURCE = "Time"
+
+def _importArrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("History import/export requires pyarrow package") from e
+    return pyarrow
+
+def _getFormat(path):
+    suffix = Path(path).suffix.lower()
+    if suffix == ".parquet":
+        return "parquet"
+    if suffix in (".arrow", ".feather", ".ipc"):
+        return "arrow"
+    raise ParamError(f"Unsupported history file format ({suffix})")
+
+def _readTable(pa, path):
+    if _getFormat(path) == "parquet":
+        return pa.parquet.read_table(path, memory_map = True)
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all()
+
+def _writeTable(pa, table, path):
+    if _getFormat(path) == "parquet":
+        pa.parquet.write_table(table, str(path))
+    else:
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+# Loads the whole history of processor sources from the file at once, and calculates it.
+# Processor should have no data yet, and the file should have a column per each source.
+
+def importHistory(processor, path):
+    pa = _importArrow()
+    table = _readTable(pa, path)
+
+    values = {}
+    for sourceName in processor.getSources():
+        if sourceName not in table.column_names:
+            raise ParamError(f"History has no source column ({sourceName})")
+        column = table.column(sourceName)
+        if sourceName == _TIME_SOURCE:
+            values[sourceName] = _readTimes(pa, column)
+        else:
+            values[sourceName] = column.to_pylist()
+
+    # The graph data returned is not needed here
+    for graphValues in processor.calc(values):
+        if graphValues is not None:
+            for _ in graphValues:
+                pass
+
+def _readTimes(pa, column):
+    column = column.cast(pa.timestamp("ms")).cast(pa.int64())
+    if column.null_count:
+        raise ParamError("History has empty time values")
+
+    times = array("q")
+    for chunk in column.chunks:
+        if not len(chunk):
+            continue
+        # Values buffer is copied as is, with no per value conversion
+        data = chunk.buffers()[1]
+        times.frombytes(
+            memoryview(data)[chunk.offset * times.itemsize:(chunk.offset + len(chunk)) * times.itemsize]
+        )
+    return times
+
+# Stores the processor streams (all of them by default) to the file and its companions.
+# Streams of float values aligned with the sources become the main table columns.
+
+def exportHistory(processor, path, streamNames = None):
+    pa = _importArrow()
+    path = Path(path)
+    count = processor.getLen()
+
+    columns = {}
+    tables = {}
+    for streamName in (processor.getStreamNames() if streamNames is None else streamNames):
+        values = processor.getStream(streamName)
+        if streamName == _TIME_SOURCE:
+            columns[streamName] = _getTimeArray(pa, values)
+        elif len(values) == count and _isFloatValues(values):
+            columns[streamName] = pa.array(list(values), pa.float64())
+        else:
+            tables[streamName] = pa.table({
+                "value": pa.array([_toArrowValue(value) for value in values])
+            })
+
+    _writeTable(pa, pa.table(columns), path)
+    for streamName, table in tables.items():
+        _writeTable(pa, table, path.with_name(f"{path.stem}.{streamName}{path.suffix}"))
+
+def _getTimeArray(pa, values):
+    if None in values:
+        return pa.array(list(values), pa.int64()).cast(pa.timestamp("ms"))
+    values = array("q", values)
+    # Buffer of int64 time values is passed to Arrow as is, with no per value conversion
+    return pa.Array.from_buffers(pa.timestamp("ms"), len(values), [None, pa.py_buffer(values)])
+
+def _isFloatValues(values):
+    return type(next((value for value in values if value is not None), 0.0)) == float
+
+def _toArrowValue(value):
+    if value is None or type(value) in (int, float, bool, str):
+        return value
+    if isinstance(value, Enum):
+        return value.name
+    return {
+        attrName: _toArrowValue(attrValue)
+        for attrName, attrValue in vars(value).items()
+    }
@@ -1,17 +1,18 @@
 from graphs.graphs import *
+from datacalc.compound import OperatorConfig
 from datacalc.minmaxops import *
 from datacalc.indexops import *
 
-grapherConfigs.append(
-    GrapherConfig(
+ProcessorConfigs.add(
+    ProcessorConfig(
         name = "sandbox",
         graphConfigs = [
             GraphConfig("MovingMax"),
             GraphConfig("MovingMin"),
-            GraphConfig("Maxs", graphType = GraphType.PEAK_UP),
-            GraphConfig("Mins", graphType = GraphType.PEAK_DOWN),
-            GraphConfig("DiscardedMaxs", graphType = GraphType.PEAK_UP),
-            GraphConfig("DiscardedMins", graphType = GraphType.PEAK_DOWN)
+            GraphConfig("Maxs", graphType = GraphType.PEAK_UP, isSparse = True),
+            GraphConfig("Mins", graphType = GraphType.PEAK_DOWN, isSparse = True),
+            GraphConfig("DiscardedMaxs", graphType = GraphType.PEAK_UP, isSparse = True),
+            GraphConfig("DiscardedMins", graphType = GraphType.PEAK_DOWN, isSparse = True)
         ],
         operatorConfigs = [
             OperatorConfig(
@@ -30,8 +31,7 @@ grapherConfigs.append(
                 paramMap = {
                     "width": "peakWidth",
                     "threshold": "peakThreshold",
-                    "relThreshold": "peakRelThreshold",
-                    "m3Lag": "m3Lag"
+                    "minMaxLag": "m3Lag"
                 },
                 streamMap = {
                     "source": "Price",
@@ -76,6 +76,8 @@ grapherConfigs.append(
         ],
         defaultParams = {
             "(Graphs)": "Maxs, Mins",
+            # Number of the last samples to be calculated (along with their warm-up), 0 for all
+            "(Visible)": 0,
 
             # MinMaxOperator
             # FractalExOperator
@@ -83,8 +85,7 @@ grapherConfigs.append(
 
             # FractalExOperator
             "peakWidth": 3,
-            "peakThreshold": 0.0,
-            "peakRelThreshold": 0.0
+            "peakThreshold": 0.0
         }
     )
 )
@@ -1,5 +1,6 @@
 from typing import final
 from collections import deque
+from threading import Lock
 from uuid import uuid4
 from lib.decors import throwingmember
 
@@ -15,23 +16,27 @@ class Cache:
         self._items = {}
         self._ids = deque()
         self._count = 0
+        self._lock = Lock()
 
     def add(self, item):
         id = uuid4()
-        self._items[id] = item
-        self._ids.append(id)
+        with self._lock:
+            self._items[id] = item
+            self._ids.append(id)
 
-        if self._count < self._limit:
-            self._count += 1
-        else:
-            self._items.pop(self._ids.popleft(), None)
+            if self._count < self._limit:
+                self._count += 1
+            else:
+                self._items.pop(self._ids.popleft(), None)
 
         return id
 
     def __getitem__(self, id):
-        return self._items[id]
+        with self._lock:
+            return self._items[id]
 
     def __setitem__(self, id, item):
-        if id not in self._items:
-            raise KeyError("Specified id does not exists")
-        self._items[id] = item
+        with self._lock:
+            if id not in self._items:
+                raise KeyError("Specified id does not exists")
+            self._items[id] = item
@@ -0,0 +1,83 @@
+from typing import final
+from threading import Lock
+
+# Chunk size advisor.
+#
+# Measures processing cost of data chunks, per sample and per payload byte, and advises
+# the chunk size to be processed within the target time, with the payload within the limit.
+# Costs are smoothed exponentially, so the advice follows the changes of load (e.g. params
+# enabling heavier graphs), but not single slow chunks. Chunks smaller than the minimal
+# size (e.g. live updates of the last samples) are dominated by the per request overhead,
+# so they are not measured. Advised size is a power of 2.
+#
+# Also keeps metrics per chunk size, rounded up to a power of 2: number of chunks, number
+# of samples and processing time.
+
+@final
+class ChunkSizer:
+
+    def __init__(self,
+        defaultSize = 4096,
+        minSize = 256,
+        maxSize = 262144,
+        targetTime = 0.25, # seconds
+        maxPayload = 16 * 1024 * 1024, # bytes
+        smoothing = 0.25
+    ):
+        if not minSize <= defaultSize <= maxSize:
+            raise ValueError(f"Invalid chunk size bounds ({minSize}, {defaultSize}, {maxSize})")
+        self._defaultSize = defaultSize
+        self._minSize = minSize
+        self._maxSize = maxSize
+        self._targetTime = targetTime
+        self._maxPayload = maxPayload
+        self._smoothing = smoothing
+
+        # Smoothed processing time and payload size per sample
+        self._sampleTime = None
+        self._samplePayload = None
+
+        # Metrics as [chunk count, sample count, processing time] per chunk size
+        self._metrics = {}
+        self._lock = Lock()
+
+    def getSize(self):
+        with self._lock:
+            if self._sampleTime is None:
+                return self._defaultSize
+            size = min(
+                self._targetTime / max(self._sampleTime, 1e-9),
+                self._maxPayload / max(self._samplePayload, 1.0)
+            )
+        size = max(self._minSize, min(self._maxSize, int(size)))
+        return 1 << (size.bit_length() - 1)
+
+    def addChunk(self, sampleCount, payloadSize, elapsed):
+        if sampleCount <= 0:
+            return
+        with self._lock:
+            metrics = self._metrics.setdefault(1 << (sampleCount - 1).bit_length(), [0, 0, 0.0])
+            metrics[0] += 1
+            metrics[1] += sampleCount
+            metrics[2] += elapsed
+
+            if sampleCount < self._minSize:
+                return
+            sampleTime = elapsed / sampleCount
+            samplePayload = payloadSize / sampleCount
+            if self._sampleTime is None:
+                self._sampleTime = sampleTime
+                self._samplePayload = samplePayload
+            else:
+                self._sampleTime += self._smoothing * (sampleTime - self._sampleTime)
+                self._samplePayload += self._smoothing * (samplePayload - self._samplePayload)
+
+    # Returns metrics as (chunk size, chunk count, sample count, processing time) tuples,
+    # in order of chunk size.
+
+    def getMetrics(self):
+        with self._lock:
+            return [
+                (size, *metrics)
+                for size, metrics in sorted(self._metrics.items())
+            ]
@@ -0,0 +1,55 @@
+from typing import final
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+# Locks of objects, which are not safe to be used concurrently (e.g. graph builders),
+# living as long as their objects.
+
+@final
+class ObjectLocks:
+
+    def __init__(self):
+        self._locks = WeakKeyDictionary()
+        self._lock = Lock()
+
+    def get(self, obj):
+        with self._lock:
+            lock = self._locks.get(obj)
+            if lock is None:
+                lock = self._locks[obj] = Lock()
+            return lock
+
+# Iterator holding the lock while iterating, e.g. over the response data read from the object
+# guarded by the lock. The lock is acquired before the iterator is got, and released when
+# the iterator is exhausted or closed (e.g. when the response is closed).
+
+@final
+class LockedIterator:
+
+    def __init__(self, lock, getIterator):
+        lock.acquire()
+        try:
+            self._iterator = iter(getIterator())
+        except BaseException:
+            lock.release()
+            raise
+        self._lock = lock
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._lock is not None:
+            lock, self._lock = self._lock, None
+            try:
+                if hasattr(self._iterator, "close"):
+                    self._iterator.close()
+            finally:
+                lock.release()
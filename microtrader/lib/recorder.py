@@ -0,0 +1,71 @@
+from typing import final
+from threading import Lock
+from struct import Struct
+from time import time
+import gzip
+
+# Request recorder.
+#
+# Records requests to a compressed binary file, to replay them later. Each record consists
+# of the fixed-size header (request time, method and part lengths) followed by the request
+# path (with query string), the request data, and the response data. Response data is
+# recorded only when it's needed for the replay, e.g. ids of the created objects.
+#
+# Records are compressed in batches, so the latest ones may be lost on unexpected
+# termination, but recording costs almost nothing.
+
+_HEADER = Struct("<dcHII")
+
+@final
+class RequestRecorder:
+
+    def __init__(self, path, flushCount = 64):
+        self._file = gzip.open(path, "ab")
+        self._flushCount = flushCount
+        self._unflushedCount = 0
+        self._lock = Lock()
+
+    def record(self, method, path, data, response = b""):
+        path = path.encode("utf-8")
+        record = _HEADER.pack(
+            time(),
+            method[:1].encode("ascii"),
+            len(path),
+            len(data),
+            len(response)
+        ) + path + data + response
+
+        with self._lock:
+            self._file.write(record)
+            self._unflushedCount += 1
+            if self._unflushedCount >= self._flushCount:
+                self._file.flush()
+                self._unflushedCount = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# Reads records of the file as tuples of (time, method, path, data, response).
+# Incomplete records, left by unexpected termination, are skipped.
+
+def readRecords(path):
+    with gzip.open(path, "rb") as file:
+        while True:
+            try:
+                header = file.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                requestTime, method, pathLen, dataLen, responseLen = _HEADER.unpack(header)
+                body = file.read(pathLen + dataLen + responseLen)
+                if len(body) < pathLen + dataLen + responseLen:
+                    break
+            except EOFError:
+                break
+            yield (
+                requestTime,
+                "GET" if method == b"G" else "POST",
+                body[:pathLen].decode("utf-8"),
+                body[pathLen:pathLen + dataLen],
+                body[pathLen + dataLen:]
+            )
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+# Time representation.
+#
+# Time values are passed through the data streams as integer milliseconds since epoch,
+# so the operators deal with plain integer arithmetic only. Time is exchange local and
+# naive (with no time zone), so whole days are just multiples of MS_PER_DAY. Conversion
+# to datetime is only needed when time leaves the data streams, e.g. for orders.
+
+MS_PER_SECOND = 1000
+MS_PER_MINUTE = 60 * MS_PER_SECOND
+MS_PER_HOUR = 60 * MS_PER_MINUTE
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+_EPOCH = datetime(1970, 1, 1)
+
+def toEpochMs(time):
+    delta = time - _EPOCH
+    return delta.days * MS_PER_DAY + delta.seconds * MS_PER_SECOND + delta.microseconds // 1000
+
+def fromEpochMs(time):
+    return _EPOCH + timedelta(milliseconds = time)
+
+def formatEpochMs(time):
+    return fromEpochMs(time).isoformat(timespec = "milliseconds")
+
+# Parses ISO time values to milliseconds since epoch, value by value. Empty values (e.g.
+# sent by the client for candles with no time) are parsed as None.
+
+def parseEpochMs(values):
+    return [
+        toEpochMs(datetime.fromisoformat(value)) if value.strip() else None
+        for value in values
+    ]
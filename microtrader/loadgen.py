@@ -0,0 +1,75 @@
+from http.client import HTTPConnection
+from datetime import datetime, timedelta
+from time import perf_counter
+import argparse
+import math
+import random
+
+# Load generator, benchmarking chart opening by the client: either by the request sequence
+# (descrs, params, new, params, values) or by the single session request.
+#
+# Runs against a live server, with synthetic candle data of the specified length.
+
+URL_PREFIX = "/api/"
+
+def makeChunk(start, count, seed):
+    rnd = random.Random(seed)
+    time0 = datetime(2024, 1, 1, 10)
+    price = [100.0 + 10.0 * math.sin((start + i) / 30.0) + rnd.random() for i in range(count)]
+    return "\n".join([
+        ";".join(str(value) for value in price),
+        ";".join(str(float(rnd.randint(1, 1000))) for _ in range(count)),
+        ";".join(
+            (time0 + timedelta(minutes = start + i)).isoformat(timespec = "milliseconds")
+            for i in range(count)
+        )
+    ])
+
+def request(connection, method, path, body = None):
+    connection.request(method, URL_PREFIX + path, body = body)
+    response = connection.getresponse()
+    data = response.read().decode("utf-8")
+    if response.status != 200:
+        raise RuntimeError(f"Request failed: {method} {path}: {response.status} {data}")
+    return data
+
+def openBySequence(connection, graphName, chunk):
+    request(connection, "GET", f"graphs/{graphName}/descrs")
+    params = request(connection, "GET", f"graphs/{graphName}/params")
+    id = request(connection, "POST", f"graphs/{graphName}/new", "1\nTQBR\nSBER")
+    request(connection, "POST", f"graphs/{id}/params", params)
+    request(connection, "POST", f"graphs/{id}/values", chunk)
+
+def openBySession(connection, graphName, chunk):
+    params = request(connection, "GET", f"graphs/{graphName}/params")
+    request(connection, "POST", f"graphs/{graphName}/session", f"\n1\nTQBR\nSBER\n\n{params}\n\n{chunk}")
+
+def benchmark(host, port, graphName, openFunc, count, chunkSize):
+    connection = HTTPConnection(host, port)
+    latencies = []
+    for n in range(count):
+        chunk = makeChunk(0, chunkSize, n)
+        start = perf_counter()
+        openFunc(connection, graphName, chunk)
+        latencies.append(perf_counter() - start)
+    connection.close()
+
+    latencies.sort()
+    print(
+        f"{openFunc.__name__}: count={count}"
+        f" p50={latencies[len(latencies) // 2] * 1e3:.3f}ms"
+        f" p90={latencies[len(latencies) * 9 // 10] * 1e3:.3f}ms"
+        f" max={latencies[-1] * 1e3:.3f}ms"
+    )
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument("--host", default = "localhost")
+    argParser.add_argument("--port", type = int, default = 5000)
+    argParser.add_argument("--graph", default = "sandbox", help = "graph builder name")
+    argParser.add_argument("--count", type = int, default = 100, help = "number of charts to open")
+    argParser.add_argument("--chunk", type = int, default = 4096, help = "first data chunk size")
+    args = argParser.parse_args()
+
+    for openFunc in [openBySequence, openBySession]:
+        benchmark(args.host, args.port, args.graph, openFunc, args.count, args.chunk)
@@ -1,34 +1,63 @@
-from flask import Flask, request
+from flask import Flask, Response, request, g
 from werkzeug.exceptions import HTTPException, NotFound
 from datetime import datetime
+from itertools import islice, chain
+from array import array
 from uuid import UUID
+from weakref import WeakKeyDictionary
+from time import perf_counter
+from threading import Lock
+import argparse
 import logging
+import atexit
 
 from lib.exceptions import ParamError
 from lib.cache import Cache
+from lib.times import parseEpochMs, formatEpochMs
+from lib.recorder import RequestRecorder
+from lib.chunksizer import ChunkSizer
+from lib.locks import ObjectLocks, LockedIterator
+from datacalc.kernels import Kernels
+from datacalc.spill import BlockSpiller
+from datacalc.blockcodecs import SourceCodecs
 
 from graphs.graphs import *
-from graphs.sandbox import SandboxGraphConfig
-from graphs.trading import TradingGraphConfig
 
-from trading.orders import Orders
+from trading.orderrepo import OrderRepo
+from trading.risk import RiskManager
 
 app = Flask(__name__)
 
 URL_PREFIX = "/api/"
 APP_LOG_LEVEL = logging.ERROR
 GRAPH_BUILDER_LIMIT = 64
+PORTFOLIO_LIMIT = 4
+RESPONSE_BATCH_SIZE = 1024 # values
+ORDER_WAIT_LIMIT = 20.0 # seconds
+ORDER_JOURNAL_PATH = "orders.journal"
+CHUNK_SIZE_HEADER = "X-Chunk-Size"
 
-graphConfigs = {
-    graphConfig.getName(): graphConfig
-    for graphConfig in GraphConfig.__subclasses__()
-}
+ProcessorConfigs.register("sandbox", "graphs.sandbox")
+ProcessorConfigs.register("trading", "graphs.trading")
 
 graphBuilders = Cache(GRAPH_BUILDER_LIMIT)
+portfolios = Cache(PORTFOLIO_LIMIT)
+
+# Requests are served concurrently, so graph builders and portfolios are used under their
+# own locks. Graph values are sent as they are formatted, reading the graph data directly,
+# so the lock is held till the response is sent entirely (see LockedIterator).
+objectLocks = ObjectLocks()
+
+# Chunk size advisors per graph builder, living as long as their builders
+chunkSizers = WeakKeyDictionary()
+chunkSizersLock = Lock()
+
+# Recorder of graph builder and portfolio requests, to replay them offline (see replay.py)
+requestRecorder = None
 
 def getGraphConfig(name):
     try:
-        return graphConfigs[name]
+        return ProcessorConfigs.get(name)
     except Exception as e:
         raise NotFound(f"Invalid graph builder name: {e}")
 
@@ -38,22 +67,38 @@ def getGraphBuilder(id):
     except Exception as e:
         raise NotFound(f"Invalid graph builder id: {e}")
 
+def getChunkSizer(graphBuilder):
+    with chunkSizersLock:
+        chunkSizer = chunkSizers.get(graphBuilder)
+        if chunkSizer is None:
+            chunkSizer = chunkSizers[graphBuilder] = ChunkSizer()
+        return chunkSizer
+
+def getPortfolio(id):
+    try:
+        return portfolios[UUID(id)]
+    except Exception as e:
+        raise NotFound(f"Invalid portfolio id: {e}")
+
 @app.route(URL_PREFIX + "graphs/<name>/descrs", methods=["GET"])
 def getGraphDescrs(name):
+    return formatDescrs(getGraphConfig(name))
+
+def formatDescrs(config):
     return "\n".join(
         ";".join([
-            graphDescr["name"], 
-            graphDescr.get("title", ""), 
-            str(graphDescr.get("lineType", 1))
+            graphConfig.name, 
+            graphConfig.title, 
+            str(graphConfig.graphType.value)
         ])
-        for graphDescr in getGraphConfig(name).getGraphDescrs()
+        for graphConfig in config.graphConfigs
     )
 
 @app.route(URL_PREFIX + "graphs/<name>/params", methods=["GET"])
 def getGraphParams(name):
     return "\n".join(
         f"{paramName}={paramValue}" 
-        for paramName, paramValue in getGraphConfig(name).getDefaultParams().items()
+        for paramName, paramValue in getGraphConfig(name).defaultParams.items()
     )
 
 @app.route(URL_PREFIX + "graphs/<name>/new", methods=["POST"])
@@ -67,66 +112,439 @@ def getGraphNew(name):
         return "Invalid attribute(s)", 400
 
     return str(graphBuilders.add(
-        GraphBuilder(interval, classCode, secCode, getGraphConfig(name))
+        newGraphBuilder(getGraphConfig(name), interval, classCode, secCode, {})
     ))
 
+def newGraphBuilder(config, interval, classCode, secCode, params):
+    return Processor(
+        config,
+        {
+            "interval": interval,
+            "classCode": classCode,
+            "secCode": secCode
+        } | params,
+        {
+            "Price": [],
+            "Volume": [],
+            "Time": array("q")
+        }
+    )
+
 @app.route(URL_PREFIX + "graphs/<id>/params", methods=["POST"])
 def postGraphParams(id):
-    params = {
-        paramName.strip(): paramValue
-        for paramName, s, paramValue in (
-            line.partition("=")
-            for line in request.data.decode("utf-8").split("\n")
-        )
-        if s
-    }
+    params = parseParams(request.data.decode("utf-8").split("\n"))
 
-    graphBuilders[UUID(id)] = getGraphBuilder(id).copyWithParams(params)
+    graphBuilder = getGraphBuilder(id)
+    with objectLocks.get(graphBuilder):
+        graphBuilder.applyParams(params)
+        return formatKeptData(graphBuilder)
 
-    return ""
+# Graph builder keeps the data received before, so the client may get the graph data
+# for it by GET request, rather than send it again. The time of the last kept sample
+# allows the client to check if the data is still the same.
+
+def formatKeptData(graphBuilder):
+    count = graphBuilder.getLen()
+    lastTime = graphBuilder.getSources()["Time"][count - 1] if count else None
+    return f"{count};{'' if lastTime is None else formatEpochMs(lastTime)}"
+
+# Several data chunks may be sent at once, separated by empty line. Graph values of all
+# the chunks are returned one after another, each chunk with a line per graph.
 
 @app.route(URL_PREFIX + "graphs/<id>/values", methods=["POST"])
 def postGraphValues(id):
+    startTime = perf_counter()
     try:
-        values = request.data.decode("utf-8").split("\n")
-        price = [
-            float(value)
-            if value.strip() else None
-            for value in values[0].split(";")
+        chunks = [
+            parseValues(block.split("\n"))
+            for block in request.data.decode("utf-8").split("\n\n")
         ]
-        volume = [
-            float(value)
-            if value.strip() else None
-            for value in values[1].split(";")
+    except Exception:
+        return "Invalid value(s)", 400
+
+    graphBuilder = getGraphBuilder(id)
+    calcCounts = []
+    return Response(
+        LockedIterator(objectLocks.get(graphBuilder), lambda: measureChunks(
+            graphBuilder, chunks, calcCounts, len(request.data), startTime,
+            formatChunkValues(graphBuilder, chunks, calcCounts)
+        )),
+        mimetype = "text/plain",
+        headers = {CHUNK_SIZE_HEADER: str(getChunkSizer(graphBuilder).getSize())}
+    )
+
+def formatChunkValues(graphBuilder, chunks, calcCounts):
+    # Graph values read the graph data streams directly, so each chunk is calculated only
+    # when the values of the previous one are sent, and is sent as it's being formatted.
+    for i, values in enumerate(chunks):
+        if i:
+            yield "\n"
+        yield from formatValues(calcChunk(graphBuilder, values, calcCounts))
+
+# Calculates data chunk, adding the number of the samples calculated to the counts: zero
+# for the chunk identical to the already calculated samples (see Processor.calc()).
+
+def calcChunk(graphBuilder, values, calcCounts):
+    count = graphBuilder.getLen()
+    graphValues = graphBuilder.calc(values)
+    calcCounts.append(graphBuilder.getLen() - count)
+    return graphValues
+
+# Measures processing of data chunks, from the request start till the response is sent,
+# as the graph values are calculated and formatted while being sent. Processing time and
+# payload size of the request are shared by the chunks in proportion to their lengths.
+# Only the calculated chunks are measured, as the ones answered with already calculated
+# data cost much less.
+
+def measureChunks(graphBuilder, chunks, calcCounts, payloadSize, startTime, lines):
+    yield from lines
+
+    elapsed = perf_counter() - startTime
+    totalCount = sum(len(next(iter(values.values()), ())) for values in chunks)
+    chunkSizer = getChunkSizer(graphBuilder)
+    for sampleCount in calcCounts:
+        if sampleCount:
+            share = sampleCount / totalCount
+            chunkSizer.addChunk(sampleCount, payloadSize * share, elapsed * share)
+
+# Chart session, which gets everything needed to draw the chart in a single request.
+#
+# Request consists of sections, separated by empty line:
+#     builder id (empty for a new one), interval, class code, security code - one per line
+#     params - one per line, in NAME=VALUE form
+#     data chunks - any number of them, in the same form as for the values request
+#
+# The chunk size advised for the next requests is returned in X-Chunk-Size header, as for
+# the values requests (see getGraphMetrics()).
+#
+# The builder with the id given is reused only if its data starts with the first data chunk,
+# as the client indexes the kept data from its first sample. Otherwise (e.g. the builder is
+# expired, or the chart is reloaded with other data or scrolled) a new builder is created.
+#
+# Response consists of lines:
+#     builder id
+#     kept data (see formatKeptData()), after the params are applied, but before the chunks
+#     graph count
+#     graph descrs - a line per graph
+#     graph values - a line per graph, for each data chunk
+
+@app.route(URL_PREFIX + "graphs/<name>/session", methods=["POST"])
+def postGraphSession(name):
+    startTime = perf_counter()
+    config = getGraphConfig(name)
+
+    try:
+        blocks = request.data.decode("utf-8").split("\n\n")
+        attrs = blocks[0].split("\n")
+        id = attrs[0].strip()
+        interval = int(attrs[1])
+        classCode = attrs[2]
+        secCode = attrs[3]
+        params = parseParams(blocks[1].split("\n")) if len(blocks) > 1 else {}
+        chunks = [
+            parseValues(block.split("\n"))
+            for block in blocks[2:]
         ]
-        time = [
-            datetime.fromisoformat(value)
-            if value.strip() else None
-            for value in values[2].split(";")
+    except Exception:
+        return "Invalid session request", 400
+
+    graphBuilder = None
+    if id:
+        try:
+            graphBuilder = graphBuilders[UUID(id)]
+        except Exception:
+            pass
+
+    if graphBuilder is not None and graphBuilder.getConfigName() == name and chunks:
+        with objectLocks.get(graphBuilder):
+            if graphBuilder.startsWith(chunks[0]):
+                graphBuilder.applyParams(params)
+            else:
+                graphBuilder = None
+    else:
+        graphBuilder = None
+
+    if graphBuilder is None:
+        graphBuilder = newGraphBuilder(config, interval, classCode, secCode, params)
+        id = str(graphBuilders.add(graphBuilder))
+    # Response is streamed, so the id is passed to the recorder directly
+    g.builderId = id
+
+    def formatSession():
+        header = "\n".join([
+            id,
+            formatKeptData(graphBuilder),
+            str(len(config.graphConfigs)),
+            formatDescrs(config)
+        ])
+        if not chunks:
+            return [header]
+
+        calcCounts = []
+        return chain(
+            [header, "\n"],
+            measureChunks(
+                graphBuilder, chunks, calcCounts, len(request.data), startTime,
+                formatChunkValues(graphBuilder, chunks, calcCounts)
+            )
+        )
+
+    return Response(
+        LockedIterator(objectLocks.get(graphBuilder), formatSession),
+        mimetype = "text/plain",
+        headers = {CHUNK_SIZE_HEADER: str(getChunkSizer(graphBuilder).getSize())}
+    )
+
+# Warm-up of graph builder with the params, i.e. the number of samples preceding the visible
+# ones to be calculated too (see Processor.getWarmup()), as the first line, followed by
+# warm-up of each graph, a line per graph (empty for disabled graphs).
+#
+# Request consists of builder attributes and params, as for the chart session. Builder
+# is not kept, as the client sends the data of the visible range to the session anyway.
+
+@app.route(URL_PREFIX + "graphs/<name>/warmup", methods=["POST"])
+def postGraphWarmup(name):
+    config = getGraphConfig(name)
+
+    try:
+        blocks = request.data.decode("utf-8").split("\n\n")
+        attrs = blocks[0].split("\n")
+        interval = int(attrs[0])
+        classCode = attrs[1]
+        secCode = attrs[2]
+        params = parseParams(blocks[1].split("\n")) if len(blocks) > 1 else {}
+    except Exception:
+        return "Invalid warmup request", 400
+
+    warmups = newGraphBuilder(config, interval, classCode, secCode, params).getWarmups()
+    return "\n".join([
+        str(max((warmup for warmup in warmups if warmup is not None), default = 0)),
+        *("" if warmup is None else str(warmup) for warmup in warmups)
+    ])
+
+@app.route(URL_PREFIX + "graphs/<id>/values", methods=["GET"])
+def getGraphValues(id):
+    try:
+        start = request.args.get("start", 0, int)
+        stop = request.args.get("stop", None, int)
+    except Exception:
+        return "Invalid argument(s)", 400
+
+    graphBuilder = getGraphBuilder(id)
+    return Response(
+        LockedIterator(objectLocks.get(graphBuilder), lambda: formatValues(graphBuilder.getValues(
+            start,
+            graphBuilder.getLen() if stop is None else stop
+        ))),
+        mimetype = "text/plain",
+        headers = {CHUNK_SIZE_HEADER: str(getChunkSizer(graphBuilder).getSize())}
+    )
+
+# Chunk processing metrics of graph builder: the chunk size advised to the client, and
+# a line per chunk size (rounded up to a power of 2) with the number of chunks, samples,
+# processing time and samples per second, separated by semicolon.
+
+@app.route(URL_PREFIX + "graphs/<id>/metrics", methods=["GET"])
+def getGraphMetrics(id):
+    chunkSizer = getChunkSizer(getGraphBuilder(id))
+    return "\n".join([
+        str(chunkSizer.getSize()),
+        *(
+            f"{size};{chunkCount};{sampleCount};{elapsed:.6f};{sampleCount / elapsed if elapsed else 0.0:.1f}"
+            for size, chunkCount, sampleCount, elapsed in chunkSizer.getMetrics()
+        )
+    ])
+
+@app.route(URL_PREFIX + "portfolios/<name>/new", methods=["POST"])
+def getPortfolioNew(name):
+    try:
+        attrs = request.data.decode("utf-8").split("\n")
+        interval = int(attrs[0])
+        instruments = [
+            (classCode.strip(), secCode.strip())
+            for classCode, s, secCode in (
+                attr.partition(";")
+                for attr in attrs[1:]
+            )
+            if s
+        ]
+    except Exception:
+        return "Invalid attribute(s)", 400
+
+    return str(portfolios.add(
+        Portfolio(
+            getGraphConfig(name),
+            {"interval": interval},
+            instruments,
+            ["Price", "Volume", "Time"]
+        )
+    ))
+
+@app.route(URL_PREFIX + "portfolios/<id>/params", methods=["POST"])
+def postPortfolioParams(id):
+    params = parseParams(request.data.decode("utf-8").split("\n"))
+
+    portfolio = getPortfolio(id)
+    with objectLocks.get(portfolio):
+        portfolio.applyParams(params)
+
+    return ""
+
+# Values of portfolio instruments are passed in the same form as graph builder values,
+# in blocks separated by empty line, one block per instrument in order of instruments.
+# Block of instrument with no new data is empty. The results are returned the same way.
+
+@app.route(URL_PREFIX + "portfolios/<id>/values", methods=["POST"])
+def postPortfolioValues(id):
+    try:
+        blocks = [
+            parseValues(block.split("\n")) if block
+            else {"Price": [], "Volume": [], "Time": []}
+            for block in request.data.decode("utf-8").split("\n\n")
         ]
+        values = {
+            sourceName: [block[sourceName] for block in blocks]
+            for sourceName in ("Price", "Volume", "Time")
+        }
     except Exception:
         return "Invalid value(s)", 400
 
-    return "\n".join(
-        "" if values is None
-        else ";".join(
+    portfolio = getPortfolio(id)
+    return Response(
+        LockedIterator(objectLocks.get(portfolio), lambda: formatPortfolioValues(portfolio.calc(values))),
+        mimetype = "text/plain"
+    )
+
+def parseParams(lines):
+    return {
+        paramName.strip(): paramValue
+        for paramName, s, paramValue in (
+            line.partition("=")
+            for line in lines
+        )
+        if s
+    }
+
+def parseValues(lines):
+    return {
+        "Price": [
+            float(value)
+            if value.strip() else None
+            for value in lines[0].split(";")
+        ],
+        "Volume": [
+            float(value)
+            if value.strip() else None
+            for value in lines[1].split(";")
+        ],
+        "Time": parseEpochMs(lines[2].split(";"))
+    }
+
+# Graph values are formatted lazily, batch by batch, while being sent to the client.
+# So the response is never held in memory entirely, and it starts as soon as possible.
+
+def formatValues(graphValues):
+    graphSeparator = ""
+    for values in graphValues:
+        yield graphSeparator
+        graphSeparator = "\n"
+        if values is None:
+            continue
+
+        values = iter(values)
+        separator = ""
+        while batch := list(islice(values, RESPONSE_BATCH_SIZE)):
+            yield separator + ";".join(
                 "" if value is None
                 else str(value)
-                for value in values
+                for value in batch
             )
-        for values in getGraphBuilder(id).calcValues(price, volume, time)
-    )
+            separator = ";"
+
+def formatPortfolioValues(portfolioValues):
+    separator = ""
+    for graphValues in portfolioValues:
+        yield separator
+        separator = "\n\n"
+        yield from formatValues(graphValues)
 
 @app.route(URL_PREFIX + "orders", methods=["GET"])
 def getOrders():
+    try:
+        consumer = request.args.get("consumer", "")
+        lastTransId = request.args.get("after", None, int)
+        timeout = min(request.args.get("timeout", 0.0, float), ORDER_WAIT_LIMIT)
+    except Exception:
+        return "Invalid argument(s)", 400
+
+    return "\n\n".join(
+        "\n".join(
+            f"{paramName}={paramValue}"        
+            for paramName, paramValue in order.items()
+        )
+        for order in OrderRepo.getNew(consumer, lastTransId, timeout)
+    )
+
+@app.route(URL_PREFIX + "orders/journal", methods=["GET"])
+def getOrderJournal():
+    try:
+        secCode = request.args.get("secCode", None)
+        timeFrom = request.args.get("from", None, datetime.fromisoformat)
+        timeTo = request.args.get("to", None, datetime.fromisoformat)
+    except Exception:
+        return "Invalid argument(s)", 400
+
     return "\n\n".join(
         "\n".join(
             f"{paramName}={paramValue}"        
             for paramName, paramValue in order.items()
         )
-        for order in Orders.getNew()
+        for order in OrderRepo.find(secCode, timeFrom, timeTo)
     )
 
+@app.route(URL_PREFIX + "fills", methods=["POST"])
+def postFills():
+    try:
+        for block in request.data.decode("utf-8").split("\n\n"):
+            fill = {
+                paramName.strip(): paramValue.strip()
+                for paramName, s, paramValue in (
+                    line.partition("=")
+                    for line in block.split("\n")
+                )
+                if s
+            }
+            if not fill:
+                continue
+            RiskManager.addFill(
+                fill["SECCODE"],
+                fill["OPERATION"],
+                float(fill["PRICE"]),
+                int(fill["QUANTITY"]),
+                fill.get("TRADE_NUM")
+            )
+    except Exception:
+        return "Invalid fill(s)", 400
+
+    return ""
+
+@app.after_request
+def recordRequest(response):
+    if requestRecorder is not None and (
+        request.path.startswith(URL_PREFIX + "graphs/")
+        or request.path.startswith(URL_PREFIX + "portfolios/")
+    ):
+        requestRecorder.record(
+            request.method,
+            request.full_path,
+            request.get_data(),
+            # Ids of new objects are needed to map them to the replayed ones
+            response.get_data() if request.path.endswith("/new")
+            else g.get("builderId", "").encode("utf-8") if request.path.endswith("/session")
+            else b""
+        )
+    return response
+
 @app.errorhandler(ParamError)
 def paramError(e):
     return str(e), 400
@@ -136,7 +554,26 @@ def httpException(e):
     return str(e), e.code
 
 if __name__ == "__main__":
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument("--record", help = "file to record graph requests to")
+    argParser.add_argument("--kernels", choices = Kernels.getBackendNames(), default = "python", help = "calculation kernel backend")
+    argParser.add_argument("--resident-blocks", type = int, default = 0, help = "max number of stream blocks kept in memory per processor, 0 for no spilling")
+    argParser.add_argument("--spill-dir", help = "directory for spilled stream blocks")
+    argParser.add_argument("--encode-sources", action = "store_true", help = "keep source data blocks compressed in memory")
+    args = argParser.parse_args()
+
+    Kernels.select(args.kernels)
+    BlockSpiller.configure(args.resident_blocks, args.spill_dir)
+    SourceCodecs.enable(args.encode_sources)
+
     log = logging.getLogger("werkzeug")
     log.setLevel(APP_LOG_LEVEL)
 
-    app.run(debug = False)
+    if args.record:
+        requestRecorder = RequestRecorder(args.record)
+        atexit.register(requestRecorder.close)
+
+    OrderRepo.open(ORDER_JOURNAL_PATH)
+    atexit.register(OrderRepo.close)
+
+    app.run(debug = False, threaded = True)
@@ -0,0 +1,106 @@
+from time import perf_counter
+import argparse
+import math
+
+from lib.recorder import RequestRecorder, readRecords
+import main
+
+# Replays recorded graph requests (see main.py --record) against the current code,
+# as fast as possible, and reports request latencies by request kind.
+#
+# Responses may be saved to compare them with the ones of another code version,
+# replayed from the same record. Ids of the created objects are not saved, as they are
+# random.
+
+def replay(recordPath, outputPath = None):
+    client = main.app.test_client()
+    output = RequestRecorder(outputPath) if outputPath else None
+
+    # Recorded object ids mapped to the replayed ones
+    ids = {}
+    latencies = {}
+
+    for _, method, path, data, response in readRecords(recordPath):
+        # Path is like /api/graphs/<name or id>/<action>?<query>
+        parts = path.split("/")
+        parts[3] = ids.get(parts[3], parts[3])
+        action = parts[4].partition("?")[0]
+        if action == "session":
+            # Session request starts with the id of the builder to be reused
+            id, separator, rest = data.decode("utf-8").partition("\n")
+            data = (ids.get(id.strip(), id) + separator + rest).encode("utf-8")
+
+        start = perf_counter()
+        result = client.open("/".join(parts), method = method, data = data)
+        # Response may be streamed, so it's counted till the end
+        body = result.get_data()
+        latency = perf_counter() - start
+
+        if action == "new" and result.status_code == 200:
+            ids[response.decode("utf-8")] = body.decode("utf-8")
+            body = b""
+        elif action == "session" and result.status_code == 200:
+            id, _, body = body.partition(b"\n")
+            ids[response.decode("utf-8")] = id.decode("utf-8")
+
+        latencies.setdefault(f"{method} {parts[2]}/{action}", []).append(latency)
+        if output is not None:
+            output.record(method, path, b"", str(result.status_code).encode("ascii") + b"\n" + body)
+
+    if output is not None:
+        output.close()
+
+    return latencies
+
+def printHistogram(latencies):
+    for kind, values in sorted(latencies.items()):
+        values.sort()
+        print(
+            f"{kind}: count={len(values)}"
+            f" p50={_getPercentile(values, 0.5) * 1e3:.3f}ms"
+            f" p90={_getPercentile(values, 0.9) * 1e3:.3f}ms"
+            f" p99={_getPercentile(values, 0.99) * 1e3:.3f}ms"
+            f" max={values[-1] * 1e3:.3f}ms"
+        )
+
+        # Power of 2 buckets of microseconds
+        buckets = {}
+        for value in values:
+            bucket = max(0, math.ceil(math.log2(max(value * 1e6, 1.0))))
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        for bucket in range(min(buckets), max(buckets) + 1):
+            count = buckets.get(bucket, 0)
+            print(f"    <= {2 ** bucket:>9}us {count:>8} {'#' * math.ceil(count * 50 / len(values))}")
+
+def _getPercentile(sortedValues, fraction):
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * fraction))]
+
+# Compares responses of two replays, and returns paths of the requests with different responses.
+
+def compare(outputPath1, outputPath2):
+    diffs = []
+    records1 = readRecords(outputPath1)
+    records2 = readRecords(outputPath2)
+    for record1, record2 in zip(records1, records2, strict = True):
+        if record1[2] != record2[2]:
+            raise RuntimeError("Replays of different records can't be compared")
+        if record1[4] != record2[4]:
+            diffs.append(record1[2])
+    return diffs
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument("record", help = "recorded requests file")
+    argParser.add_argument("--output", help = "file to save responses to")
+    argParser.add_argument("--compare", help = "file with responses of another replay to compare with")
+    args = argParser.parse_args()
+
+    printHistogram(replay(args.record, args.output))
+
+    if args.compare:
+        if not args.output:
+            argParser.error("--compare requires --output")
+        diffs = compare(args.output, args.compare)
+        print(f"Responses differ: {len(diffs)}")
+        for path in diffs[:20]:
+            print(f"    {path}")
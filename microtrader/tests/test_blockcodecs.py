@@ -0,0 +1,118 @@
+import unittest
+import math
+import pickle
+from copy import deepcopy
+from array import array
+from random import Random
+from datacalc.blocks import BlockValues, BLOCK_SIZE
+from datacalc.blockcodecs import DeltaOfDeltaCodec, ScaledDeltaCodec, SourceCodecs
+from tests.test_processor import makeChunks, makeProcessor, formatValues
+
+def makeTimes(count, seed = 1):
+    random = Random(seed)
+    times = [1_700_000_000_000]
+    for _ in range(count - 1):
+        # Mostly regular times, with occasional session breaks
+        times.append(times[-1] + (60_000 if random.random() < 0.99 else random.randint(1, 10**8)))
+    return times
+
+def makePrices(count, seed = 1):
+    random = Random(seed)
+    prices = [100.0]
+    for _ in range(count - 1):
+        prices.append(round(prices[-1] + random.gauss(0, 0.5), 2))
+    return prices
+
+class DeltaOfDeltaCodecTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        codec = DeltaOfDeltaCodec()
+        for block in (array("q", makeTimes(BLOCK_SIZE)), makeTimes(100, seed = 2), [5, 3]):
+            with self.subTest(block = block[:3]):
+                encoded = codec.encode(block)
+                self.assertIsNotNone(encoded)
+                decoded = encoded.decode()
+                self.assertEqual(type(decoded), type(block))
+                self.assertEqual(list(decoded), list(block))
+
+    def testRegularTimesArePacked(self):
+        encoded = DeltaOfDeltaCodec().encode(array("q", [i * 60_000 for i in range(BLOCK_SIZE)]))
+        self.assertEqual(encoded.data.typecode, "b")
+
+    def testUnsuitableBlocks(self):
+        codec = DeltaOfDeltaCodec()
+        for block in ([1], [1, None, 3], [1.0, 2.0, 3.0], [0, 2**62, -2**62, 2**62]):
+            with self.subTest(block = block):
+                self.assertIsNone(codec.encode(block))
+
+class ScaledDeltaCodecTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        codec = ScaledDeltaCodec()
+        prices = makePrices(BLOCK_SIZE)
+        pricesWithGaps = [None, *prices[1:10], None, None, *prices[12:]]
+        volumes = array("q", range(0, 3 * BLOCK_SIZE, 3))
+        for block in (prices, pricesWithGaps, volumes, [0.1, 0.2, 0.3], [None, None]):
+            with self.subTest(block = block[:3]):
+                encoded = codec.encode(block)
+                self.assertIsNotNone(encoded)
+                decoded = encoded.decode()
+                self.assertEqual(type(decoded), type(block))
+                self.assertEqual(list(decoded), list(block))
+
+    def testUnsuitableBlocks(self):
+        codec = ScaledDeltaCodec(maxDecimals = 4)
+        for block in ([], [1.0, 1.123456], [1.0, math.inf], [1.0, math.nan], [1.0, "x"]):
+            with self.subTest(block = block):
+                self.assertIsNone(codec.encode(block))
+
+class EncodedBlockValuesTest(unittest.TestCase):
+
+    def testFullBlocksAreEncoded(self):
+        expected = makePrices(3 * BLOCK_SIZE + 10)
+        values = BlockValues(expected, codec = ScaledDeltaCodec())
+        self.assertEqual(list(values), expected)
+        self.assertEqual(list(values[BLOCK_SIZE - 5:BLOCK_SIZE + 5]), expected[BLOCK_SIZE - 5:BLOCK_SIZE + 5])
+
+        # Encoded blocks are decoded on change, both in values and their forks
+        fork = deepcopy(values)
+        values[5] = None
+        expected[5] = None
+        self.assertEqual(list(values), expected)
+        self.assertEqual(fork[5], makePrices(6)[5])
+        values.truncate(BLOCK_SIZE + 5)
+        values.extend(makePrices(BLOCK_SIZE, seed = 2))
+        self.assertEqual(list(values), expected[:BLOCK_SIZE + 5] + makePrices(BLOCK_SIZE, seed = 2))
+
+    def testEncodedValuesAreSmaller(self):
+        times = [1_700_000_000_000 + i * 60_000 for i in range(10 * BLOCK_SIZE)]
+        prices = makePrices(10 * BLOCK_SIZE)
+        for values, typecode, codec in ((times, "q", DeltaOfDeltaCodec()), (prices, None, ScaledDeltaCodec())):
+            with self.subTest(codec = type(codec).__name__):
+                size = len(pickle.dumps(BlockValues(values, typecode)))
+                encodedSize = len(pickle.dumps(BlockValues(values, typecode, codec)))
+                self.assertLess(encodedSize, size / 2)
+
+class ProcessorEncodingTest(unittest.TestCase):
+
+    def setUp(self):
+        SourceCodecs.enable()
+
+    def tearDown(self):
+        SourceCodecs.enable(False)
+
+    def testEncodedProcessorValues(self):
+        chunks = makeChunks(12000, 5000, 10)
+        params = {"(Graphs)": "*"}
+        processor = makeProcessor("CODEC1", params)
+        for chunk in chunks:
+            processor.calc(chunk)
+
+        SourceCodecs.enable(False)
+        expected = makeProcessor("CODEC1", params)
+        for chunk in chunks:
+            expected.calc(chunk)
+        self.assertEqual(
+            formatValues(processor.getValues(0, processor.getLen())),
+            formatValues(expected.getValues(0, expected.getLen()))
+        )
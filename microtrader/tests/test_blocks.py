@@ -0,0 +1,104 @@
+import unittest
+from copy import deepcopy
+from array import array
+from datacalc.blocks import BlockValues, BLOCK_SIZE
+
+# Block values are checked against plain lists of the same values.
+
+def makeValues(start, count):
+    return [float(i) for i in range(start, start + count)]
+
+class BlockValuesTest(unittest.TestCase):
+
+    def checkValues(self, values, expected):
+        self.assertEqual(len(values), len(expected))
+        self.assertEqual(list(values), expected)
+        self.assertEqual(list(values[:]), expected)
+        for index in (0, BLOCK_SIZE - 1, BLOCK_SIZE, len(expected) - 1, -1):
+            if -len(expected) <= index < len(expected):
+                self.assertEqual(values[index], expected[index])
+
+    def testAppendAndExtend(self):
+        values = BlockValues()
+        expected = []
+        for value in makeValues(0, 10):
+            values.append(value)
+            expected.append(value)
+        for count in (BLOCK_SIZE - 15, 1, 2 * BLOCK_SIZE + 3):
+            chunk = makeValues(len(expected), count)
+            values.extend(chunk)
+            expected.extend(chunk)
+        self.checkValues(values, expected)
+
+    def testSlices(self):
+        expected = makeValues(0, 3 * BLOCK_SIZE + 10)
+        values = BlockValues(expected)
+        for start, stop in (
+            (0, 0), (5, 10), (BLOCK_SIZE - 2, BLOCK_SIZE + 2),
+            (10, 3 * BLOCK_SIZE), (2 * BLOCK_SIZE, None), (-5, None), (BLOCK_SIZE, 10)
+        ):
+            with self.subTest(start = start, stop = stop):
+                self.assertEqual(list(values[start:stop]), expected[start:stop])
+        with self.assertRaises(IndexError):
+            values[0:10:2]
+        with self.assertRaises(IndexError):
+            values[len(expected)]
+
+    def testWrite(self):
+        expected = makeValues(0, 2 * BLOCK_SIZE)
+        values = BlockValues(expected)
+        for index in (0, BLOCK_SIZE, -1):
+            values[index] = None
+            expected[index] = None
+        self.checkValues(values, expected)
+
+    def testTruncate(self):
+        expected = makeValues(0, 3 * BLOCK_SIZE + 10)
+        values = BlockValues(expected)
+        for newLen in (3 * BLOCK_SIZE + 5, 2 * BLOCK_SIZE, BLOCK_SIZE + 1, 0):
+            with self.subTest(newLen = newLen):
+                del values[newLen:]
+                del expected[newLen:]
+                self.checkValues(values, expected)
+                chunk = makeValues(100_000, BLOCK_SIZE)
+                values.extend(chunk)
+                expected.extend(chunk)
+                self.checkValues(values, expected)
+                del values[newLen:]
+                del expected[newLen:]
+        with self.assertRaises(IndexError):
+            del values[0:1]
+
+    def testTypedValues(self):
+        expected = list(range(2 * BLOCK_SIZE + 10))
+        values = BlockValues(expected, "q")
+        self.assertEqual(values.typecode, "q")
+        self.assertEqual(type(values[:10]), array)
+        self.checkValues(values, expected)
+
+        # Block with None value is kept as list
+        values[5] = None
+        expected[5] = None
+        values.append(None)
+        expected.append(None)
+        self.checkValues(values, expected)
+        self.assertEqual(type(values[BLOCK_SIZE:BLOCK_SIZE + 10]), array)
+        self.assertEqual(type(values[:10]), list)
+
+    def testForkIsCopyOnWrite(self):
+        expected = makeValues(0, 2 * BLOCK_SIZE + 10)
+        values = BlockValues(expected)
+        fork = deepcopy(values)
+        forkExpected = expected[:]
+
+        fork[5] = -1.0
+        forkExpected[5] = -1.0
+        values[BLOCK_SIZE + 5] = -2.0
+        expected[BLOCK_SIZE + 5] = -2.0
+        fork.extend(makeValues(100_000, 10))
+        forkExpected.extend(makeValues(100_000, 10))
+        values.truncate(BLOCK_SIZE + 10)
+        del expected[BLOCK_SIZE + 10:]
+
+        self.checkValues(values, expected)
+        self.checkValues(fork, forkExpected)
@@ -0,0 +1,89 @@
+import unittest
+from copy import deepcopy
+from random import Random
+from datacalc.stream import Stream
+from datacalc.basicmaps import deltaMapper
+from datacalc.filtermaps import loPassMapper
+from datacalc.fusion import FusedOperator
+from datacalc.blocks import BLOCK_SIZE
+
+STAGES = (
+    ("map", deltaMapper, "source", "delta"),
+    ("map", loPassMapper, "delta", "lo"),
+    ("split", "lo", "pos", "neg")
+)
+OUTPUT_NAMES = ("delta", "pos", "neg")
+
+def makeValues(count, seed = 1):
+    random = Random(seed)
+    values = [100.0]
+    for _ in range(count - 1):
+        values.append(round(values[-1] + random.gauss(0, 0.5), 2))
+    return values
+
+def makeOperator(source):
+    outputs = {f"out.{name}": Stream() for name in OUTPUT_NAMES}
+    operator = FusedOperator(STAGES, OUTPUT_NAMES, {"1.rc": 5.0}, {"source": source} | outputs)
+    return operator, [outputs[f"out.{name}"] for name in OUTPUT_NAMES]
+
+def calcValues(values):
+    source = Stream()
+    operator, outputs = makeOperator(source)
+    source.extend(values)
+    operator.calc()
+    return [output.readChunk(0) for output in outputs]
+
+class FusedOperatorTest(unittest.TestCase):
+
+    def checkOutputs(self, source, outputs):
+        self.assertEqual([output.readChunk(0) for output in outputs], calcValues(source.readChunk(0)))
+
+    def testChunksAcrossCheckpoints(self):
+        values = makeValues(3 * BLOCK_SIZE + 100)
+        source = Stream()
+        operator, outputs = makeOperator(source)
+        for i in range(0, len(values), 1000):
+            source.extend(values[i:i + 1000])
+            operator.calc()
+        self.checkOutputs(source, outputs)
+
+    def testPastDataChange(self):
+        values = makeValues(3 * BLOCK_SIZE + 100)
+        source = Stream()
+        operator, outputs = makeOperator(source)
+        source.extend(values)
+        operator.calc()
+
+        # Changes before, at and after checkpoints, the latest ones first
+        for index in (len(values) - 1, 2 * BLOCK_SIZE + 1, 2 * BLOCK_SIZE, BLOCK_SIZE - 1, 0):
+            with self.subTest(index = index):
+                source[index] = source[index] + 1.0
+                operator.calc()
+                self.checkOutputs(source, outputs)
+
+    def testTruncationAndRewrite(self):
+        values = makeValues(3 * BLOCK_SIZE + 100)
+        source = Stream()
+        operator, outputs = makeOperator(source)
+        source.extend(values)
+        operator.calc()
+
+        source.setLen(2 * BLOCK_SIZE + 10)
+        source.extend(makeValues(BLOCK_SIZE, seed = 2))
+        operator.calc()
+        self.checkOutputs(source, outputs)
+
+    def testForkKeepsOwnState(self):
+        values = makeValues(2 * BLOCK_SIZE + 100)
+        source = Stream()
+        operator, outputs = makeOperator(source)
+        source.extend(values)
+        operator.calc()
+
+        forkSource, forkOperator, forkOutputs = deepcopy((source, operator, outputs))
+        forkSource[BLOCK_SIZE + 5] = forkSource[BLOCK_SIZE + 5] + 1.0
+        forkOperator.calc()
+        source.extend(makeValues(100, seed = 2))
+        operator.calc()
+        self.checkOutputs(forkSource, forkOutputs)
+        self.checkOutputs(source, outputs)
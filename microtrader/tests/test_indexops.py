@@ -0,0 +1,86 @@
+import unittest
+from random import Random
+from lib.exceptions import ParamError, ConfigError
+from datacalc.stream import Stream
+from datacalc.indexops import CoindexOperator
+
+def makeIndexes(count, seed):
+    random = Random(seed)
+    indexes = [random.randint(0, 5)]
+    for _ in range(count - 1):
+        indexes.append(indexes[-1] + random.randint(1, 8))
+    return indexes
+
+def makeOperator(indexLists, params = None):
+    sources = [Stream() for _ in indexLists]
+    targets = [Stream() for _ in indexLists]
+    streams = {}
+    for n, (source, target) in enumerate(zip(sources, targets), 1):
+        streams[f"indexes{n}"] = source
+        streams[f"coindexes{n}"] = target
+    operator = CoindexOperator(params or {}, streams)
+    return operator, sources, targets
+
+def calcCoindexes(indexLists, params = None):
+    operator, sources, targets = makeOperator(indexLists, params)
+    for source, indexes in zip(sources, indexLists):
+        source.extend(indexes)
+    operator.calc()
+    return [target.readChunk(0) for target in targets]
+
+class CoindexOperatorTest(unittest.TestCase):
+
+    def testMatches(self):
+        self.assertEqual(
+            calcCoindexes([[1, 5, 10, 20], [2, 9, 15, 21]]),
+            [[1, 10, 20], [2, 9, 21]]
+        )
+        self.assertEqual(
+            calcCoindexes([[1, 5, 10, 20], [2, 9, 15, 21], [0, 11, 21]]),
+            [[1, 10, 20], [2, 9, 21], [0, 11, 21]]
+        )
+        self.assertEqual(
+            calcCoindexes([[1, 5, 10], [4, 8, 10]], {"epsilon": 0}),
+            [[10], [10]]
+        )
+
+    def testChunksOfIndexLists(self):
+        indexLists = [makeIndexes(1000, seed) for seed in (1, 2, 3)]
+        expected = calcCoindexes(indexLists)
+        self.assertGreater(len(expected[0]), 0)
+
+        # Lists are extended unevenly, so heads are carried over between calculations
+        operator, sources, targets = makeOperator(indexLists)
+        random = Random(4)
+        positions = [0] * len(indexLists)
+        while any(pos < len(indexes) for pos, indexes in zip(positions, indexLists)):
+            for n, indexes in enumerate(indexLists):
+                count = random.randint(0, 20)
+                sources[n].extend(indexes[positions[n]:positions[n] + count])
+                positions[n] += count
+            operator.calc()
+        self.assertEqual([target.readChunk(0) for target in targets], expected)
+
+    def testPastIndexesChange(self):
+        indexLists = [makeIndexes(1000, seed) for seed in (1, 2)]
+        operator, sources, targets = makeOperator(indexLists)
+        for source, indexes in zip(sources, indexLists):
+            source.extend(indexes)
+        operator.calc()
+
+        # Index list is truncated and continued with other indexes
+        indexLists[1][500:] = [indexLists[1][499] + i * 3 for i in range(1, 300)]
+        sources[1].setLen(500)
+        sources[1].extend(indexLists[1][500:])
+        operator.calc()
+        self.assertEqual([target.readChunk(0) for target in targets], calcCoindexes(indexLists))
+
+    def testInvalidParams(self):
+        with self.assertRaises(ParamError):
+            makeOperator([[], []], {"epsilon": -1})
+        with self.assertRaises(ConfigError):
+            makeOperator([[]])
+
+    def testOutOfSequenceIndexes(self):
+        with self.assertRaises(ValueError):
+            calcCoindexes([[1, 5, 3], [1, 5, 6]])
@@ -0,0 +1,128 @@
+import unittest
+import math
+from importlib.util import find_spec
+from random import Random
+from datacalc.kernels import Kernels
+
+# Kernels of other backends are checked against the reference ones (see datacalc.kernels
+# module), sample by sample, over random walk data with gaps, passed chunk by chunk.
+
+TOLERANCE = 1e-9
+
+def makeValues(count, seed):
+    random = Random(seed)
+    values = []
+    x = 100.0
+    for _ in range(count):
+        x += random.gauss(0.0, 1.0)
+        # Flat runs and gaps are the edge cases of kernels
+        if random.random() < 0.01:
+            values.append(None)
+        elif random.random() < 0.05 and values:
+            values.append(values[-1])
+        else:
+            values.append(round(x, 2))
+    return values
+
+def makeChunks(values, chunkSize):
+    return [values[i:i + chunkSize] for i in range(0, len(values), chunkSize)]
+
+# Kernel runners: each one runs a kernel over chunks, carrying its state between them,
+# and returns all the results.
+
+def runLoPass(kernels, chunks):
+    results, y = [], None
+    for xs in chunks:
+        ys, y = kernels.loPass(xs, 0.1, y)
+        results += ys
+    return results
+
+def runDeltaLoPass(kernels, chunks):
+    results, y, dy = [], None, None
+    for xs in chunks:
+        ys, y, dy = kernels.deltaLoPass(xs, 0.1, y, dy)
+        results += ys
+    return results
+
+def runHiPass(kernels, chunks):
+    results, prev, y = [], None, None
+    for xs in chunks:
+        ys, prev, y = kernels.hiPass(xs, 0.9, prev, y)
+        results += ys
+    return results
+
+def runVariadicLoPass(kernels, chunks):
+    results, y = [], None
+    for xs in chunks:
+        alphas = [None if x is None else abs(math.sin(x)) for x in xs]
+        ys, y = kernels.variadicLoPass(xs, alphas, y)
+        results += ys
+    return results
+
+def runKer(kernels, chunks, lag = 10):
+    results, aPrev, bPrev, volatility, history = [], None, None, 0.0, []
+    for chunk in chunks:
+        xs = history + chunk
+        ys, aPrev, bPrev, volatility = kernels.ker(xs, len(history), lag, aPrev, bPrev, volatility)
+        history = xs[-lag:]
+        results += ys
+    return results
+
+def runFractal(kernels, chunks):
+    values = [x for chunk in chunks for x in chunk]
+    results, state, start = [], (None, None, None, None, None, None, None), 0
+    for chunk in chunks:
+        # Whole history is passed, as min/max are not the subject here
+        stop = start + len(chunk)
+        peaks, state = kernels.fractal(values[:stop], values[:stop], values[:stop], 0, start, 2, 0.0, 10, state)
+        results += peaks
+        start = stop
+    return results
+
+def isClose(value1, value2):
+    if value1 is None or value2 is None:
+        return value1 is value2
+    if type(value1) == tuple:
+        return value1 == value2
+    return math.isclose(value1, value2, rel_tol = TOLERANCE, abs_tol = TOLERANCE)
+
+@unittest.skipUnless(find_spec("numba") is not None, "Numba is not installed")
+class NumbaKernelsTest(unittest.TestCase):
+
+    def checkRunner(self, runner, count = 20000):
+        reference = Kernels.get("python")
+        kernels = Kernels.get("numba")
+        values = makeValues(count, seed = 1)
+        for chunkSize in (1, 7, 1000):
+            with self.subTest(chunkSize = chunkSize):
+                chunks = makeChunks(values, chunkSize)
+                expected = runner(reference, chunks)
+                actual = runner(kernels, chunks)
+                self.assertEqual(len(actual), len(expected))
+                mismatch = next(
+                    (
+                        i for i, (value1, value2) in enumerate(zip(expected, actual))
+                        if not isClose(value1, value2)
+                    ),
+                    None
+                )
+                self.assertIsNone(mismatch, f"Mismatch at sample {mismatch}")
+
+    def testLoPass(self):
+        self.checkRunner(runLoPass)
+
+    def testDeltaLoPass(self):
+        self.checkRunner(runDeltaLoPass)
+
+    def testHiPass(self):
+        self.checkRunner(runHiPass)
+
+    def testVariadicLoPass(self):
+        self.checkRunner(runVariadicLoPass)
+
+    def testKer(self):
+        self.checkRunner(runKer)
+
+    def testFractal(self):
+        # Whole history is passed on each chunk, so fewer samples are checked
+        self.checkRunner(runFractal, 3000)
@@ -0,0 +1,190 @@
+import unittest
+import os
+from tempfile import TemporaryDirectory
+from datetime import datetime, timedelta
+from lib.exceptions import ParamError
+from trading.orderjournal import OrderJournal, FIELD_SIZE
+
+START_TIME = datetime(2024, 1, 2, 10, 0, 0)
+
+def makeOrder(transId, secCode, minutes):
+    return {
+        "TIME": START_TIME + timedelta(minutes = minutes),
+        "CLASSCODE": "TQBR",
+        "SECCODE": secCode,
+        "ACTION": "NEW_ORDER",
+        "OPERATION": "B",
+        "PRICE": 100.0 + transId,
+        "QUANTITY": 1,
+        "TYPE": "L",
+        "TRANS_ID": transId
+    }
+
+# Orders of two instruments, one of them journaled out of time order
+
+def makeOrders(count):
+    return [
+        makeOrder(i + 1, "SBER" if i % 3 else "GAZP", i if i != count // 2 else -1)
+        for i in range(count)
+    ]
+
+def getTransIds(orders):
+    return [order["TRANS_ID"] for order in orders]
+
+class OrderJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = TemporaryDirectory()
+        self._path = os.path.join(self._dir.name, "orders.journal")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def checkFind(self, journal, orders, secCode = None, timeFrom = None, timeTo = None):
+        expected = sorted(
+            (
+                order
+                for order in orders
+                if (secCode is None or order["SECCODE"] == secCode)
+                    and (timeFrom is None or order["TIME"] >= timeFrom)
+                    and (timeTo is None or order["TIME"] < timeTo)
+            ),
+            key = lambda order: order["TIME"]
+        )
+        self.assertEqual(list(journal.find(secCode, timeFrom, timeTo)), expected)
+
+    def checkAllFinds(self, journal, orders):
+        timeFrom = START_TIME + timedelta(minutes = 10)
+        timeTo = START_TIME + timedelta(minutes = 40)
+        for secCode in (None, "SBER", "GAZP", "LKOH"):
+            self.checkFind(journal, orders, secCode)
+            self.checkFind(journal, orders, secCode, timeFrom)
+            self.checkFind(journal, orders, secCode, None, timeTo)
+            self.checkFind(journal, orders, secCode, timeFrom, timeTo)
+
+    def testAppendAndRead(self):
+        orders = makeOrders(10)
+        journal = OrderJournal(self._path)
+        for order in orders:
+            journal.append(order)
+        self.assertEqual(len(journal), 10)
+        self.assertEqual(journal[0], orders[0])
+        self.assertEqual(journal[-1], orders[-1])
+        self.assertEqual(journal[2:5], orders[2:5])
+        journal.close()
+
+    def testReopen(self):
+        orders = makeOrders(10)
+        journal = OrderJournal(self._path)
+        for order in orders[:6]:
+            journal.append(order)
+        journal.close()
+
+        journal = OrderJournal(self._path)
+        self.assertEqual(len(journal), 6)
+        for order in orders[6:]:
+            journal.append(order)
+        self.assertEqual(journal[:], orders)
+        journal.close()
+
+    def testIncompleteRecordIsDropped(self):
+        orders = makeOrders(3)
+        journal = OrderJournal(self._path)
+        for order in orders:
+            journal.append(order)
+        journal.close()
+        with open(self._path, "ab") as file:
+            file.write(b"\1\2\3")
+
+        journal = OrderJournal(self._path)
+        self.assertEqual(journal[:], orders)
+        journal.close()
+
+    def testFind(self):
+        orders = makeOrders(60)
+        journal = OrderJournal(self._path)
+        for order in orders[:30]:
+            journal.append(order)
+        self.checkAllFinds(journal, orders[:30])
+
+        # Orders appended since the index is written are found too
+        for order in orders[30:]:
+            journal.append(order)
+        self.checkAllFinds(journal, orders)
+        journal.close()
+
+    def testFindAfterReopen(self):
+        orders = makeOrders(60)
+        journal = OrderJournal(self._path)
+        for order in orders[:20]:
+            journal.append(order)
+        journal.find()
+        for order in orders[20:40]:
+            journal.append(order)
+        journal.close()
+
+        # Index file written on close covers all the orders
+        journal = OrderJournal(self._path)
+        self.checkAllFinds(journal, orders[:40])
+        for order in orders[40:]:
+            journal.append(order)
+        self.checkAllFinds(journal, orders)
+        journal.close()
+
+    def testFindWithOutdatedIndex(self):
+        orders = makeOrders(40)
+        journal = OrderJournal(self._path)
+        for order in orders[:20]:
+            journal.append(order)
+        journal.find()
+        journal.close()
+
+        # Journal is appended without searching, so the index file isn't rewritten
+        journal = OrderJournal(self._path)
+        for order in orders[20:]:
+            journal.append(order)
+        journal.close()
+
+        journal = OrderJournal(self._path)
+        self.checkAllFinds(journal, orders)
+        journal.close()
+
+    def testFindAfterLongTail(self):
+        orders = makeOrders(6000)
+        journal = OrderJournal(self._path)
+        for order in orders[:100]:
+            journal.append(order)
+        journal.find()
+        # Index file is rewritten as the tail grows
+        for order in orders[100:]:
+            journal.append(order)
+        self.checkAllFinds(journal, orders)
+        journal.close()
+
+    def testFindInEmptyJournal(self):
+        journal = OrderJournal(self._path)
+        self.assertEqual(list(journal.find("SBER")), [])
+        journal.close()
+
+    def testFoundOrdersAreSequence(self):
+        orders = makeOrders(10)
+        journal = OrderJournal(self._path)
+        for order in orders:
+            journal.append(order)
+        found = journal.find("SBER")
+        expected = sorted(
+            (order for order in orders if order["SECCODE"] == "SBER"),
+            key = lambda order: order["TIME"]
+        )
+        self.assertEqual(len(found), len(expected))
+        self.assertEqual(found[0], expected[0])
+        self.assertEqual(found[-1], expected[-1])
+        self.assertEqual(getTransIds(found[1:3]), getTransIds(expected[1:3]))
+        journal.close()
+
+    def testTooLongFieldIsRejected(self):
+        journal = OrderJournal(self._path)
+        with self.assertRaises(ParamError):
+            journal.append(makeOrder(1, "X" * (FIELD_SIZE + 1), 0))
+        self.assertEqual(len(journal), 0)
+        journal.close()
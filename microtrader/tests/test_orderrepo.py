@@ -0,0 +1,99 @@
+import unittest
+import os
+from time import monotonic
+from threading import Timer
+from tempfile import TemporaryDirectory
+from datetime import datetime
+from lib.exceptions import ParamError
+from trading.orderrepo import OrderRepo
+
+# Order repository is shared by all the tests, so each test has its own consumers and
+# security codes, and checks only the orders it adds.
+
+def makeOrder(secCode):
+    return {
+        "TIME": datetime.now(),
+        "CLASSCODE": "TQBR",
+        "SECCODE": secCode,
+        "ACTION": "NEW_ORDER",
+        "OPERATION": "B",
+        "PRICE": 100.0,
+        "QUANTITY": 1,
+        "TYPE": "L"
+    }
+
+def getSecCodes(orders):
+    return [order["SECCODE"] for order in orders]
+
+class OrderRepoTest(unittest.TestCase):
+
+    def testNewConsumerGetsNewOrdersOnly(self):
+        OrderRepo.add(makeOrder("REPO1"))
+        self.assertEqual(OrderRepo.getNew("consumer1"), [])
+        OrderRepo.add(makeOrder("REPO1"))
+        OrderRepo.add(makeOrder("REPO2"))
+        self.assertEqual(getSecCodes(OrderRepo.getNew("consumer1")), ["REPO1", "REPO2"])
+        self.assertEqual(OrderRepo.getNew("consumer1"), [])
+
+    def testConsumersHaveOwnCursors(self):
+        OrderRepo.getNew("consumer2")
+        OrderRepo.getNew("consumer3")
+        OrderRepo.add(makeOrder("REPO3"))
+        self.assertEqual(getSecCodes(OrderRepo.getNew("consumer2")), ["REPO3"])
+        OrderRepo.add(makeOrder("REPO4"))
+        self.assertEqual(getSecCodes(OrderRepo.getNew("consumer3")), ["REPO3", "REPO4"])
+        self.assertEqual(getSecCodes(OrderRepo.getNew("consumer2")), ["REPO4"])
+
+    def testResumeFromLastTransId(self):
+        OrderRepo.getNew("consumer4")
+        for secCode in ("REPO5", "REPO6", "REPO7"):
+            OrderRepo.add(makeOrder(secCode))
+        transIds = [order["TRANS_ID"] for order in OrderRepo.getNew("consumer4")]
+        self.assertEqual(transIds, list(range(transIds[0], transIds[0] + 3)))
+
+        # Orders after the processed one are delivered again, then the cursor goes on
+        orders = OrderRepo.getNew("consumer4", transIds[0])
+        self.assertEqual(getSecCodes(orders), ["REPO6", "REPO7"])
+        self.assertEqual(OrderRepo.getNew("consumer4"), [])
+
+        for lastTransId in (-1, transIds[-1] + 1):
+            with self.assertRaises(ParamError):
+                OrderRepo.getNew("consumer4", lastTransId)
+
+    def testWaitingForNewOrder(self):
+        OrderRepo.getNew("consumer5")
+        timer = Timer(0.1, OrderRepo.add, [makeOrder("REPO8")])
+        timer.start()
+        startTime = monotonic()
+        orders = OrderRepo.getNew("consumer5", timeout = 10.0)
+        timer.join()
+        self.assertEqual(getSecCodes(orders), ["REPO8"])
+        self.assertLess(monotonic() - startTime, 5.0)
+
+    def testWaitingTimeout(self):
+        OrderRepo.getNew("consumer6")
+        startTime = monotonic()
+        self.assertEqual(OrderRepo.getNew("consumer6", timeout = 0.2), [])
+        self.assertGreaterEqual(monotonic() - startTime, 0.2)
+
+class JournaledOrderRepoTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = TemporaryDirectory()
+        self._path = os.path.join(self._dir.name, "orders.journal")
+
+    def tearDown(self):
+        OrderRepo.close()
+        self._dir.cleanup()
+
+    def testTransIdsAfterReopen(self):
+        OrderRepo.open(self._path)
+        for _ in range(3):
+            OrderRepo.add(makeOrder("REPO9"))
+        OrderRepo.close()
+
+        OrderRepo.open(self._path)
+        OrderRepo.add(makeOrder("REPO10"))
+        orders = OrderRepo.getNew("consumer7", 3)
+        self.assertEqual([order["TRANS_ID"] for order in orders], [4])
+        self.assertEqual(getSecCodes(OrderRepo.find()), ["REPO9"] * 3 + ["REPO10"])
@@ -0,0 +1,278 @@
+import unittest
+from itertools import chain
+from array import array
+from random import Random
+from graphs.graphs import ProcessorConfigs, Processor, Portfolio
+from datacalc.sparse import Point, Segment
+from trading.orderrepo import OrderRepo
+from trading.orderjournal import FIELD_SIZE
+from lib.exceptions import ParamError
+
+ProcessorConfigs.register("sandbox", "graphs.sandbox")
+ProcessorConfigs.register("trading", "graphs.trading")
+
+# Random walk data chunks, the last samples (live ones) in chunks of a single sample
+
+def makeChunks(count, chunkSize, liveCount = 0, seed = 1):
+    random = Random(seed)
+    prices = [100.0]
+    for _ in range(count - 1):
+        prices.append(round(prices[-1] + random.gauss(0, 0.5), 2))
+    times = [1_700_000_000_000 + i * 60_000 for i in range(count)]
+    volumes = [random.randint(1, 100) for _ in range(count)]
+    starts = chain(range(0, count - liveCount, chunkSize), range(count - liveCount, count))
+    return [
+        {
+            "Time": times[i:stop],
+            "Price": prices[i:stop],
+            "Volume": volumes[i:stop]
+        }
+        for i in starts
+        for stop in [i + 1 if i >= count - liveCount else min(i + chunkSize, count - liveCount)]
+    ]
+
+def makeProcessor(secCode, params = None):
+    return Processor(
+        ProcessorConfigs.get("trading"),
+        {
+            "classCode": "TQBR",
+            "secCode": secCode,
+            "Trader.maxPosition": 1000,
+            "Trader.maxOrderRate": 1000.0,
+            "Trader.maxSignalAge": 0.0
+        } | (params or {}),
+        {"Time": array("q"), "Price": [], "Volume": []}
+    )
+
+def makeSandboxProcessor():
+    return Processor(
+        ProcessorConfigs.get("sandbox"),
+        {"(Graphs)": "*"},
+        {"Time": array("q"), "Price": [], "Volume": []}
+    )
+
+# Draws graph values the way the client does, into a list of values per graph
+
+def drawValues(graphs, start, count, graphValues):
+    for graph, values in zip(graphs, graphValues):
+        if values is None:
+            continue
+        offset, *values = values
+        graph.extend([None] * (start + count - len(graph)))
+        sparseValues = [value for value in values if isinstance(value, (Point, Segment))]
+        if sparseValues or len(values) != count - offset:
+            graph[start + offset:] = [None] * (count - offset)
+            for value in sparseValues:
+                value = value.shifted(start)
+                if isinstance(value, Point):
+                    graph[value.index] = value.value
+                    continue
+                for i in range(value.startIndex, value.endIndex + 1):
+                    graph[i] = (
+                        value.xStart if i == value.startIndex
+                        else value.xEnd if i == value.endIndex
+                        else None if value.xStart is None or value.xEnd is None
+                        else value.xStart + (value.xEnd - value.xStart) * (i - value.startIndex) / (value.endIndex - value.startIndex)
+                    )
+        else:
+            graph[start + offset:] = values
+
+def formatValues(graphValues):
+    return [
+        None if values is None else list(map(str, values))
+        for values in graphValues
+    ]
+
+class ProcessorForkTest(unittest.TestCase):
+
+    def testForkWithRebuiltTraderPassesNoOrders(self):
+        chunks = makeChunks(8000, 1000)
+        processor = makeProcessor("FORK1")
+        for chunk in chunks[:4]:
+            processor.calc(chunk)
+        orderCount = len(OrderRepo.find("FORK1"))
+        self.assertGreater(orderCount, 0)
+
+        fork = processor.fork({"Rsi.lag": 20, "Trader.maxNotional": 1e9})
+        for chunk in chunks[4:]:
+            fork.calc(chunk)
+        self.assertEqual(len(OrderRepo.find("FORK1")), orderCount)
+
+        processor.calc(chunks[4])
+        self.assertGreater(len(OrderRepo.find("FORK1")), orderCount)
+
+class ProcessorChunkTest(unittest.TestCase):
+
+    def testResentChunkThenNewData(self):
+        chunks = makeChunks(3000, 1000, seed = 2)
+        processor = makeSandboxProcessor()
+        processor.calc(chunks[0])
+        processor.calc(chunks[1])
+        formatValues(processor.calc(chunks[0]))
+        processor.calc(chunks[2])
+
+        expected = makeSandboxProcessor()
+        for chunk in chunks:
+            expected.calc(chunk)
+        self.assertEqual(
+            formatValues(processor.getValues(0, 3000)),
+            formatValues(expected.getValues(0, 3000))
+        )
+
+    def testResentChunkIsAnsweredFromCalculatedData(self):
+        chunks = makeChunks(3000, 1000, seed = 2)
+        processor = makeSandboxProcessor()
+        for chunk in chunks:
+            processor.calc(chunk)
+
+        # Whole chunk and a part of chunk, sent again
+        for chunk, start in (
+            (chunks[1], 1000),
+            ({name: values[200:700] for name, values in chunks[2].items()}, 2200)
+        ):
+            with self.subTest(start = start):
+                values = formatValues(processor.calc(chunk))
+                self.assertEqual(processor.getLen(), 3000)
+                self.assertEqual(values, formatValues(processor.getValues(start, start + len(chunk["Time"]))))
+
+    def testChangedChunkIsAppended(self):
+        chunks = makeChunks(2000, 1000, seed = 2)
+        processor = makeSandboxProcessor()
+        for chunk in chunks:
+            processor.calc(chunk)
+
+        chunk = dict(chunks[1], Price = [price + 1.0 for price in chunks[1]["Price"]])
+        processor.calc(chunk)
+        self.assertEqual(processor.getLen(), 3000)
+
+    def testStreamsReadThenNewData(self):
+        chunks = makeChunks(3000, 1000, seed = 2)
+        processor = makeSandboxProcessor()
+        processor.calc(chunks[0])
+        processor.calc(chunks[1])
+        for streamName in processor.getStreamNames():
+            list(processor.getStream(streamName))
+        processor.calc(chunks[2])
+        self.assertEqual(processor.getLen(), 3000)
+
+    def testStartsWithFirstChunkOnly(self):
+        chunks = makeChunks(3000, 1000)
+        processor = makeSandboxProcessor()
+        self.assertTrue(processor.startsWith(chunks[0]))
+        processor.calc(chunks[0])
+        processor.calc(chunks[1])
+        self.assertTrue(processor.startsWith(chunks[0]))
+        # Chunk found at non-zero start
+        self.assertFalse(processor.startsWith(chunks[1]))
+        # Chunk continuing the calculated samples
+        self.assertFalse(processor.startsWith(chunks[2]))
+
+class ProcessorParamsTest(unittest.TestCase):
+
+    def testResentChunkAfterParamChange(self):
+        chunks = makeChunks(4000, 1000)
+        processor = makeProcessor("PARAMS1")
+        for chunk in chunks:
+            processor.calc(chunk)
+
+        processor.applyParams({"Rsi.lag": 20})
+        values = formatValues(processor.calc(chunks[0]))
+        self.assertEqual(processor.getLen(), 4000)
+
+        expected = makeProcessor("PARAMS1", {"Rsi.lag": 20})
+        for chunk in chunks:
+            expected.calc(chunk)
+        self.assertEqual(values, formatValues(expected.getValues(0, 1000)))
+
+    def testValuesAfterParamChange(self):
+        chunks = makeChunks(4000, 1000)
+        processor = makeProcessor("PARAMS2")
+        for chunk in chunks:
+            processor.calc(chunk)
+
+        processor.applyParams({"Rsi.lag": 20, "(Graphs)": "*"})
+        values = formatValues(processor.getValues(0, processor.getLen()))
+
+        expected = makeProcessor("PARAMS2", {"Rsi.lag": 20, "(Graphs)": "*"})
+        for chunk in chunks:
+            expected.calc(chunk)
+        self.assertEqual(values, formatValues(expected.getValues(0, expected.getLen())))
+
+    def testInvalidParamsOnInit(self):
+        with self.assertRaises(ParamError):
+            makeProcessor("PARAMS3", {"Rsi.lag": 0})
+        with self.assertRaises(ParamError):
+            makeProcessor("X" * (FIELD_SIZE + 1))
+
+    def testInvalidParamsOnApply(self):
+        chunks = makeChunks(3000, 1000)
+        processor = makeProcessor("PARAMS4", {"(Graphs)": "*"})
+        processor.calc(chunks[0])
+        with self.assertRaises(ParamError):
+            processor.applyParams({"Rsi.lag": 0})
+
+        # Processor is left with the previous params
+        for chunk in chunks[1:]:
+            processor.calc(chunk)
+        expected = makeProcessor("PARAMS4", {"(Graphs)": "*"})
+        for chunk in chunks:
+            expected.calc(chunk)
+        self.assertEqual(
+            formatValues(processor.getValues(0, processor.getLen())),
+            formatValues(expected.getValues(0, expected.getLen()))
+        )
+
+class ProcessorSparseTest(unittest.TestCase):
+
+    def testRetroactionOfLiveUpdates(self):
+        chunks = makeChunks(3000, 1000, 1000, seed = 2)
+        params = {"(Graphs)": "*"}
+        processor = makeProcessor("SPARSE1", params)
+        graphCount = len(processor.getValues(0, 0))
+        graphs = [[] for _ in range(graphCount)]
+        for chunk in chunks:
+            start = processor.getLen()
+            drawValues(graphs, start, len(chunk["Time"]), processor.calc(chunk))
+
+        expected = makeProcessor("SPARSE1", params)
+        for chunk in chunks:
+            expected.calc(chunk)
+        expectedGraphs = [[] for _ in range(graphCount)]
+        drawValues(expectedGraphs, 0, expected.getLen(), expected.getValues(0, expected.getLen()))
+        self.assertEqual(graphs, expectedGraphs)
+
+class ProcessorTimeTest(unittest.TestCase):
+
+    def testEmptyTimeCell(self):
+        chunks = makeChunks(3000, 1000)
+        chunks[0]["Time"][500] = None
+
+        processor = makeProcessor("TIME1")
+        for chunk in chunks:
+            processor.calc(chunk)
+        self.assertEqual(processor.getLen(), 3000)
+        self.assertIsNone(processor.getSources()["Time"][500])
+        self.assertEqual(processor.getTimeIndex().find(chunks[2]["Time"][0]), 2000)
+        self.assertTrue(processor.startsWith(chunks[0]))
+
+class PortfolioTest(unittest.TestCase):
+
+    def testInstrumentWithNoNewData(self):
+        chunks = makeChunks(2000, 1000)
+        portfolio = Portfolio(
+            ProcessorConfigs.get("trading"),
+            {"Trader.maxSignalAge": 0.0},
+            [("TQBR", "PORT1"), ("TQBR", "PORT2")],
+            ["Price", "Volume", "Time"]
+        )
+        empty = {"Price": [], "Volume": [], "Time": []}
+        for chunk in chunks:
+            results = portfolio.calc({
+                sourceName: [chunk[sourceName], empty[sourceName]]
+                for sourceName in chunk
+            })
+            self.assertEqual(len(results), 2)
+            self.assertTrue(all(
+                values is None or list(values) == [0]
+                for values in results[1]
+            ))
@@ -0,0 +1,63 @@
+import unittest
+from time import sleep
+from datetime import datetime
+from lib.times import MS_PER_HOUR, toEpochMs
+from trading.risk import RiskGuard, RiskManager, SIGNAL_LIMIT, TRADE_LIMIT
+from trading.orderrepo import OrderRepo
+
+def makeOrder(secCode):
+    return {
+        "TIME": datetime.now(),
+        "CLASSCODE": "TQBR",
+        "SECCODE": secCode,
+        "ACTION": "NEW_ORDER",
+        "OPERATION": "B",
+        "PRICE": 100.0,
+        "QUANTITY": 1,
+        "TYPE": "L"
+    }
+
+class RiskGuardTest(unittest.TestCase):
+
+    def testRateLimitedSignalIsRetried(self):
+        # Burst of 2 orders, with a token added each 0.5s
+        guard = RiskGuard("RISK1", {"maxPosition": 10, "maxOrderRate": 2.0})
+        now = toEpochMs(datetime.now())
+        self.assertTrue(guard.submit(makeOrder("RISK1"), ("RISK1", now - 2), now - 2))
+        self.assertTrue(guard.submit(makeOrder("RISK1"), ("RISK1", now - 1), now - 1))
+        self.assertFalse(guard.submit(makeOrder("RISK1"), ("RISK1", now), now))
+
+        sleep(0.6)
+        self.assertTrue(guard.submit(makeOrder("RISK1"), ("RISK1", now), now))
+        self.assertFalse(guard.submit(makeOrder("RISK1"), ("RISK1", now), now))
+        self.assertEqual(len(OrderRepo.find("RISK1")), 3)
+
+    def testStaleSignalIsRejected(self):
+        guard = RiskGuard("RISK2", {"maxPosition": 10, "maxSignalAge": 60.0})
+        now = toEpochMs(datetime.now())
+        self.assertFalse(guard.submit(makeOrder("RISK2"), ("RISK2", now - MS_PER_HOUR), now - MS_PER_HOUR))
+        self.assertTrue(guard.submit(makeOrder("RISK2"), ("RISK2", now), now))
+        self.assertEqual(len(OrderRepo.find("RISK2")), 1)
+        self.assertNotIn(("RISK2", now - MS_PER_HOUR), RiskManager.getPosition("RISK2").signals)
+
+    def testSignalsAreBounded(self):
+        # Every order is rejected by the position limit, and its signal is remembered
+        guard = RiskGuard("RISK3", {"maxPosition": 0, "maxOrderRate": 1e9})
+        now = toEpochMs(datetime.now())
+        for i in range(SIGNAL_LIMIT + 10):
+            self.assertFalse(guard.submit(makeOrder("RISK3"), ("RISK3", now + i), now + i))
+        signals = RiskManager.getPosition("RISK3").signals
+        self.assertEqual(len(signals), SIGNAL_LIMIT)
+        self.assertNotIn(("RISK3", now), signals)
+        self.assertIn(("RISK3", now + SIGNAL_LIMIT + 9), signals)
+
+class RiskManagerTest(unittest.TestCase):
+
+    def testTradesAreBounded(self):
+        for tradeNum in range(TRADE_LIMIT + 10):
+            RiskManager.addFill("RISK4", "B", 100.0, 1, tradeNum)
+        # Duplicate of a recent trade is dropped
+        RiskManager.addFill("RISK4", "B", 100.0, 1, TRADE_LIMIT + 9)
+        position = RiskManager.getPosition("RISK4")
+        self.assertEqual(position.quantity, TRADE_LIMIT + 10)
+        self.assertEqual(len(position.trades), TRADE_LIMIT)
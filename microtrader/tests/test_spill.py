@@ -0,0 +1,96 @@
+import unittest
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+from datacalc.blocks import BlockValues, BLOCK_SIZE
+from datacalc.spill import BlockSpiller, spilling
+from tests.test_processor import makeChunks, makeProcessor, formatValues
+
+# Owner of a spiller, creating block values spilled by it
+
+class SpillingOwner:
+
+    def __init__(self, maxResidentBlocks, directory):
+        self._spiller = BlockSpiller(maxResidentBlocks, directory)
+
+    @property
+    def spiller(self):
+        return self._spiller
+
+    @spilling
+    def makeValues(self, values, typecode = None):
+        return BlockValues(values, typecode)
+
+class BlockSpillerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def testSpillAndLoad(self):
+        owner = SpillingOwner(2, self._dir.name)
+        expected = [float(i) for i in range(6 * BLOCK_SIZE + 10)]
+        values = owner.makeValues(expected)
+        self.assertEqual(owner.spiller.getResidentCount(), 2)
+        self.assertGreater(owner.spiller.getSpilledSize(), 0)
+
+        # Spilled blocks are loaded on access, spilling the other ones
+        self.assertEqual(values[5], expected[5])
+        self.assertEqual(list(values[BLOCK_SIZE - 5:3 * BLOCK_SIZE]), expected[BLOCK_SIZE - 5:3 * BLOCK_SIZE])
+        self.assertEqual(list(values), expected)
+        self.assertLessEqual(owner.spiller.getResidentCount(), 2)
+
+    def testWriteToSpilledBlock(self):
+        owner = SpillingOwner(1, self._dir.name)
+        expected = list(range(4 * BLOCK_SIZE))
+        values = owner.makeValues(expected, "q")
+        for index in (5, 2 * BLOCK_SIZE, BLOCK_SIZE + 1):
+            values[index] = -index
+            expected[index] = -index
+        values.truncate(2 * BLOCK_SIZE + 5)
+        del expected[2 * BLOCK_SIZE + 5:]
+        self.assertEqual(list(values), expected)
+
+    def testForkOfSpilledValues(self):
+        owner = SpillingOwner(1, self._dir.name)
+        expected = [float(i) for i in range(4 * BLOCK_SIZE)]
+        values = owner.makeValues(expected)
+        fork = deepcopy(values)
+        fork[5] = -1.0
+        self.assertEqual(list(values), expected)
+        self.assertEqual(fork[5], -1.0)
+        self.assertEqual(list(fork[6:]), expected[6:])
+
+class ProcessorSpillTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = TemporaryDirectory()
+        BlockSpiller.configure(4, self._dir.name)
+
+    def tearDown(self):
+        BlockSpiller.configure(0)
+        self._dir.cleanup()
+
+    def testSpilledProcessorValues(self):
+        chunks = makeChunks(20000, 5000, 10)
+        params = {"(Graphs)": "*"}
+        processor = makeProcessor("SPILL1", params)
+        for chunk in chunks:
+            processor.calc(chunk)
+        fork = processor.fork({"Rsi.lag": 20})
+
+        BlockSpiller.configure(0)
+        expected = makeProcessor("SPILL1", params)
+        for chunk in chunks:
+            expected.calc(chunk)
+        self.assertEqual(
+            formatValues(processor.getValues(0, processor.getLen())),
+            formatValues(expected.getValues(0, expected.getLen()))
+        )
+
+        expected.applyParams({"Rsi.lag": 20})
+        self.assertEqual(
+            formatValues(fork.getValues(0, fork.getLen())),
+            formatValues(expected.getValues(0, expected.getLen()))
+        )
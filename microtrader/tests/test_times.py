@@ -0,0 +1,15 @@
+import unittest
+from datetime import datetime
+from lib.times import parseEpochMs, toEpochMs
+
+class ParseEpochMsTest(unittest.TestCase):
+
+    def testEmptyTimeCell(self):
+        self.assertEqual(
+            parseEpochMs(["2024-01-02T10:00:00.000", "", "2024-01-02T10:02:00.500"]),
+            [
+                toEpochMs(datetime(2024, 1, 2, 10, 0, 0)),
+                None,
+                toEpochMs(datetime(2024, 1, 2, 10, 2, 0, 500000))
+            ]
+        )
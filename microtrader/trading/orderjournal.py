@@ -0,0 +1,452 @@
+from typing import final
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import chain
+from threading import RLock, Timer
+from lib.exceptions import ParamError
+from lib.times import toEpochMs, fromEpochMs
+from struct import Struct
+import mmap
+import os
+
+# Persistent append-only order journal.
+#
+# Orders are stored as fixed-size binary records, so any record is accessible by its number
+# directly within memory-mapped journal file. Record fields are aligned to 8 bytes, which allows
+# to read the whole fields columns at once through the typed memory view, when indexes by time
+# and security code are built.
+#
+# Indexes are kept in the index file next to the journal (see _IndexFile), memory-mapped too,
+# so they are neither rebuilt after restart, nor loaded into memory. Index file covers
+# the records journaled before it's written, and the records journaled since are indexed
+# in memory (index tail), till the tail grows enough to rewrite the index file. Indexes
+# are loaded on first search, so opening of the journal costs nothing regardless of its size.
+# Index file is written then, if missing or outdated, and also on close.
+#
+# Written records are flushed to disk (fsync) in batches: after each syncCount records or
+# after syncInterval seconds since the first unsynced record, whichever comes first.
+#
+# Journal behaves like an append-only list of orders, with indexing and slicing support.
+
+FIELD_SIZE = 16
+
+_RECORD = Struct(f"<qq{FIELD_SIZE}s{FIELD_SIZE}s{FIELD_SIZE}scc6xdq")
+_RECORD_SLOTS = _RECORD.size // 8
+
+# Record field positions in 8-byte slots
+_TIME_SLOT = 1
+_SECCODE_SLOT = 4
+
+# Security code as a pair of 8-byte slots
+_SECCODE_KEY = Struct("<qq")
+
+# Index file is rewritten when the tail gets longer than the part of the indexed records
+_INDEX_TAIL_RATIO = 0.25
+_INDEX_TAIL_MIN = 4096
+
+_INDEX_SUFFIX = ".index"
+
+# Checks that the order field value fits the journal record.
+
+def checkField(value):
+    if len(value.encode("utf-8")) > FIELD_SIZE:
+        raise ParamError(f"Order field value is too long ({value})")
+
+@final
+class OrderJournal:
+
+    def __init__(self, path, syncCount = 256, syncInterval = 0.5):
+        self._syncCount = syncCount
+        self._syncInterval = syncInterval
+
+        self._file = open(path, "a+b")
+
+        # Drop the incomplete record, if any, left by unexpected termination
+        size = os.fstat(self._file.fileno()).st_size
+        if size % _RECORD.size:
+            self._file.truncate(size - size % _RECORD.size)
+        self._count = size // _RECORD.size
+
+        self._mmap = None
+        self._mmapCount = 0
+
+        self._lock = RLock()
+        self._unsyncedCount = 0
+        self._syncTimer = None
+
+        self._indexPath = path + _INDEX_SUFFIX
+        self._index = None
+        # Index tail: sorted times, corresponding record numbers, and record numbers
+        # by security code, of the records not covered by index file
+        self._tailTimes = array("q")
+        self._tailTimeRecords = array("q")
+        self._tailSecCodeRecords = {}
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            if self._index is not None:
+                if self._tailTimes:
+                    self._writeIndex()
+                self._index.close()
+                self._index = None
+            self._mmap = None
+            self._file.close()
+
+    # Loads indexes, writing index file first, if it's missing or outdated.
+
+    def _loadIndex(self):
+        if self._index is None:
+            self._index = _IndexFile.open(self._indexPath, self._count)
+            if self._index is None:
+                self._writeIndex()
+            else:
+                self._indexTail(self._index.count)
+
+        if len(self._tailTimes) > max(_INDEX_TAIL_MIN, self._index.count * _INDEX_TAIL_RATIO):
+            self._writeIndex()
+
+    def _writeIndex(self):
+        if self._index is not None:
+            self._index.close()
+        self._index = None
+        self._tailTimes = array("q")
+        self._tailTimeRecords = array("q")
+        self._tailSecCodeRecords = {}
+
+        count = self._count
+        times, secCodeKeys = self._readColumns(0, count)
+
+        # Orders are usually journaled in order of their time, so there's nothing to sort
+        timeRecords = range(count)
+        if any(times[i] > times[i + 1] for i in range(count - 1)):
+            timeRecords = sorted(timeRecords, key = times.__getitem__)
+
+        secCodeRecords = {}
+        for n, key in enumerate(secCodeKeys):
+            records = secCodeRecords.get(key)
+            if records is None:
+                records = secCodeRecords[key] = array("q")
+            records.append(n)
+
+        _IndexFile.write(self._indexPath, count, times, timeRecords, secCodeRecords)
+        self._index = _IndexFile.open(self._indexPath, count)
+
+    # Indexes the records since the start in index tail.
+
+    def _indexTail(self, start):
+        times, secCodeKeys = self._readColumns(start, self._count)
+        for n, (time, key) in enumerate(zip(times, secCodeKeys), start):
+            self._addToTail(n, time, key)
+
+    def _addToTail(self, n, time, secCodeKey):
+        i = bisect_right(self._tailTimes, time)
+        self._tailTimes.insert(i, time)
+        self._tailTimeRecords.insert(i, n)
+
+        records = self._tailSecCodeRecords.get(secCodeKey)
+        if records is None:
+            records = self._tailSecCodeRecords[secCodeKey] = array("q")
+        records.append(n)
+
+    # Reads time and security code key columns of the records within [start, stop).
+
+    def _readColumns(self, start, stop):
+        if start >= stop:
+            return [], []
+        slots = memoryview(self._map()).cast("q")
+        begin, end = start * _RECORD_SLOTS, stop * _RECORD_SLOTS
+        times = slots[begin + _TIME_SLOT:end:_RECORD_SLOTS].tolist()
+        secCodeKeys = list(zip(
+            slots[begin + _SECCODE_SLOT:end:_RECORD_SLOTS].tolist(),
+            slots[begin + _SECCODE_SLOT + 1:end:_RECORD_SLOTS].tolist()
+        ))
+        slots.release()
+        return times, secCodeKeys
+
+    def append(self, order):
+        time = toEpochMs(order["TIME"])
+        secCode = _encodeStr(order["SECCODE"])
+
+        record = _RECORD.pack(
+            order["TRANS_ID"],
+            time,
+            _encodeStr(order["CLASSCODE"]),
+            secCode,
+            _encodeStr(order["ACTION"]),
+            _encodeStr(order["OPERATION"]),
+            _encodeStr(order["TYPE"]),
+            order["PRICE"],
+            order["QUANTITY"]
+        )
+
+        with self._lock:
+            self._file.write(record)
+            n = self._count
+            self._count += 1
+
+            if self._index is not None:
+                self._addToTail(n, time, _getSecCodeKey(secCode))
+
+            self._unsyncedCount += 1
+            if self._unsyncedCount >= self._syncCount:
+                self._sync()
+            elif self._syncTimer is None:
+                self._syncTimer = Timer(self._syncInterval, self.sync)
+                self._syncTimer.daemon = True
+                self._syncTimer.start()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._syncTimer is not None:
+            self._syncTimer.cancel()
+            self._syncTimer = None
+        if self._unsyncedCount:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsyncedCount = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return list(self.read(*index.indices(self._count)))
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError("Order index is out of range")
+        return _decodeRecord(self._map(), index)
+
+    def read(self, start = 0, stop = None, step = 1):
+        stop = self._count if stop is None else min(stop, self._count)
+        if start >= stop:
+            return
+        buffer = self._map()
+        for n in range(start, stop, step):
+            yield _decodeRecord(buffer, n)
+
+    # Fast sequential scan, yielding raw record tuples instead of order dicts:
+    # (TRANS_ID, TIME, CLASSCODE, SECCODE, ACTION, OPERATION, TYPE, PRICE, QUANTITY),
+    # where TIME is milliseconds since epoch and string fields are null-padded bytes.
+
+    def scan(self, start = 0):
+        if start >= self._count:
+            return iter(())
+        return _RECORD.iter_unpack(
+            memoryview(self._map())[start * _RECORD.size:self._count * _RECORD.size]
+        )
+
+    # Finds orders by security code and/or time range [timeFrom, timeTo).
+    # Orders are returned in order of their time, decoded only as they are accessed
+    # (see FoundOrders).
+
+    def find(self, secCode = None, timeFrom = None, timeTo = None):
+        timeFrom = None if timeFrom is None else toEpochMs(timeFrom)
+        timeTo = None if timeTo is None else toEpochMs(timeTo)
+
+        with self._lock:
+            self._loadIndex()
+            # Views of index file are released by the time the lock is, as the index file
+            # may be rewritten by another search then
+            records = self._findRecords(secCode, timeFrom, timeTo)
+
+        return FoundOrders(self._map() if records else None, records)
+
+    def _findRecords(self, secCode, timeFrom, timeTo):
+        index = self._index
+        records = array("q")
+
+        if secCode is None:
+            times, timeRecords = index.findTimes(timeFrom, timeTo)
+            tailTimes, tailRecords = _findTimes(self._tailTimes, self._tailTimeRecords, timeFrom, timeTo)
+            if tailRecords:
+                records.extend(n for _, n in merge(zip(times, timeRecords), zip(tailTimes, tailRecords)))
+            else:
+                records.frombytes(timeRecords.cast("B"))
+            return records
+
+        # Records of the security code are usually much fewer than the ones within time range,
+        # so they are filtered and sorted by their times instead
+        if not self._count:
+            return records
+        key = _getSecCodeKey(_encodeStr(secCode))
+        slots = memoryview(self._map()).cast("q")
+        records.extend(n for _, n in sorted(
+            (time, n)
+            for n in chain(index.getSecCodeRecords(key), self._tailSecCodeRecords.get(key, ()))
+            for time in [slots[n * _RECORD_SLOTS + _TIME_SLOT]]
+            if (timeFrom is None or time >= timeFrom)
+                and (timeTo is None or time < timeTo)
+        ))
+        slots.release()
+        return records
+
+    def _map(self):
+        # Previous mapping isn't closed explicitly, as it may still be used by pending readers
+        if self._mmapCount < self._count:
+            with self._lock:
+                self._file.flush()
+            self._mmap = mmap.mmap(
+                self._file.fileno(),
+                self._count * _RECORD.size,
+                access = mmap.ACCESS_READ
+            )
+            self._mmapCount = self._count
+        return self._mmap
+
+# Orders found in the journal, a read-only sequence of orders decoded on access.
+
+@final
+class FoundOrders:
+
+    def __init__(self, buffer, records):
+        self._buffer = buffer
+        self._records = records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return FoundOrders(self._buffer, self._records[index])
+        return _decodeRecord(self._buffer, self._records[index])
+
+    def __iter__(self):
+        buffer = self._buffer
+        for n in self._records:
+            yield _decodeRecord(buffer, n)
+
+# Index file of order journal.
+#
+# Consists of 8-byte integers: the number of indexed records and of security codes,
+# followed by:
+#     times of the records, sorted
+#     record numbers, in order of their times
+#     record numbers, grouped by security code, sorted within the group
+#     security code table: security code (as 2 integers) and its group start and stop
+#
+# Index file is read through typed memory views of its mapping, which are released
+# before the file is rewritten, as the mapped file can't be replaced on some systems.
+
+@final
+class _IndexFile:
+
+    _HEADER_SIZE = 2
+    _SECCODE_SIZE = 4
+
+    def __init__(self, file, buffer, count, secCodeCount):
+        self._file = file
+        self._mmap = buffer
+        self._slots = memoryview(buffer).cast("q")
+        self.count = count
+
+        start = _IndexFile._HEADER_SIZE
+        self._times = self._slots[start:start + count]
+        self._timeRecords = self._slots[start + count:start + 2 * count]
+        self._secCodeRecords = self._slots[start + 2 * count:start + 3 * count]
+
+        # Security code table is small (a row per instrument), so it's read entirely
+        table = self._slots[start + 3 * count:].tolist()
+        self._secCodeRanges = {
+            (table[i], table[i + 1]): (table[i + 2], table[i + 3])
+            for i in range(0, len(table), _IndexFile._SECCODE_SIZE)
+        }
+
+    # Opens index file of the journal of the record count given, or returns None if it's
+    # missing or doesn't match the journal.
+
+    @staticmethod
+    def open(path, recordCount):
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        size = os.fstat(file.fileno()).st_size
+        if size < _IndexFile._HEADER_SIZE * 8 or size % 8:
+            file.close()
+            return None
+        buffer = mmap.mmap(file.fileno(), size, access = mmap.ACCESS_READ)
+
+        slots = memoryview(buffer).cast("q")
+        count, secCodeCount = slots[0], slots[1]
+        slots.release()
+        if (count > recordCount
+            or size != (_IndexFile._HEADER_SIZE + 3 * count + _IndexFile._SECCODE_SIZE * secCodeCount) * 8
+        ):
+            buffer.close()
+            file.close()
+            return None
+
+        return _IndexFile(file, buffer, count, secCodeCount)
+
+    @staticmethod
+    def write(path, count, times, timeRecords, secCodeRecords):
+        tempPath = path + ".tmp"
+        with open(tempPath, "wb") as file:
+            file.write(array("q", [count, len(secCodeRecords)]))
+            file.write(array("q", map(times.__getitem__, timeRecords)))
+            file.write(array("q", timeRecords))
+            table = array("q")
+            start = 0
+            for key, records in secCodeRecords.items():
+                file.write(records)
+                table.extend([*key, start, start + len(records)])
+                start += len(records)
+            file.write(table)
+        os.replace(tempPath, path)
+
+    def close(self):
+        for view in (self._times, self._timeRecords, self._secCodeRecords, self._slots):
+            view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def findTimes(self, timeFrom, timeTo):
+        return _findTimes(self._times, self._timeRecords, timeFrom, timeTo)
+
+    def getSecCodeRecords(self, secCodeKey):
+        start, stop = self._secCodeRanges.get(secCodeKey, (0, 0))
+        return self._secCodeRecords[start:stop]
+
+# Returns times within the range [timeFrom, timeTo) and their record numbers.
+
+def _findTimes(times, timeRecords, timeFrom, timeTo):
+    start = 0 if timeFrom is None else bisect_left(times, timeFrom)
+    stop = len(times) if timeTo is None else bisect_left(times, timeTo)
+    return times[start:stop], timeRecords[start:stop]
+
+def _decodeRecord(buffer, n):
+    transId, time, classCode, secCode, action, operation, orderType, price, quantity = (
+        _RECORD.unpack_from(buffer, n * _RECORD.size)
+    )
+    return {
+        "TIME": fromEpochMs(time),
+        "CLASSCODE": _decodeStr(classCode),
+        "SECCODE": _decodeStr(secCode),
+        "ACTION": _decodeStr(action),
+        "OPERATION": _decodeStr(operation),
+        "PRICE": price,
+        "QUANTITY": quantity,
+        "TYPE": _decodeStr(orderType),
+        "TRANS_ID": transId
+    }
+
+def _getSecCodeKey(secCode):
+    return _SECCODE_KEY.unpack(secCode.ljust(FIELD_SIZE, b"\0"))
+
+def _contains(sortedValues, value):
+    i = bisect_left(sortedValues, value)
+    return i < len(sortedValues) and sortedValues[i] == value
+
+def _encodeStr(value):
+    checkField(value)
+    return value.encode("utf-8")
+
+def _decodeStr(value):
+    return value.rstrip(b"\0").decode("utf-8")
@@ -1,20 +1,81 @@
 from typing import final
+from threading import Condition
+from lib.exceptions import ParamError
+from trading.orderjournal import OrderJournal
 
 # Stock order repository.
+#
+# Orders are numbered sequentially by TRANS_ID field, starting from 1. Each consumer
+# has its own cursor (the last TRANS_ID delivered to it), so any number of consumers
+# get all the orders independently, each order only once. Consumer may also pass
+# the last TRANS_ID it has processed, to resume from that point after restart.
+#
+# Consumers may block waiting for new orders, to get them as soon as they are added.
+#
+# Orders are kept in memory until the repository is opened with persistent order journal
+# file. Since then all the orders are stored in (and read from) the journal only, and
+# TRANS_ID numbering is continued after the orders journaled before.
 
 @final
 class OrderRepo:
 
     _orders = []
-    _pos = 0
+    _cursors = {}
+    _condition = Condition()
+
+    @classmethod
+    def open(cls, path):
+        with cls._condition:
+            cls._orders = OrderJournal(path)
+            cls._cursors = {}
+
+    @classmethod
+    def close(cls):
+        with cls._condition:
+            if type(cls._orders) == OrderJournal:
+                cls._orders.close()
+            cls._orders = []
+            cls._cursors = {}
 
     @classmethod
     def add(cls, order):
-        print(f"INFO:  Adding order: {order}")
-        cls._orders.append(order)
+        with cls._condition:
+            order = order | {"TRANS_ID": len(cls._orders) + 1}
+            print(f"INFO:  Adding order: {order}")
+            cls._orders.append(order)
+            cls._condition.notify_all()
+
+    @classmethod
+    def getNew(cls, consumer, lastTransId = None, timeout = None):
+        with cls._condition:
+            if lastTransId is not None:
+                if lastTransId < 0 or lastTransId > len(cls._orders):
+                    raise ParamError(f"Invalid last TRANS_ID value ({lastTransId})")
+                pos = lastTransId
+            else:
+                # New consumer gets only orders added since its first request
+                pos = cls._cursors.get(consumer, len(cls._orders))
+
+            if timeout:
+                cls._condition.wait_for(lambda: len(cls._orders) > pos, timeout)
+
+            cls._cursors[consumer] = len(cls._orders)
+            return cls._orders[pos:]
+
+    # Finds orders by security code and/or time range [timeFrom, timeTo), in order of their time.
 
     @classmethod
-    def getNew(cls):
-        pos = cls._pos
-        cls._pos = len(cls._orders)
-        return cls._orders[pos:]
+    def find(cls, secCode = None, timeFrom = None, timeTo = None):
+        if type(cls._orders) == OrderJournal:
+            return cls._orders.find(secCode, timeFrom, timeTo)
+
+        return sorted(
+            (
+                order
+                for order in cls._orders
+                if (secCode is None or order["SECCODE"] == secCode)
+                    and (timeFrom is None or order["TIME"] >= timeFrom)
+                    and (timeTo is None or order["TIME"] < timeTo)
+            ),
+            key = lambda order: order["TIME"]
+        )
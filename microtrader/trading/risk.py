@@ -0,0 +1,229 @@
+from typing import final
+from threading import Lock
+from time import monotonic
+from datetime import datetime
+from copy import copy, deepcopy
+from lib.exceptions import ParamError
+from lib.times import MS_PER_SECOND, toEpochMs
+from trading.orderrepo import OrderRepo
+
+# Per-instrument position state.
+#
+# Position is shared by all traders of the same instrument. It's updated by fills and
+# by orders, submitted but not filled yet (pending quantity), so the limits are checked
+# against the position expected when all the orders are filled.
+#
+# Signal ids and trade numbers seen are kept to drop duplicates, only the latest ones
+# (up to SIGNAL_LIMIT and TRADE_LIMIT), as duplicates come soon after the originals.
+
+@final
+class Position:
+
+    __slots__ = (
+        "secCode", "quantity", "avgPrice", "pendingQuantity",
+        "orderTokens", "orderTime", "signals", "trades"
+    )
+
+    def __init__(self, secCode):
+        self.secCode = secCode
+        self.quantity = 0
+        self.avgPrice = None
+        self.pendingQuantity = 0
+        self.orderTokens = None
+        self.orderTime = None
+        # Insertion ordered, with None values
+        self.signals = {}
+        self.trades = {}
+
+    def applyFill(self, quantity, price):
+        newQuantity = self.quantity + quantity
+        if self.quantity == 0 or (newQuantity != 0 and (newQuantity > 0) != (self.quantity > 0)):
+            # Position is opened or reversed
+            self.avgPrice = price
+        elif abs(newQuantity) > abs(self.quantity):
+            # Position is increased
+            self.avgPrice = (self.avgPrice * self.quantity + price * quantity) / newQuantity
+        elif newQuantity == 0:
+            self.avgPrice = None
+        self.quantity = newQuantity
+
+        # Filled quantity is no more pending, but only in the direction of pending orders
+        if self.pendingQuantity * quantity > 0:
+            if abs(quantity) >= abs(self.pendingQuantity):
+                self.pendingQuantity = 0
+            else:
+                self.pendingQuantity -= quantity
+
+    def addSignal(self, signalId):
+        _addLatest(self.signals, signalId, SIGNAL_LIMIT)
+
+    def addTrade(self, tradeNum):
+        _addLatest(self.trades, tradeNum, TRADE_LIMIT)
+
+SIGNAL_LIMIT = 1024
+TRADE_LIMIT = 1024
+
+def _addLatest(items, item, limit):
+    items[item] = None
+    if len(items) > limit:
+        del items[next(iter(items))]
+
+# Position and risk registry.
+#
+# Keeps position state of all instruments, updated by fills reported by the terminal.
+
+@final
+class RiskManager:
+
+    _positions = {}
+    _lock = Lock()
+
+    @classmethod
+    def getPosition(cls, secCode):
+        with cls._lock:
+            position = cls._positions.get(secCode)
+            if position is None:
+                position = Position(secCode)
+                cls._positions[secCode] = position
+            return position
+
+    @classmethod
+    def addFill(cls, secCode, operation, price, quantity, tradeNum = None):
+        position = cls.getPosition(secCode)
+        with cls._lock:
+            if tradeNum is not None:
+                # Terminal may report the same trade several times
+                if tradeNum in position.trades:
+                    return
+                position.addTrade(tradeNum)
+            position.applyFill(_getSignedQuantity(operation, quantity), price)
+            print(f"INFO:  Position changed: secCode={secCode} quantity={position.quantity} avgPrice={position.avgPrice}")
+
+# Risk guard of a single trader.
+#
+# Stands between trader and order repository, and passes trader's orders to the repository
+# only when they meet the limits. All checks are performed in O(1) against preallocated
+# instrument position state.
+#
+# Params:
+#     (maxPosition = 1)     - maximum absolute position, in lots
+#     (maxOrderRate = 1.0)  - maximum number of orders per second, with burst of the same size (at least one order)
+#     (maxNotional = 0.0)   - maximum absolute position value, in price units, or zero for no limit
+#     (maxSignalAge = 0.0)  - maximum age of signal (since the time of its bar), in seconds, or zero for no limit
+#     (isForked = False)    - whether the guard is a "what-if" one (e.g. of processor fork)
+#
+# Orders are also deduplicated by signal id, so re-detected signal doesn't cause repeated order.
+# Signal rejected by the order rate limit only is not remembered, so it may be submitted again
+# when re-detected. Signal age limit keeps signals of history (e.g. loaded by the client when
+# the chart is opened) from being ordered. Such signals are not remembered either, as they
+# are rejected by the limit anyway, and would only push the latest signals out of memory.
+#
+# What-if guard, as well as deep copy of any guard, checks orders against its own copy
+# of position, and never passes them to the repository.
+
+@final
+class RiskGuard:
+
+    def __init__(self, secCode, params):
+        try:
+            maxPosition = params.get("maxPosition", 1)
+            if maxPosition < 0:
+                raise ParamError(f"Invalid maxPosition value ({maxPosition})")
+            self._maxPosition = maxPosition
+
+            maxOrderRate = params.get("maxOrderRate", 1.0)
+            if maxOrderRate <= 0.0:
+                raise ParamError(f"Invalid maxOrderRate value ({maxOrderRate})")
+            self._maxOrderRate = maxOrderRate
+            self._maxOrderBurst = max(1.0, maxOrderRate)
+
+            maxNotional = params.get("maxNotional", 0.0)
+            if maxNotional < 0.0:
+                raise ParamError(f"Invalid maxNotional value ({maxNotional})")
+            self._maxNotional = maxNotional
+
+            maxSignalAge = params.get("maxSignalAge", 0.0)
+            if maxSignalAge < 0.0:
+                raise ParamError(f"Invalid maxSignalAge value ({maxSignalAge})")
+            self._maxSignalAge = maxSignalAge * MS_PER_SECOND
+        except Exception as e:
+            raise ParamError(e) from e
+
+        position = RiskManager.getPosition(secCode)
+        self._isForked = params.get("isForked", False)
+        if self._isForked:
+            with RiskManager._lock:
+                position = deepcopy(position)
+        self._position = position
+
+    def __deepcopy__(self, memo):
+        guard = copy(self)
+        memo[id(self)] = guard
+        with RiskManager._lock:
+            guard._position = deepcopy(self._position, memo)
+        guard._isForked = True
+        return guard
+
+    # Submits the order of the signal, with the signal time in milliseconds since epoch.
+
+    def submit(self, order, signalId, signalTime):
+        position = self._position
+        with RiskManager._lock:
+            if signalId in position.signals:
+                return False
+
+            rejection = self._check(order, position, signalTime)
+            if rejection is not None:
+                if rejection not in (_RATE_LIMIT, _AGE_LIMIT):
+                    position.addSignal(signalId)
+                print(f"INFO:  Order rejected ({rejection}): {order}")
+                return False
+
+            position.addSignal(signalId)
+            position.pendingQuantity += _getSignedQuantity(order["OPERATION"], order["QUANTITY"])
+
+        if not self._isForked:
+            OrderRepo.add(order)
+        return True
+
+    def _check(self, order, position, signalTime):
+        if (self._maxSignalAge > 0.0
+            and toEpochMs(datetime.now()) - signalTime > self._maxSignalAge
+        ):
+            return _AGE_LIMIT
+
+        now = monotonic()
+        if position.orderTime is None:
+            position.orderTokens = self._maxOrderBurst
+        else:
+            position.orderTokens = min(
+                self._maxOrderBurst,
+                position.orderTokens + (now - position.orderTime) * self._maxOrderRate
+            )
+        position.orderTime = now
+
+        if position.orderTokens < 1.0:
+            return _RATE_LIMIT
+
+        expected = (
+            position.quantity + position.pendingQuantity
+            + _getSignedQuantity(order["OPERATION"], order["QUANTITY"])
+        )
+        if abs(expected) > self._maxPosition:
+            return "position limit"
+        if self._maxNotional > 0.0 and abs(expected) * order["PRICE"] > self._maxNotional:
+            return "notional limit"
+
+        position.orderTokens -= 1.0
+        return None
+
+_RATE_LIMIT = "order rate limit"
+_AGE_LIMIT = "signal age limit"
+
+def _getSignedQuantity(operation, quantity):
+    if operation == "B":
+        return quantity
+    elif operation == "S":
+        return -quantity
+    else:
+        raise ValueError(f"Invalid operation value ({operation})")
@@ -1,8 +1,32 @@
 from typing import final
 from lib.decors import initconfig, throwingmember
-from datacalc.valuestream import ValueStream
+from lib.utils import mapDict, apply
+from lib.times import fromEpochMs
+from datacalc.stream import Stream
 from datacalc.divergence import *
-from trading.orderrepo import OrderRepo
+from trading.risk import RiskGuard
+from trading.orderjournal import checkField
+
+# Divergence trader.
+#
+# Orders are passed to the order repository through the risk guard, which also drops
+# orders of divergences detected repeatedly (e.g. after retroactive recalculation).
+# Divergences are identified by their time, rather than index, as indexes are relative
+# to the data of a graph builder, while the orders of the instrument are guarded together.
+#
+# Params:
+#     classCode                 - instrument class code, up to orderjournal.FIELD_SIZE bytes
+#     secCode                   - instrument security code, up to orderjournal.FIELD_SIZE bytes
+#     (maxPosition)             - RiskGuard parameter
+#     (maxOrderRate)            - RiskGuard parameter
+#     (maxNotional)             - RiskGuard parameter
+#     (maxSignalAge)            - RiskGuard parameter
+#     (isForked)                - RiskGuard parameter
+#
+# Streams:
+#     price                     - IN
+#     time                      - IN
+#     divergences: [Divergence] - IN
 
 @final
 class Trader:
@@ -12,24 +36,48 @@ class Trader:
     def __init__(self, params, streams):
         self._classCode = params["classCode"]
         self._secCode = params["secCode"]
+        # Codes are checked here, rather than when the orders are journaled during calculation
+        checkField(self._classCode)
+        checkField(self._secCode)
+        self._riskGuard = RiskGuard(
+            self._secCode,
+            mapDict(params, {
+                "maxPosition": "maxPosition",
+                "maxOrderRate": "maxOrderRate",
+                "maxNotional": "maxNotional",
+                "maxSignalAge": "maxSignalAge",
+                "isForked": "isForked"
+            })
+        )
         
-        self._price = ValueStream(streams["price"])
-        self._time = ValueStream(streams["time"])
-        self._divergences = ValueStream(streams["divergences"])
+        self._price = Stream(streams["price"])
+        self._time = Stream(streams["time"])
+        self._divergences = Stream(streams["divergences"], self._onRetroaction)
+
+    def _onRetroaction(self, change, index):
+        if change.isAfter():
+            self._divergences.setPos(index)
 
     def calc(self):
         for d in self._divergences:
-            print(f"INFO:  Divergence detected: type={d.divergenceType} class={d.divergenceClass} time={self._time[d.index1]}")
-            if (d.divergenceType == DivergenceType.DIVERGENCE
+            time = self._time[d.index1]
+            print(f"INFO:  Divergence detected: type={d.divergenceType} class={d.divergenceClass} time={apply(fromEpochMs, time)}")
+            # Divergence at a candle with no time can't be identified, so it's not traded
+            if (time is not None
+                and d.divergenceType == DivergenceType.DIVERGENCE
                 and d.divergenceClass == DivergenceClass.A
             ):
-                OrderRepo.add({
-                    "TIME": self._time[d.index1],
-                    "CLASSCODE": self._classCode,
-                    "SECCODE": self._secCode,
-                    "ACTION": "NEW_ORDER",
-                    "OPERATION": 'B',
-                    "PRICE": self._price[d.index1],
-                    "QUANTITY": 1,
-                    "TYPE": "L"
-                })
+                self._riskGuard.submit(
+                    {
+                        "TIME": fromEpochMs(time),
+                        "CLASSCODE": self._classCode,
+                        "SECCODE": self._secCode,
+                        "ACTION": "NEW_ORDER",
+                        "OPERATION": 'B',
+                        "PRICE": self._price[d.index1],
+                        "QUANTITY": 1,
+                        "TYPE": "L"
+                    },
+                    (self._secCode, time),
+                    time
+                )